@@ -0,0 +1,133 @@
+"""Per-call latency of the conversation analyzers that run on every /chat turn.
+
+IntentAnalyzer, ContextManager and StyleAdapter are timed on fixed inputs
+(clear, ambiguous and long messages; histories of several lengths), after
+a warm-up, in microseconds.
+
+    python benchmarks/bench_analyzers.py --repeat 2000 --history 100 1000 --out analyzers.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from context_manager import ContextManager
+from conversation_models import EnhancedMessage, UserProfile
+from intent_analyzer import IntentAnalyzer
+from results import summarize, write_results
+from style_adapter import StyleAdapter
+
+CLEAR = "Explain how Python list comprehensions work with a short example."
+AMBIGUOUS = "do it maybe or that"
+TOPICS = ["Postgres", "FastAPI", "Redis", "Docker", "Kubernetes", "React", "pandas", "asyncio"]
+STYLES = [
+    "Could you please explain the difference between threads and processes?",
+    "hey can u fix this real quick lol",
+    "Awesome!!! That worked perfectly, thanks so much!",
+    "The function `parse_config()` raises KeyError when the YAML lacks a `db` section.",
+]
+
+
+def make_history(rng: random.Random, count: int) -> List[str]:
+    return [
+        f"{rng.choice(STYLES)} We talked about {rng.choice(TOPICS)} and {rng.choice(TOPICS)} in file_{i % 40}.py."
+        for i in range(count)
+    ]
+
+
+def message(text: str) -> EnhancedMessage:
+    return EnhancedMessage(
+        role="user", content=text, timestamp=datetime.now(), message_id=str(uuid.uuid4()), importance_score=0.5
+    )
+
+
+async def sample(call: Callable[[], Awaitable], repeat: int, warmup: int = 20) -> List[float]:
+    for _ in range(warmup):
+        await call()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await call()
+        samples.append((time.perf_counter() - started) * 1e6)
+    return samples
+
+
+async def run(repeat: int, histories: List[int]) -> Dict[str, List[float]]:
+    rng = random.Random(0)
+    intent, context, style = IntentAnalyzer(), ContextManager(), StyleAdapter()
+    for analyzer in (intent, context, style):
+        analyzer.warmup()
+
+    recent = make_history(rng, 5)
+    long_message = " ".join(make_history(rng, 40))
+    state = None
+    for text in make_history(rng, 20):
+        state = await context.update_conversation_state("bench", "bench_user", message(text), state)
+    profile = UserProfile(
+        user_id="bench_user", communication_style=await style.analyze_user_style(STYLES), preferred_response_length="adaptive",
+        topic_preferences={}, clarification_frequency=0.1, last_updated=datetime.now(),
+    )
+    response = "Sure. " + " ".join(make_history(rng, 10))
+
+    async def entities():
+        context._extract_entities(long_message)
+
+    cases: Dict[str, Callable[[], Awaitable]] = {
+        "intent.clear": lambda: intent.analyze_intent(CLEAR, recent),
+        "intent.ambiguous": lambda: intent.analyze_intent(AMBIGUOUS, recent),
+        "intent.long": lambda: intent.analyze_intent(long_message, recent),
+        "context.update_state": lambda: context.update_conversation_state("bench", "bench_user", message(CLEAR), state),
+        "context.extract_entities": entities,
+        "style.analyze": lambda: style.analyze_user_style(STYLES * 3),
+        "style.adapt": lambda: style.adapt_response_style(response, profile, "Python"),
+    }
+    fresh = iter(range(10**9))
+    for count in histories:
+        texts = make_history(rng, count)
+        # Warm: the chat's entity matrix is kept between turns; cold: first turn after a restart
+        warm_state = state.model_copy(update={"chat_id": f"bench-{count}"})
+        cases[f"context.select_relevant_{count}"] = (
+            lambda texts=texts, warm_state=warm_state: context.select_relevant(warm_state, CLEAR, texts)
+        )
+        cases[f"context.select_relevant_cold_{count}"] = (
+            lambda texts=texts: context.select_relevant(
+                state.model_copy(update={"chat_id": f"cold-{next(fresh)}"}), CLEAR, texts
+            )
+        )
+
+    results = {}
+    for name, call in cases.items():
+        # Each cold call leaves an entity matrix in the scorer's cache, so they get fewer repetitions
+        results[name] = await sample(call, repeat if "_cold_" not in name else max(20, repeat // 20))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=2000)
+    parser.add_argument("--history", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--out", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    samples = asyncio.run(run(args.repeat, args.history))
+    metrics, rows = {}, []
+    for name, values in samples.items():
+        summary = summarize(values, f"{name}.us")
+        summary[f"{name}.calls_per_s"] = round(len(values) / (sum(values) / 1e6), 1)
+        metrics.update(summary)
+        rows.append({"case": name, "calls": len(values), **{k[len(name) + 1:]: v for k, v in summary.items()}})
+        print(json.dumps(rows[-1]))
+
+    write_results(args.out, "analyzers", {"repeat": args.repeat, "history": args.history}, metrics, rows)
+
+
+if __name__ == "__main__":
+    main()
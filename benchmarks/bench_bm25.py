@@ -0,0 +1,73 @@
+"""Per-user BM25 index: incremental add cost, merge time, reopen time and search latency.
+
+    python benchmarks/bench_bm25.py --sizes 1000 10000 100000 --out bm25.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bm25_index import BM25Index
+from metrics import percentile
+
+WORDS = ["python", "fastapi", "database", "redis", "schema", "docker", "kubernetes", "latency", "index",
+         "query", "cache", "postgres", "deploy", "review", "graph", "the", "a", "to", "and", "is", "of", "with"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--out", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    results = []
+    for n in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            index = BM25Index(Path(tmp), merge_threshold=n + 1)
+            started = time.perf_counter()
+            for i in range(n):
+                words = rng.choices(WORDS, k=rng.randint(5, 40)) + [f"topic{rng.randint(0, n // 10)}"]
+                index.add(f"chat{i // 100}", i % 100, " ".join(words))
+            add_ms = (time.perf_counter() - started) * 1000 / n
+
+            started = time.perf_counter()
+            index.merge()
+            merge_ms = (time.perf_counter() - started) * 1000
+            started = time.perf_counter()
+            index = BM25Index(Path(tmp))
+            open_ms = (time.perf_counter() - started) * 1000
+
+            latencies = []
+            for _ in range(args.queries):
+                query = " ".join(rng.choices(WORDS, k=3) + [f"topic{rng.randint(0, n // 10)}"])
+                started = time.perf_counter()
+                index.search(query, k=5)
+                latencies.append((time.perf_counter() - started) * 1000)
+
+            row = {
+                "messages": n,
+                "add_ms_per_message": round(add_ms, 4),
+                "merge_ms": round(merge_ms, 1),
+                "open_ms": round(open_ms, 1),
+                "search_p50_ms": round(percentile(latencies, 50), 2),
+                "search_p99_ms": round(percentile(latencies, 99), 2),
+                "disk_kb": round(sum(f.stat().st_size for f in Path(tmp).rglob("*") if f.is_file()) / 1024),
+            }
+        results.append(row)
+        print(json.dumps(row))
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
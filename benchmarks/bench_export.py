@@ -0,0 +1,101 @@
+"""Throughput and peak memory of the streaming NDJSON export and import.
+
+Builds a synthetic corpus of about --size-mb of chat files, then exports it
+(plain and gzip) and imports it back. Each phase runs in a fresh process,
+so its peak RSS shows that memory stays flat as the corpus grows.
+
+    python benchmarks/bench_export.py --size-mb 1024 --out export.json
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+WORDS = ["Postgres", "index", "query", "latency", "cache", "the", "a", "deploy", "Redis", "and", "review", "of"]
+
+
+def build_corpus(chats_dir: Path, size_mb: int, messages_per_chat: int = 200):
+    rng = random.Random(0)
+    chats_dir.mkdir(parents=True, exist_ok=True)
+    written, chat = 0, 0
+    while written < size_mb * 1024 * 1024:
+        messages = [
+            {"role": "user" if i % 2 == 0 else "assistant", "content": " ".join(rng.choices(WORDS, k=rng.randint(20, 140)))}
+            for i in range(messages_per_chat)
+        ]
+        raw = json.dumps({"messages": messages}).encode()
+        (chats_dir / f"chat{chat:06d}.json").write_bytes(raw)
+        state = {"chat_id": f"chat{chat:06d}", "user_id": f"user{chat % 50}", "last_updated": "2024-03-01T10:00:00"}
+        (chats_dir / f"chat{chat:06d}_state.json").write_text(json.dumps(state))
+        written += len(raw)
+        chat += 1
+    return written, chat
+
+
+def run_phase(phase: str, chats_dir: Path, export_path: Path) -> dict:
+    """Run one phase in this process and report its time and peak RSS."""
+    from chat_export import export_stream, import_stream, CHUNK_SIZE
+
+    started = time.perf_counter()
+    if phase in ("export", "export_gzip"):
+        with open(export_path, "wb") as f:
+            for chunk in export_stream(chats_dir, compress=phase == "export_gzip"):
+                f.write(chunk)
+        nbytes = export_path.stat().st_size
+    else:
+        with open(export_path, "rb") as f:
+            counts = import_stream(chats_dir, iter(lambda: f.read(CHUNK_SIZE), b""))
+        nbytes = export_path.stat().st_size
+    seconds = time.perf_counter() - started
+    return {"phase": phase, "seconds": round(seconds, 2), "bytes": nbytes,
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=int, default=100)
+    parser.add_argument("--out", help="Write results as JSON to this file")
+    parser.add_argument("--phase", help=argparse.SUPPRESS)
+    parser.add_argument("--chats", help=argparse.SUPPRESS)
+    parser.add_argument("--file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.phase:
+        print(json.dumps(run_phase(args.phase, Path(args.chats), Path(args.file))))
+        return
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        source, target = Path(tmp) / "source", Path(tmp) / "target"
+        corpus_bytes, chats = build_corpus(source, args.size_mb)
+        print(json.dumps({"corpus_mb": round(corpus_bytes / 2**20), "chats": chats}))
+        for phase, chats_dir, name in [
+            ("export", source, "export.ndjson"),
+            ("export_gzip", source, "export.ndjson.gz"),
+            ("import", target, "export.ndjson.gz"),
+        ]:
+            output = subprocess.run(
+                [sys.executable, __file__, "--phase", phase, "--chats", str(chats_dir), "--file", str(Path(tmp) / name)],
+                check=True, capture_output=True, text=True,
+            ).stdout
+            row = json.loads(output.strip().splitlines()[-1])
+            row["corpus_mb_per_s"] = round(corpus_bytes / 2**20 / row["seconds"], 1)
+            results.append(row)
+            print(json.dumps(row))
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Scaling of relevance scoring: original per-message loop vs batched NumPy scorer.
+
+"cold" includes entity extraction for every message; "warm" is the next turn
+of the same chat with two new messages, where only those are extracted.
+
+    python benchmarks/bench_relevance.py --sizes 100 1000 10000 100000 --out relevance.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from context_manager import ContextManager
+from relevance_scorer import top_k
+
+WORDS = ["Python", "FastAPI", "database", "Redis", "main.py", "42", "schema", "hello", "Docker", "Kubernetes",
+         "latency", "index", "query", "cache", "Postgres", "config.yaml", "3.14", "deploy", "review", "Graph"]
+
+
+def loop_scores(manager, current, texts, stamps, now):
+    scored = []
+    for text, stamp in zip(texts, stamps):
+        time_diff = (now - stamp).total_seconds() / 3600
+        recency = max(0, 1 - (time_diff / 24))
+        scored.append(recency * 0.3 + 0.5 * 0.4 + manager._calculate_relevance(current, text) * 0.3)
+    return sorted(range(len(scored)), key=lambda i: scored[i], reverse=True)[:10]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000, 100000])
+    parser.add_argument("--loop-max", type=int, default=20000, help="Skip the slow loop above this size")
+    parser.add_argument("--out", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    now = datetime.now()
+    current = "How should the Redis cache sit in front of Postgres?"
+    results = []
+    for n in args.sizes:
+        texts = [" ".join(rng.choices(WORDS, k=rng.randint(3, 12))) + f" item{i}" for i in range(n)]
+        stamps = [now - timedelta(minutes=rng.randint(0, 3000)) for _ in range(n)]
+        manager = ContextManager()
+
+        started = time.perf_counter()
+        top_k(manager.scorer.score(current, texts[:-2], timestamps=stamps[:-2], now=now, key="chat"), 10)
+        cold = time.perf_counter() - started
+        started = time.perf_counter()
+        top_k(manager.scorer.score(current, texts, timestamps=stamps, now=now, key="chat"), 10)
+        warm = time.perf_counter() - started
+
+        row = {"messages": n, "vectorized_cold_ms": round(cold * 1000, 2), "vectorized_warm_ms": round(warm * 1000, 2)}
+        if n <= args.loop_max:
+            started = time.perf_counter()
+            loop_scores(manager, current, texts, stamps, now)
+            row["loop_ms"] = round((time.perf_counter() - started) * 1000, 2)
+            row["warm_speedup"] = round(row["loop_ms"] / max(row["vectorized_warm_ms"], 1e-3), 1)
+        results.append(row)
+        print(json.dumps(row))
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
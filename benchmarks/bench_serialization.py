@@ -0,0 +1,132 @@
+"""Load/save throughput of chat, state and profile persistence for a large chat.
+
+Compares the legacy path (json + a full EnhancedMessage per stored message,
+model_dump/model_validate through dicts) with the serialization module
+(native pydantic JSON, optional orjson, MessageView history).
+
+    python benchmarks/bench_serialization.py --messages 10000 --out serialization.json
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from conversation_models import ConversationState, EnhancedMessage, UserProfile
+from serialization import _orjson, dump_model, dumps, load_model, loads, message_views
+
+
+def synthetic_chat(n: int) -> dict:
+    messages = []
+    for i in range(n):
+        text = f"Message {i} about Python, FastAPI and file_{i % 50}.py with some more words to pad it out"
+        if i % 2 == 0:
+            messages.append({"role": "user", "content": [{"type": "text", "text": text}]})
+        else:
+            messages.append({"role": "assistant", "content": text * 3})
+    return {"messages": messages}
+
+
+def synthetic_state(n: int) -> ConversationState:
+    return ConversationState(
+        chat_id="bench", user_id="bench_user", topic_summary="Discussion about: Python, FastAPI",
+        key_entities=["Python", "FastAPI"], conversation_stage="developing", last_updated=datetime.now(),
+        importance_scores={str(uuid.uuid4()): 0.5 for _ in range(n)},
+    )
+
+
+def timed(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--out", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    chat = synthetic_chat(args.messages)
+    state = synthetic_state(args.messages)
+    profile = UserProfile(
+        user_id="bench_user", communication_style={"formality": 0.2}, preferred_response_length="adaptive",
+        topic_preferences={f"topic{i}": 0.1 for i in range(100)}, clarification_frequency=0.1,
+        last_updated=datetime.now(),
+    )
+
+    with tempfile.TemporaryDirectory() as tmp:
+        chat_path = Path(tmp) / "chat.json"
+        state_path = Path(tmp) / "state.json"
+        chat_path.write_text(json.dumps(chat), encoding="utf-8")
+        size_mb = chat_path.stat().st_size / 1e6
+
+        def legacy_chat_load():
+            data = json.loads(chat_path.read_text(encoding="utf-8"))
+            contents = [msg.get("content", "") for msg in data.get("messages", [])]
+            return [
+                EnhancedMessage(role="user", content=c, timestamp=datetime.now(),
+                                message_id=str(uuid.uuid4()), importance_score=0.5)
+                for c in contents
+            ]
+
+        def fast_chat_load():
+            views = message_views(loads(chat_path.read_bytes()))
+            return [view.to_enhanced() for view in views[-20:]]
+
+        def legacy_chat_save():
+            chat_path.write_text(json.dumps(chat), encoding="utf-8")
+
+        def fast_chat_save():
+            chat_path.write_bytes(dumps(chat))
+
+        def legacy_state_round_trip():
+            state_path.write_text(json.dumps(state.model_dump(), default=str), encoding="utf-8")
+            return ConversationState.model_validate(json.loads(state_path.read_text(encoding="utf-8")))
+
+        def fast_state_round_trip():
+            state_path.write_bytes(dump_model(state))
+            return load_model(ConversationState, state_path.read_bytes())
+
+        def legacy_profile_round_trip():
+            return UserProfile.model_validate(json.loads(json.dumps(profile.model_dump(), default=str)))
+
+        def fast_profile_round_trip():
+            return load_model(UserProfile, dump_model(profile))
+
+        results = {"messages": args.messages, "chat_mb": round(size_mb, 2), "json_backend": "orjson" if _orjson else "json"}
+        for name, legacy, fast in [
+            ("chat_load", legacy_chat_load, fast_chat_load),
+            ("chat_save", legacy_chat_save, fast_chat_save),
+            ("state_round_trip", legacy_state_round_trip, fast_state_round_trip),
+            ("profile_round_trip", legacy_profile_round_trip, fast_profile_round_trip),
+        ]:
+            legacy_s = timed(legacy, args.repeat)
+            fast_s = timed(fast, args.repeat)
+            results[name] = {
+                "legacy_ms": round(legacy_s * 1000, 2),
+                "fast_ms": round(fast_s * 1000, 2),
+                "speedup": round(legacy_s / fast_s, 2),
+            }
+            if name.startswith("chat"):
+                results[name]["fast_msgs_per_s"] = round(args.messages / fast_s)
+                results[name]["fast_mb_per_s"] = round(size_mb / fast_s, 1)
+
+    print(json.dumps(results, indent=2))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Cold-start benchmark: import time of the app and latency of the first requests.
+
+Each measurement runs in a fresh interpreter so nothing is already imported.
+Exits non-zero when a median exceeds its regression budget or a heavy
+dependency (ddgs, openai, numpy) is loaded by the import itself.
+
+    python benchmarks/bench_startup.py --runs 5 --out startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LAZY_MODULES = ("ddgs", "openai", "numpy")
+
+IMPORT_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import main
+elapsed = (time.perf_counter() - started) * 1000
+print(json.dumps({"import_ms": elapsed, "lazy": [m for m in %r if m not in sys.modules]}))
+""" % (LAZY_MODULES,)
+
+FIRST_REQUEST_PROBE = """
+import json, time
+from fastapi.testclient import TestClient
+import main
+client = TestClient(main.app)
+timings = {}
+for name, call in [
+    ("clarify", lambda: client.post("/clarify", json={"message": "Please explain Python decorators"})),
+    ("list_chats", lambda: client.get("/list_chats")),
+    ("index", lambda: client.get("/")),
+]:
+    started = time.perf_counter()
+    call()
+    timings[name] = (time.perf_counter() - started) * 1000
+print(json.dumps(timings))
+"""
+
+
+def run_probe(code: str) -> dict:
+    env = dict(os.environ, WARMUP="0")
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-import-ms", type=float, default=600.0)
+    parser.add_argument("--budget-first-request-ms", type=float, default=300.0)
+    parser.add_argument("--out", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    imports = [run_probe(IMPORT_PROBE) for _ in range(args.runs)]
+    requests = [run_probe(FIRST_REQUEST_PROBE) for _ in range(args.runs)]
+    results = {
+        "import_ms": round(statistics.median(r["import_ms"] for r in imports), 1),
+        "lazy_modules": imports[0]["lazy"],
+        "first_request_ms": {
+            name: round(statistics.median(r[name] for r in requests), 1) for name in requests[0]
+        },
+        "budget": {"import_ms": args.budget_import_ms, "first_request_ms": args.budget_first_request_ms},
+    }
+    over = []
+    if results["import_ms"] > args.budget_import_ms:
+        over.append(f"import {results['import_ms']} ms > {args.budget_import_ms} ms")
+    for name, ms in results["first_request_ms"].items():
+        if ms > args.budget_first_request_ms:
+            over.append(f"first {name} {ms} ms > {args.budget_first_request_ms} ms")
+    for name in LAZY_MODULES:
+        if any(name not in r["lazy"] for r in imports):
+            over.append(f"import loads {name}")
+    results["over_budget"] = over
+
+    print(json.dumps(results, indent=2))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    sys.exit(1 if over else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Latency of the storage operations behind each turn: append, load, state, listing and archive reads.
+
+Appends go through utils.save_chat_message, once with the BM25 indexing a
+user's message gets and once without. Everything runs in a temporary chat
+directory; times are in milliseconds.
+
+    python benchmarks/bench_storage.py --messages 100 2000 --out storage.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import utils
+from bm25_index import IndexStore
+from compaction import FakeSummarizer, HistoryCompactor, stored_messages
+from context_manager import ContextManager
+from conversation_models import ConversationState
+from io_executor import read_model, write_model
+from results import summarize, write_results
+from tiered_storage import chat_names, demote, read_chat
+
+WORDS = ["Postgres", "index", "query", "latency", "cache", "the", "a", "deploy", "Redis", "and", "review", "of"]
+
+
+def make_messages(rng: random.Random, count: int) -> List[dict]:
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": " ".join(rng.choices(WORDS, k=40))}
+        for i in range(count)
+    ]
+
+
+def timed(fn: Callable, repeat: int) -> List[float]:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def run(chats_dir: Path, sizes: List[int], repeat: int, chats: int) -> Dict[str, List[float]]:
+    rng = random.Random(0)
+    # One loop for all async operations, so loop startup is not part of any timing
+    loop = asyncio.new_event_loop()
+    utils.CHATS_DIR = chats_dir
+    utils.memory_index = IndexStore(chats_dir)
+    results: Dict[str, List[float]] = {}
+
+    for count in sizes:
+        for name, user in ((f"append_indexed_{count}", "bench_user"), (f"append_{count}", None)):
+            (chats_dir / f"{name}.json").write_text(json.dumps({"messages": make_messages(rng, count)}))
+            message = {"role": "user", "content": " ".join(rng.choices(WORDS, k=40))}
+            results[f"chat.{name}"] = timed(lambda: utils.save_chat_message(name, message, user), repeat)
+
+        (chats_dir / f"read_{count}.json").write_text(json.dumps({"messages": make_messages(rng, count)}))
+        results[f"chat.read_{count}"] = timed(lambda: read_chat(chats_dir, f"read_{count}"), repeat)
+        demote(chats_dir, f"read_{count}")
+        results[f"chat.read_cold_{count}"] = timed(lambda: read_chat(chats_dir, f"read_{count}"), repeat)
+
+        compactor = HistoryCompactor(chats_dir, FakeSummarizer(), ContextManager()._extract_entities)
+        compact_ms = []
+        for i in range(max(1, repeat // 20)):
+            (chats_dir / f"compact_{count}_{i}.json").write_text(json.dumps({"messages": make_messages(rng, count)}))
+            started = time.perf_counter()
+            loop.run_until_complete(compactor.compact(f"compact_{count}_{i}"))
+            compact_ms.append((time.perf_counter() - started) * 1000)
+        results[f"chat.compact_{count}"] = compact_ms
+        results[f"archive.range_{count}"] = timed(lambda: stored_messages(chats_dir, f"compact_{count}_0", count // 2, count // 2 + 20), repeat)
+
+    state = ConversationState(
+        chat_id="bench", user_id="bench_user", topic_summary="Discussion about: Postgres, Redis",
+        key_entities=WORDS, conversation_stage="developing", last_updated=datetime.now(),
+        importance_scores={str(uuid.uuid4()): 0.5 for _ in range(200)},
+    )
+    state_path = chats_dir / "bench_state.json"
+    results["state.write"] = timed(lambda: loop.run_until_complete(write_model(state_path, state)), repeat)
+    results["state.read"] = timed(lambda: loop.run_until_complete(read_model(state_path, ConversationState)), repeat)
+
+    for i in range(chats):
+        (chats_dir / f"list_{i}.json").write_text('{"messages": []}')
+    results[f"chat.list_{chats}"] = timed(lambda: chat_names(chats_dir), max(5, repeat // 10))
+    loop.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, nargs="+", default=[100, 2000])
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--chats", type=int, default=1000, help="Chats in the directory when listing")
+    parser.add_argument("--out", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        samples = run(Path(tmp), args.messages, args.repeat, args.chats)
+    metrics, rows = {}, []
+    for name, values in samples.items():
+        summary = summarize(values, f"{name}.ms")
+        metrics.update(summary)
+        rows.append({"op": name, "calls": len(values), **{k[len(name) + 1:]: v for k, v in summary.items()}})
+        print(json.dumps(rows[-1]))
+
+    params = {"messages": args.messages, "repeat": args.repeat, "chats": args.chats}
+    write_results(args.out, "storage", params, metrics, rows)
+
+
+if __name__ == "__main__":
+    main()
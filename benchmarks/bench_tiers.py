@@ -0,0 +1,79 @@
+"""Space saved by the cold tier and the latency penalty of reading a cold chat.
+
+Chats mix text turns with an inline base64 image, like those the UI stores.
+
+    python benchmarks/bench_tiers.py --messages 20 200 2000 --out tiers.json
+"""
+import argparse
+import base64
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metrics import percentile
+from tiered_storage import CODECS, demote, promote, read_chat
+
+WORDS = ["Postgres", "index", "query", "latency", "cache", "the", "a", "deploy", "Redis", "and", "review", "of"]
+
+
+def make_chat(rng: random.Random, count: int) -> dict:
+    image = base64.b64encode(rng.randbytes(30_000)).decode()
+    messages = [{"role": "user" if i % 2 == 0 else "assistant", "content": " ".join(rng.choices(WORDS, k=80))} for i in range(count)]
+    messages.insert(0, {"role": "user", "content": [
+        {"type": "text", "text": "What is in this picture?"},
+        {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{image}"}},
+    ]})
+    return {"messages": messages}
+
+
+def time_reads(chats_dir: Path, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        read_chat(chats_dir, "chat")
+        samples.append((time.perf_counter() - started) * 1000)
+    return percentile(samples, 50)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, nargs="+", default=[20, 200, 2000])
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--out", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    results = []
+    for count in args.messages:
+        for codec in sorted(CODECS):
+            with tempfile.TemporaryDirectory() as tmp:
+                chats_dir = Path(tmp)
+                raw = json.dumps(make_chat(rng, count)).encode()
+                (chats_dir / "chat.json").write_bytes(raw)
+                hot_ms = time_reads(chats_dir, args.repeat)
+                saved = demote(chats_dir, "chat", codec)
+                cold_ms = time_reads(chats_dir, args.repeat)
+                started = time.perf_counter()
+                promote(chats_dir, "chat")
+                promote_ms = (time.perf_counter() - started) * 1000
+            row = {
+                "messages": count, "codec": codec, "bytes": len(raw), "saved_pct": round(100 * saved / len(raw), 1),
+                "hot_read_ms": round(hot_ms, 3), "cold_read_ms": round(cold_ms, 3),
+                "penalty_ms": round(cold_ms - hot_ms, 3), "promote_ms": round(promote_ms, 3),
+            }
+            results.append(row)
+            print(json.dumps(row))
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""Compare two benchmark result files and flag regressions.
+
+    python benchmarks/compare.py baseline/analyzers.json analyzers.json --threshold 15
+
+Exits non-zero when any shared metric got worse by more than the threshold.
+"""
+import argparse
+import sys
+
+from results import compare, load_results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("base", help="Result file of the reference run")
+    parser.add_argument("new", help="Result file of the run to check")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Allowed change in percent")
+    parser.add_argument("--only-regressions", action="store_true")
+    args = parser.parse_args()
+
+    base, new = load_results(args.base), load_results(args.new)
+    if base["benchmark"] != new["benchmark"]:
+        parser.error(f"different benchmarks: {base['benchmark']} vs {new['benchmark']}")
+    if base.get("params") != new.get("params"):
+        print("warning: runs used different parameters", file=sys.stderr)
+
+    rows = compare(base["metrics"], new["metrics"], args.threshold)
+    width = max((len(row["metric"]) for row in rows), default=10)
+    for row in rows:
+        if args.only_regressions and not row["regression"]:
+            continue
+        flag = "REGRESSION" if row["regression"] else ""
+        print(f"{row['metric']:<{width}}  {row['base']:>12.3f}  {row['new']:>12.3f}  {row['change_pct']:>+7.1f}%  {flag}")
+    regressions = sum(row["regression"] for row in rows)
+    print(f"{len(rows)} metrics compared, {regressions} regressions (threshold {args.threshold}%)")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
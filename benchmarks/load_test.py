@@ -0,0 +1,239 @@
+"""Load test of POST /chat: replay a requests.jsonl-style workload at a target rate.
+
+Each workload line is a JSON object; its "message" (or "body", or "title")
+is sent as a chat turn, to its "chat" and "user" when given and otherwise
+spread over --chats chats and --users users. Requests are sent open-loop
+at --rate per second (evenly spaced, or Poisson with --poisson), whether or
+not earlier ones have finished, so queueing shows up in the latencies.
+
+Without --url the app is started with uvicorn in a subprocess, on a
+temporary chat directory and against a local FakeOpenAIServer, so the run
+measures this code rather than an upstream model.
+
+Reports latency, time to first token (first body byte) and throughput:
+
+    python benchmarks/load_test.py --rate 20 --duration 30 --out load.json
+    python benchmarks/load_test.py --url http://127.0.0.1:3001 --workload requests.jsonl --rate 2
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_openai_server import FakeOpenAIServer
+from results import ROOT, summarize, write_results
+
+DEFAULT_WORKLOAD = os.path.join(os.path.dirname(os.path.abspath(__file__)), "workload.jsonl")
+CLARIFY_PREFIX = "I want to make sure I understand correctly."
+
+
+def load_workload(path: str, chats: int, users: int) -> List[Dict[str, str]]:
+    turns = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            message = record.get("message") or record.get("body") or record.get("title")
+            if not message:
+                continue
+            i = len(turns)
+            turns.append({
+                "message": message,
+                "chat": record.get("chat") or f"load-{i % chats}",
+                "user": record.get("user") or f"load-user-{i % users}",
+            })
+    if not turns:
+        raise ValueError(f"No messages in workload {path}")
+    return turns
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(url: str, proc: subprocess.Popen, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"App exited with status {proc.returncode}")
+        try:
+            if httpx.get(f"{url}/list_chats", timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f"App did not start within {timeout}s")
+
+
+@contextmanager
+def local_app(args: argparse.Namespace) -> Iterator[str]:
+    """The app on a free port, with its upstream pointed at a fake streaming server."""
+    tokens = [f" token{i}" for i in range(args.tokens)]
+    fake = FakeOpenAIServer(tokens=tokens, latency=args.llm_latency, chunk_delay=args.llm_chunk_delay).start()
+    chats_dir = tempfile.mkdtemp(prefix="load-test-")
+    port = free_port()
+    env = dict(
+        os.environ,
+        LLAMA_API_KEY="load-test",
+        LLAMA_BASE_URL=fake.url,
+        LLAMA_BASE_URLS=fake.url,
+        CHATS_DIR=chats_dir,
+    )
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT,
+        env=env,
+    )
+    url = f"http://127.0.0.1:{port}"
+    try:
+        wait_ready(url, proc)
+        yield url
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        fake.stop()
+        shutil.rmtree(chats_dir, ignore_errors=True)
+
+
+async def send_turn(client: httpx.AsyncClient, turn: Dict[str, str], scheduled: float, origin: float) -> Dict[str, Any]:
+    sent = time.perf_counter()
+    result: Dict[str, Any] = {"chat": turn["chat"], "user": turn["user"], "lag_ms": round((sent - origin - scheduled) * 1000, 3)}
+    try:
+        async with client.stream("POST", "/chat", json=turn) as response:
+            ttft_ms, chars, head = None, 0, ""
+            async for text in response.aiter_text():
+                if not text:
+                    continue
+                if ttft_ms is None:
+                    ttft_ms = (time.perf_counter() - sent) * 1000
+                if len(head) < 200:
+                    head += text
+                chars += len(text)
+        result["status"] = response.status_code
+        if response.status_code != 200:
+            result["outcome"] = "rejected" if response.status_code == 429 else "error"
+        elif head.startswith("[Error:"):
+            result.update(outcome="error", error=head[:200])
+        elif head.startswith(CLARIFY_PREFIX):
+            result["outcome"] = "clarified"
+        else:
+            result["outcome"] = "ok"
+        result.update(ttft_ms=round(ttft_ms, 3) if ttft_ms is not None else None, chars=chars)
+    except httpx.HTTPError as e:
+        result.update(status=None, outcome="error", error=type(e).__name__)
+    result["latency_ms"] = round((time.perf_counter() - sent) * 1000, 3)
+    return result
+
+
+async def replay(
+    url: str, turns: List[Dict[str, str]], rate: float, duration: float, poisson: bool, timeout: float, seed: int
+) -> Tuple[List[Dict[str, Any]], float, Dict[str, Any]]:
+    rng = random.Random(seed)
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=200)
+    async with httpx.AsyncClient(base_url=url, timeout=timeout, limits=limits) as client:
+        existing = set((await client.get("/list_chats")).json().get("chats", []))
+        for chat in sorted({turn["chat"] for turn in turns} - existing):
+            await client.post("/create_chat", data={"chat_name": chat})
+
+        origin = time.perf_counter()
+        tasks, at, i = [], 0.0, 0
+        while at < duration:
+            delay = origin + at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(send_turn(client, turns[i % len(turns)], at, origin)))
+            i += 1
+            at += rng.expovariate(rate) if poisson else 1 / rate
+        results = await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - origin
+
+        server = {}
+        for name in ("scheduler_stats", "loop_lag"):
+            try:
+                server[name] = (await client.get(f"/{name}")).json()
+            except (httpx.HTTPError, ValueError):
+                pass
+    return list(results), elapsed, server
+
+
+def report(results: List[Dict[str, Any]], elapsed: float, duration: float) -> Tuple[Dict[str, float], Dict[str, int]]:
+    outcomes: Dict[str, int] = {}
+    for result in results:
+        outcomes[result["outcome"]] = outcomes.get(result["outcome"], 0) + 1
+    answered = [r for r in results if r["outcome"] in ("ok", "clarified")]
+    ok = [r for r in results if r["outcome"] == "ok"]
+    metrics = {
+        "sent_per_s": round(len(results) / duration, 3),
+        "completed_per_s": round(len(answered) / elapsed, 3),
+        "chars_per_s": round(sum(r.get("chars", 0) for r in answered) / elapsed, 1),
+        "error_rate_pct": round(100 * (len(results) - len(answered)) / len(results), 2) if results else 0.0,
+    }
+    metrics.update(summarize([r["latency_ms"] for r in ok], "latency_ms"))
+    metrics.update(summarize([r["ttft_ms"] for r in ok if r["ttft_ms"] is not None], "ttft_ms"))
+    metrics.update(summarize([r["latency_ms"] for r in results if r["outcome"] == "clarified"], "clarify_latency_ms"))
+    metrics.update(summarize([r["lag_ms"] for r in results], "send_lag_ms"))
+    return metrics, {"requests": len(results), **outcomes}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="Target a running app instead of starting one")
+    parser.add_argument("--workload", default=DEFAULT_WORKLOAD, help="JSONL file of turns (requests.jsonl style)")
+    parser.add_argument("--rate", type=float, default=10.0, help="Requests per second")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds to send for")
+    parser.add_argument("--poisson", action="store_true", help="Exponential inter-arrival times instead of even spacing")
+    parser.add_argument("--chats", type=int, default=8)
+    parser.add_argument("--users", type=int, default=4)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tokens", type=int, default=40, help="Tokens per fake completion")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Fake upstream time to first byte (s)")
+    parser.add_argument("--llm-chunk-delay", type=float, default=0.005, help="Fake upstream delay between tokens (s)")
+    parser.add_argument("--out", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    turns = load_workload(args.workload, args.chats, args.users)
+
+    def run(url: str):
+        return asyncio.run(replay(url, turns, args.rate, args.duration, args.poisson, args.timeout, args.seed))
+
+    if args.url:
+        results, elapsed, server = run(args.url.rstrip("/"))
+    else:
+        with local_app(args) as url:
+            results, elapsed, server = run(url)
+
+    metrics, counts = report(results, elapsed, args.duration)
+    print(json.dumps(counts))
+    for name, value in metrics.items():
+        print(f"{name:<28} {value}")
+
+    params = {
+        key: getattr(args, key)
+        for key in ("rate", "duration", "poisson", "chats", "users", "seed", "tokens", "llm_latency", "llm_chunk_delay")
+    }
+    params.update(workload=os.path.basename(args.workload), target="external" if args.url else "local")
+    write_results(args.out, "load", params, metrics, results, counts=counts, server=server)
+
+
+if __name__ == "__main__":
+    main()
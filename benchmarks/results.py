@@ -0,0 +1,101 @@
+"""Shared JSON result format for the benchmarks, so runs can be compared.
+
+    {"benchmark": "analyzers", "meta": {...}, "params": {...}, "metrics": {"intent.clear.us_p50": 41.2, ...}, "rows": [...]}
+
+metrics is a flat map of numbers; names ending in _per_s are better when
+higher, everything else (latencies, sizes, error rates) when lower.
+Compare two runs with benchmarks/compare.py.
+"""
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metrics import percentile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def environment() -> Dict[str, Any]:
+    """Where and on what a run happened, to tell apart regressions from a different machine."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, timeout=10
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def summarize(samples: Iterable[float], prefix: str) -> Dict[str, float]:
+    """p50/p95/p99 and max of samples as prefix_p50 ... metrics."""
+    values = list(samples)
+    if not values:
+        return {}
+    return {
+        f"{prefix}_p50": round(percentile(values, 50), 3),
+        f"{prefix}_p95": round(percentile(values, 95), 3),
+        f"{prefix}_p99": round(percentile(values, 99), 3),
+        f"{prefix}_max": round(max(values), 3),
+    }
+
+
+def write_results(
+    path: Optional[str],
+    benchmark: str,
+    params: Dict[str, Any],
+    metrics: Dict[str, float],
+    rows: Optional[List[Dict[str, Any]]] = None,
+    **extra: Any,
+) -> Dict[str, Any]:
+    """Write one run; extra keys (counts, server stats) are kept but not compared."""
+    result = {"benchmark": benchmark, "meta": environment(), "params": params, "metrics": metrics, **extra}
+    if rows is not None:
+        result["rows"] = rows
+    if path:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+    return result
+
+
+def load_results(path: str) -> Dict[str, Any]:
+    with open(path, encoding="utf-8") as f:
+        result = json.load(f)
+    if not isinstance(result, dict) or "metrics" not in result:
+        raise ValueError(f"{path} is not a benchmark result with metrics")
+    return result
+
+
+def higher_is_better(metric: str) -> bool:
+    return metric.endswith("_per_s")
+
+
+def compare(base: Dict[str, float], new: Dict[str, float], threshold_pct: float = 10.0) -> List[Dict[str, Any]]:
+    """Per shared metric: the change in percent and whether it is a regression beyond threshold_pct."""
+    rows = []
+    for metric in sorted(set(base) & set(new)):
+        old, value = base[metric], new[metric]
+        if old == 0:
+            change = 0.0 if value == 0 else float("inf")
+        else:
+            change = (value - old) / abs(old) * 100
+        worse = -change if higher_is_better(metric) else change
+        rows.append({
+            "metric": metric,
+            "base": old,
+            "new": value,
+            "change_pct": round(change, 1),
+            "regression": worse > threshold_pct,
+        })
+    return rows
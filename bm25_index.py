@@ -0,0 +1,426 @@
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+import shutil
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from pydantic import BaseModel
+
+from compaction import stored_messages
+from tiered_storage import chat_names, read_chat
+from serialization import content_text, dumps, loads
+
+# NumPy is imported inside the methods that use it, so importing the app
+# does not pay for it until an index is first opened
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Standard BM25 parameters
+K1 = 1.2
+B = 0.75
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens used for both indexing and queries."""
+    return _TOKEN_RE.findall(text.lower())
+
+
+def user_directory(user: str) -> str:
+    """Index directory name for a user id: a digest, so distinct ids never share an index."""
+    return hashlib.sha256(user.encode("utf-8")).hexdigest()
+
+
+class SearchHit(BaseModel):
+    chat: str
+    message: int
+    score: float
+    role: Optional[str] = None
+    content: Optional[str] = None
+
+
+class BM25Index:
+    """Incremental BM25 inverted index over one user's chat messages.
+
+    Each stored message is a document. The bulk of the index is an
+    immutable segment of NumPy arrays that is memory-mapped on load:
+
+        seg-<gen>/meta.json     terms (in id order), chat names, total length
+        seg-<gen>/offsets.npy   CSR offsets of each term's postings
+        seg-<gen>/postings.npy  (doc, term frequency) pairs, uint32
+        seg-<gen>/docs.npy      (chat, message, length) per document, uint32
+
+    New messages are appended to delta-<gen>.jsonl and kept in memory;
+    once the delta holds merge_threshold documents it is merged into a new
+    segment generation and CURRENT is switched over atomically, so a crash
+    at any point leaves a consistent segment and delta pair. Removing a
+    chat appends a tombstone to the delta; its documents are skipped by
+    search and dropped at the next merge.
+    """
+
+    def __init__(self, directory: Path, merge_threshold: int = 2000):
+        self.directory = Path(directory)
+        self.merge_threshold = merge_threshold
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        import numpy as np
+
+        current = self.directory / "CURRENT"
+        self.generation = int(current.read_text()) if current.exists() else 0
+        segment = self.directory / f"seg-{self.generation}"
+        if (segment / "meta.json").exists():
+            meta = loads((segment / "meta.json").read_bytes())
+            self.terms: Dict[str, int] = {term: i for i, term in enumerate(meta["terms"])}
+            self.chats: List[str] = meta["chats"]
+            self.total_length = meta["total_length"]
+            self.offsets = np.load(segment / "offsets.npy", mmap_mode="r")
+            self.postings = np.load(segment / "postings.npy", mmap_mode="r")
+            self.docs = np.load(segment / "docs.npy", mmap_mode="r")
+        else:
+            self.terms, self.chats, self.total_length = {}, [], 0
+            self.offsets = np.zeros(1, dtype=np.uint64)
+            self.postings = np.zeros((0, 2), dtype=np.uint32)
+            self.docs = np.zeros((0, 3), dtype=np.uint32)
+        self.segment_terms = len(self.terms)
+        self._chat_ids = {chat: i for i, chat in enumerate(self.chats)}
+        self._delta_docs: List[Tuple[int, int, int]] = []
+        self._delta_postings: Dict[int, List[Tuple[int, int]]] = {}
+        self._removed: Set[int] = set()  # chat ids whose documents are tombstoned
+        self._removed_docs = 0
+        delta = self._delta_path()
+        if delta.exists():
+            self._load_delta(delta)
+
+    def _load_delta(self, delta: Path):
+        # A crash during add() can leave a torn last line; keep the complete entries and cut it off
+        good = 0
+        with open(delta, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                if line.strip():
+                    try:
+                        entry = loads(line)
+                        if "remove" in entry:
+                            self._remove_in_memory(entry["remove"])
+                        else:
+                            self._add_in_memory(entry["chat"], entry["message"], entry["tf"])
+                    except (ValueError, KeyError, TypeError):
+                        break
+                good += len(line)
+            size = f.seek(0, os.SEEK_END)
+        if good < size:
+            logger.warning("Dropping %d bytes of incomplete index entries from %s", size - good, delta)
+            with open(delta, "r+b") as f:
+                f.truncate(good)
+
+    def _delta_path(self) -> Path:
+        return self.directory / f"delta-{self.generation}.jsonl"
+
+    def __len__(self) -> int:
+        return len(self.docs) + len(self._delta_docs)
+
+    def add(self, chat: str, message: int, text: str):
+        """Index one message; it is searchable immediately and durable once this returns."""
+        tf = dict(Counter(tokenize(text)))
+        with self._lock:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with open(self._delta_path(), "ab") as f:
+                f.write(dumps({"chat": chat, "message": message, "tf": tf}) + b"\n")
+            self._add_in_memory(chat, message, tf)
+            if len(self._delta_docs) >= self.merge_threshold:
+                self._merge()
+
+    def _add_in_memory(self, chat: str, message: int, tf: Dict[str, int]):
+        chat_id = self._chat_ids.get(chat)
+        if chat_id is None:
+            chat_id = self._chat_ids[chat] = len(self.chats)
+            self.chats.append(chat)
+        doc = len(self)
+        length = sum(tf.values())
+        self._delta_docs.append((chat_id, message, length))
+        self.total_length += length
+        for term, count in tf.items():
+            term_id = self.terms.setdefault(term, len(self.terms))
+            self._delta_postings.setdefault(term_id, []).append((doc, count))
+
+    def remove_chat(self, chat: str):
+        """Drop every document of a chat, e.g. before indexing a replaced copy of it."""
+        with self._lock:
+            if chat not in self._chat_ids:
+                return
+            with open(self._delta_path(), "ab") as f:
+                f.write(dumps({"remove": chat}) + b"\n")
+            self._remove_in_memory(chat)
+
+    def _remove_in_memory(self, chat: str):
+        import numpy as np
+
+        chat_id = self._chat_ids.pop(chat, None)
+        if chat_id is None:
+            return
+        # Documents added afterwards get a fresh chat id, so the tombstone only covers these
+        self._removed.add(chat_id)
+        rows = np.concatenate([
+            np.asarray(self.docs, dtype=np.int64),
+            np.array(self._delta_docs, dtype=np.int64).reshape(-1, 3),
+        ])
+        lengths = rows[rows[:, 0] == chat_id, 2]
+        self._removed_docs += len(lengths)
+        self.total_length -= int(lengths.sum())
+
+    def merge(self):
+        """Fold the in-memory delta into a new on-disk segment."""
+        with self._lock:
+            self._merge()
+
+    def _merge(self):
+        if not self._delta_docs and not self._removed:
+            return
+        import numpy as np
+
+        # Flatten both parts into (term, doc, tf) triples; delta docs all come after segment docs
+        segment_dfs = np.diff(self.offsets.astype(np.int64))
+        delta_terms = np.fromiter(
+            (t for t, plist in self._delta_postings.items() for _ in plist), dtype=np.int64
+        )
+        delta_pairs = np.array(
+            [pair for plist in self._delta_postings.values() for pair in plist], dtype=np.uint32
+        ).reshape(-1, 2)
+        term_of = np.concatenate([np.repeat(np.arange(len(segment_dfs)), segment_dfs), delta_terms])
+        pairs = np.concatenate([np.asarray(self.postings), delta_pairs])
+        docs = np.concatenate([np.asarray(self.docs), np.array(self._delta_docs, dtype=np.uint32).reshape(-1, 3)])
+        chats = self.chats
+        if self._removed:
+            # Drop the tombstoned chats' documents and renumber the remaining documents and chats
+            keep = ~np.isin(docs[:, 0], list(self._removed))
+            live = keep[pairs[:, 0]]
+            term_of, pairs = term_of[live], pairs[live]
+            pairs[:, 0] = (np.cumsum(keep) - 1)[pairs[:, 0]]
+            live_chats = [i for i in range(len(chats)) if i not in self._removed]
+            chat_ids = np.zeros(len(chats), dtype=np.uint32)
+            chat_ids[live_chats] = np.arange(len(live_chats))
+            docs = docs[keep]
+            docs[:, 0] = chat_ids[docs[:, 0]]
+            chats = [chats[i] for i in live_chats]
+        order = np.lexsort((pairs[:, 0], term_of))
+        postings = pairs[order]
+        offsets = np.zeros(len(self.terms) + 1, dtype=np.uint64)
+        offsets[1:] = np.cumsum(np.bincount(term_of, minlength=len(self.terms)))
+
+        generation = self.generation + 1
+        segment = self.directory / f"seg-{generation}"
+        shutil.rmtree(segment, ignore_errors=True)
+        segment.mkdir(parents=True)
+        np.save(segment / "offsets.npy", offsets)
+        np.save(segment / "postings.npy", postings)
+        np.save(segment / "docs.npy", docs)
+        terms = sorted(self.terms, key=self.terms.get)
+        (segment / "meta.json").write_bytes(
+            dumps({"terms": terms, "chats": chats, "total_length": self.total_length})
+        )
+        tmp = self.directory / "CURRENT.tmp"
+        tmp.write_text(str(generation))
+        os.replace(tmp, self.directory / "CURRENT")
+
+        old_segment, old_delta = self.directory / f"seg-{self.generation}", self._delta_path()
+        self._load()
+        shutil.rmtree(old_segment, ignore_errors=True)
+        old_delta.unlink(missing_ok=True)
+
+    def _postings(self, term_id: int) -> Tuple["np.ndarray", "np.ndarray"]:
+        import numpy as np
+
+        parts = []
+        if term_id < self.segment_terms:
+            start, end = int(self.offsets[term_id]), int(self.offsets[term_id + 1])
+            parts.append(np.asarray(self.postings[start:end], dtype=np.int64))
+        delta = self._delta_postings.get(term_id)
+        if delta:
+            parts.append(np.array(delta, dtype=np.int64))
+        pairs = np.concatenate(parts) if parts else np.zeros((0, 2), dtype=np.int64)
+        if self._removed:
+            pairs = pairs[~np.isin(self._doc_columns(pairs[:, 0])[:, 0], list(self._removed))]
+        return pairs[:, 0], pairs[:, 1]
+
+    def _doc_columns(self, doc_ids: "np.ndarray") -> "np.ndarray":
+        """(chat, message, length) rows for document ids from either part."""
+        import numpy as np
+
+        rows = np.zeros((len(doc_ids), 3), dtype=np.int64)
+        in_segment = doc_ids < len(self.docs)
+        rows[in_segment] = self.docs[doc_ids[in_segment]]
+        if not in_segment.all():
+            delta = np.array(self._delta_docs, dtype=np.int64).reshape(-1, 3)
+            rows[~in_segment] = delta[doc_ids[~in_segment] - len(self.docs)]
+        return rows
+
+    def search(
+        self,
+        query: str,
+        k: int = 10,
+        exclude_chats: Sequence[str] = (),
+        deadline: Optional[float] = None,
+    ) -> List[SearchHit]:
+        """Top-k messages by BM25 score, best first.
+
+        Query terms are scored rarest first; if the perf_counter deadline
+        passes, the remaining (most common, least informative) terms are
+        skipped and the best hits found so far are returned.
+        """
+        import numpy as np
+        from relevance_scorer import top_k
+
+        with self._lock:
+            n = len(self) - self._removed_docs
+            term_ids = {self.terms[t] for t in tokenize(query) if t in self.terms}
+            if n == 0 or not term_ids:
+                return []
+            postings = sorted((self._postings(t) for t in term_ids), key=lambda p: len(p[0]))
+            avgdl = self.total_length / n
+            doc_parts, score_parts = [], []
+            for docs, tfs in postings:
+                if deadline is not None and doc_parts and time.perf_counter() > deadline:
+                    break
+                df = len(docs)
+                idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+                lengths = self._doc_columns(docs)[:, 2]
+                doc_parts.append(docs)
+                score_parts.append(idf * tfs * (K1 + 1) / (tfs + K1 * (1 - B + B * lengths / avgdl)))
+            # Dense accumulation: a bincount over all documents beats sorting the matched ids
+            totals = np.bincount(np.concatenate(doc_parts), weights=np.concatenate(score_parts), minlength=n)
+            candidates = np.flatnonzero(totals)
+            scores = totals[candidates]
+            rows = self._doc_columns(candidates)
+            if exclude_chats:
+                excluded = [self._chat_ids[c] for c in exclude_chats if c in self._chat_ids]
+                scores[np.isin(rows[:, 0], excluded)] = -np.inf
+            best = [i for i in top_k(scores, k) if np.isfinite(scores[i])]
+            return [
+                SearchHit(chat=self.chats[rows[i, 0]], message=int(rows[i, 1]), score=float(scores[i]))
+                for i in best
+            ]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "documents": len(self) - self._removed_docs,
+                "terms": len(self.terms),
+                "chats": len(self.chats),
+                "segment_documents": len(self.docs),
+                "delta_documents": len(self._delta_docs),
+                "generation": self.generation,
+            }
+
+
+class IndexStore:
+    """Per-user BM25 indexes under <chats_dir>/index, opened on first use."""
+
+    def __init__(self, chats_dir: Path, merge_threshold: int = 2000, recall_k: int = 3, budget_ms: float = 50):
+        self.chats_dir = Path(chats_dir)
+        self.merge_threshold = merge_threshold
+        self.recall_k = recall_k
+        self.budget_ms = budget_ms
+        self._indexes: Dict[str, BM25Index] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, chats_dir: Path) -> "IndexStore":
+        return cls(
+            chats_dir,
+            merge_threshold=int(os.environ.get("MEMORY_MERGE_DOCS", "2000")),
+            recall_k=int(os.environ.get("MEMORY_RECALL_K", "3")),
+            budget_ms=float(os.environ.get("MEMORY_BUDGET_MS", "50")),
+        )
+
+    def get(self, user: str) -> BM25Index:
+        with self._lock:
+            index = self._indexes.get(user)
+            if index is None:
+                directory = self.chats_dir / "index" / user_directory(user)
+                index = self._indexes[user] = BM25Index(directory, self.merge_threshold)
+            return index
+
+    def add(self, user: str, chat: str, message: int, content: Any):
+        text = content_text(content)
+        if text:
+            self.get(user).add(chat, message, text)
+
+    def remove_chat(self, user: str, chat: str):
+        self.get(user).remove_chat(chat)
+
+    def search(
+        self,
+        user: str,
+        query: str,
+        k: int = 10,
+        exclude_chats: Sequence[str] = (),
+        budget_ms: Optional[float] = None,
+    ) -> List[SearchHit]:
+        """Search a user's messages and attach each hit's stored role and content."""
+        deadline = None if budget_ms is None else time.perf_counter() + budget_ms / 1000
+        # Over-fetch a little so hits from rewritten chats can be dropped
+        hits = self.get(user).search(query, k * 2, exclude_chats, deadline)
+        chats: Dict[str, Optional[Dict[str, Any]]] = {}
+        results = []
+        for hit in hits:
+            if hit.chat not in chats:
+                chats[hit.chat] = read_chat(self.chats_dir, hit.chat)
+            data = chats[hit.chat]
+            stored = stored_messages(self.chats_dir, hit.chat, hit.message, hit.message + 1, data) if data else []
+            if stored:
+                hit.role = stored[0].get("role")
+                hit.content = content_text(stored[0].get("content"))
+                results.append(hit)
+            if len(results) == k:
+                break
+        return results
+
+    def rebuild(self) -> Dict[str, int]:
+        """Reindex every stored chat, attributing each to the user in its state file."""
+        shutil.rmtree(self.chats_dir / "index", ignore_errors=True)
+        with self._lock:
+            self._indexes.clear()
+        counts: Dict[str, int] = {}
+        for chat in chat_names(self.chats_dir):
+            state_path = self.chats_dir / f"{chat}_state.json"
+            user = loads(state_path.read_bytes()).get("user_id", "default_user") if state_path.exists() else "default_user"
+            for i, message in enumerate(stored_messages(self.chats_dir, chat)):
+                self.add(user, chat, i, message.get("content"))
+                counts[user] = counts.get(user, 0) + 1
+        for index in list(self._indexes.values()):
+            index.merge()
+        return counts
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Maintain and query the per-user BM25 message index")
+    parser.add_argument("--chats", default="chats", help="Chat storage directory")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("rebuild", help="Reindex all stored chats")
+    search = sub.add_parser("search", help="Search one user's messages")
+    search.add_argument("query")
+    search.add_argument("--user", default="default_user")
+    search.add_argument("-k", type=int, default=10)
+    args = parser.parse_args()
+
+    store = IndexStore(Path(args.chats))
+    if args.command == "rebuild":
+        print(json.dumps(store.rebuild(), indent=2))
+    else:
+        for hit in store.search(args.user, args.query, args.k):
+            print(f"{hit.score:7.3f}  {hit.chat}#{hit.message} [{hit.role}] {hit.content[:100]!r}")
@@ -0,0 +1,405 @@
+import os
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional
+
+from io_executor import replace_bytes
+from serialization import content_text, dumps, loads
+from tiered_storage import archive_path, chat_file, chat_names, discard_cold, open_archive, read_chat
+
+# Export format: newline-delimited JSON, one record per line, in this order per chat
+#   {"type": "chat", "chat": ..., "user": ..., "updated": ..., "offset": ..., "summaries": [...]}
+#   {"type": "message", "chat": ..., "index": ..., "message": {...}}   (one per stored message)
+#   {"type": "state", "chat": ..., "data": {...}}
+# followed by {"type": "profile", "user": ..., "data": {...}} records.
+# Records are produced and consumed one at a time, so memory stays bounded
+# by the largest single chat file rather than the size of the corpus.
+
+CHUNK_SIZE = 64 * 1024
+_GZIP_MAGIC = b"\x1f\x8b"
+
+# Fields each record type must carry, with their JSON types
+_RECORD_FIELDS: Dict[str, Dict[str, type]] = {
+    "chat": {"chat": str},
+    "message": {"chat": str, "index": int, "message": dict},
+    "state": {"chat": str, "data": dict},
+    "profile": {"user": str, "data": dict},
+}
+_OPTIONAL_FIELDS: Dict[str, Dict[str, type]] = {
+    "chat": {"offset": int, "summaries": list},
+}
+
+
+def _read(path: Path) -> Optional[Dict[str, Any]]:
+    return loads(path.read_bytes()) if path.exists() else None
+
+
+def _updated(data: Optional[Dict[str, Any]], path: Path) -> datetime:
+    if data and data.get("last_updated"):
+        return datetime.fromisoformat(str(data["last_updated"]))
+    return datetime.fromtimestamp(path.stat().st_mtime)
+
+
+def _local(value: datetime) -> datetime:
+    """Naive local time, so stored naive timestamps compare with aware filter bounds."""
+    return value.astimezone().replace(tzinfo=None) if value.tzinfo else value
+
+
+def _in_range(updated: datetime, since: Optional[datetime], until: Optional[datetime]) -> bool:
+    updated = _local(updated)
+    return (since is None or updated >= _local(since)) and (until is None or updated <= _local(until))
+
+
+def export_records(
+    chats_dir: Path,
+    user: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> Iterator[bytes]:
+    """Yield NDJSON lines for the chats, states and profiles matching the filters.
+
+    A chat belongs to the user recorded in its state file (default_user when
+    it has none) and is dated by the state's last update, else the file's
+    modification time.
+    """
+    if not chats_dir.exists():
+        return
+    for chat in chat_names(chats_dir):
+        path = chat_file(chats_dir, chat)
+        if path is None:
+            continue  # deleted while exporting
+        state = _read(chats_dir / f"{chat}_state.json")
+        owner = state.get("user_id", "default_user") if state else "default_user"
+        updated = _updated(state, path)
+        if (user is not None and owner != user) or not _in_range(updated, since, until):
+            continue
+        data = read_chat(chats_dir, chat)
+        if data is None:
+            continue
+        offset = data.get("offset", 0)
+        yield dumps({
+            "type": "chat", "chat": chat, "user": owner, "updated": updated.isoformat(),
+            "offset": offset, "summaries": data.get("summaries", []),
+        }) + b"\n"
+        archive = open_archive(chats_dir, chat) if offset else None
+        if archive is not None:
+            with archive as f:
+                for index, line in enumerate(f):
+                    if index >= offset:
+                        break
+                    yield b'{"type":"message","chat":' + dumps(chat) + b',"index":' + str(index).encode() + b',"message":' + line.rstrip(b"\n") + b"}\n"
+        for index, message in enumerate(data.get("messages", []), start=offset):
+            yield dumps({"type": "message", "chat": chat, "index": index, "message": message}) + b"\n"
+        if state is not None:
+            yield dumps({"type": "state", "chat": chat, "data": state}) + b"\n"
+    for path in sorted(chats_dir.glob("profile_*.json")):
+        profile = _read(path)
+        if profile is None or (user is not None and profile.get("user_id") != user):
+            continue
+        if not _in_range(_updated(profile, path), since, until):
+            continue
+        owner = profile.get("user_id") or path.stem[len("profile_"):]
+        yield dumps({"type": "profile", "user": owner, "data": profile}) + b"\n"
+
+
+def chunked(lines: Iterable[bytes], size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Group small lines into chunks of about size bytes."""
+    buffer: List[bytes] = []
+    buffered = 0
+    for line in lines:
+        buffer.append(line)
+        buffered += len(line)
+        if buffered >= size:
+            yield b"".join(buffer)
+            buffer, buffered = [], 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+def gzip_chunks(chunks: Iterable[bytes], level: int = 1) -> Iterator[bytes]:
+    """Gzip-compress a byte stream on the fly.
+
+    Level 1 by default: compression runs inline with the stream, and the
+    higher levels cost several times the CPU for a modestly smaller file.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        out = compressor.compress(chunk)
+        if out:
+            yield out
+    yield compressor.flush()
+
+
+def export_stream(
+    chats_dir: Path,
+    user: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    compress: bool = False,
+) -> Iterator[bytes]:
+    """Export as a stream of byte chunks, optionally gzip-compressed."""
+    chunks = chunked(export_records(chats_dir, user, since, until))
+    return gzip_chunks(chunks) if compress else chunks
+
+
+class NDJSONDecoder:
+    """Split a possibly gzip-compressed byte stream into complete lines."""
+
+    def __init__(self):
+        self._decompressor: Optional[Any] = None
+        self._started = False
+        self._pending = b""
+
+    def feed(self, chunk: bytes) -> List[bytes]:
+        if not self._started and chunk:
+            self._started = True
+            if chunk[:2] == _GZIP_MAGIC:
+                self._decompressor = zlib.decompressobj(31)
+        if self._decompressor is not None:
+            try:
+                chunk = self._decompressor.decompress(chunk)
+            except zlib.error as e:
+                raise ValueError(f"invalid gzip stream ({e})") from None
+        lines = (self._pending + chunk).split(b"\n")
+        self._pending = lines.pop()
+        return [line for line in lines if line.strip()]
+
+    def close(self) -> List[bytes]:
+        tail = self._decompressor.flush() if self._decompressor is not None else b""
+        lines = [line for line in (self._pending + tail).split(b"\n") if line.strip()]
+        self._pending = b""
+        return lines
+
+
+async def ndjson_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[List[bytes]]:
+    """Batches of complete lines from an async byte stream, such as a request body."""
+    decoder = NDJSONDecoder()
+    async for chunk in chunks:
+        lines = decoder.feed(chunk)
+        if lines:
+            yield lines
+    lines = decoder.close()
+    if lines:
+        yield lines
+
+
+class ChatImporter:
+    """Write exported records back into a chats directory, one record at a time.
+
+    Each chat is streamed into temporary files (live messages as JSON,
+    compacted ones into the archive). Once its last record has arrived it
+    is listed by ready() and swapped in by commit(), which callers that
+    share the directory run under the chat's path_lock. When an IndexStore
+    is given, commit() also replaces the chat's entries in its owner's
+    search index, so re-importing a chat does not duplicate them.
+    """
+
+    def __init__(self, chats_dir: Path, index: Optional[Any] = None, skip_existing: bool = False):
+        self.chats_dir = chats_dir
+        self.index = index
+        self.skip_existing = skip_existing
+        self.counts = {"chats": 0, "messages": 0, "states": 0, "profiles": 0, "skipped": 0}
+        self._line = 0
+        self._chat: Optional[Dict[str, Any]] = None
+        self._ready: List[Dict[str, Any]] = []
+
+    def feed(self, lines: Iterable[bytes]):
+        for line in lines:
+            self._line += 1
+            try:
+                record = loads(line)
+                kind = record["type"]
+            except (ValueError, KeyError, TypeError) as e:
+                raise ValueError(f"line {self._line}: not an export record ({e})") from None
+            handler = getattr(self, f"_on_{kind}", None)
+            if handler is None or kind not in _RECORD_FIELDS:
+                raise ValueError(f"line {self._line}: unknown record type {kind!r}")
+            self._check(kind, record)
+            handler(record)
+
+    def _check(self, kind: str, record: Dict[str, Any]):
+        for fields, required in ((_RECORD_FIELDS[kind], True), (_OPTIONAL_FIELDS.get(kind, {}), False)):
+            for field, expected in fields.items():
+                value = record.get(field)
+                if value is None and not required:
+                    continue
+                # bool is an int subclass, but never a valid index or offset
+                if not isinstance(value, expected) or isinstance(value, bool):
+                    raise ValueError(f"line {self._line}: {kind} record needs {expected.__name__} {field!r}")
+
+    def close(self):
+        self._finish_chat()
+
+    def ready(self) -> List[Dict[str, Any]]:
+        """Fully written chats waiting to be swapped in with commit()."""
+        return list(self._ready)
+
+    def commit(self, chat: Dict[str, Any]):
+        """Swap a ready chat's temporary files into place."""
+        self._ready.remove(chat)
+        if "archive_tmp" in chat:
+            os.replace(chat["archive_tmp"], archive_path(self.chats_dir, chat["chat"]))
+        os.replace(chat["tmp"], chat["path"])
+        discard_cold(self.chats_dir, chat["chat"])
+        if self.index is not None:
+            user = chat.get("user") or "default_user"
+            for owner in {user, chat["previous_user"]} - {None}:
+                self.index.remove_chat(owner, chat["chat"])
+            for index, content in chat["texts"]:
+                self.index.add(user, chat["chat"], index, content)
+        self.counts["chats"] += 1
+
+    def abort(self):
+        """Discard the partially written and not yet committed chats after an error."""
+        chat, self._chat = self._chat, None
+        if chat is not None and not chat["skip"]:
+            for handle, tmp in (("out", "tmp"), ("archive", "archive_tmp")):
+                if handle in chat:
+                    chat[handle].close()
+                    os.unlink(chat[tmp])
+        ready, self._ready = self._ready, []
+        for chat in ready:
+            for tmp in ("tmp", "archive_tmp"):
+                if tmp in chat:
+                    os.unlink(chat[tmp])
+
+    def _name(self, value: Any) -> str:
+        name = str(value)
+        if not name or name.startswith(".") or "/" in name or "\\" in name:
+            raise ValueError(f"line {self._line}: invalid name {name!r}")
+        return name
+
+    def _skip(self, path: Path) -> bool:
+        if self.skip_existing and path.exists():
+            self.counts["skipped"] += 1
+            return True
+        return False
+
+    def _on_chat(self, record: Dict[str, Any]):
+        self._finish_chat()
+        self.chats_dir.mkdir(parents=True, exist_ok=True)
+        path = self.chats_dir / f"{self._name(record['chat'])}.json"
+        chat = dict(record, path=path, skip=self._skip(path), live=0, archived=0, texts=[], previous_user=None)
+        if not chat["skip"]:
+            if self.index is not None and chat_file(self.chats_dir, record["chat"]) is not None:
+                # The replaced copy's index entries may be filed under a different owner
+                state = _read(self.chats_dir / f"{record['chat']}_state.json")
+                chat["previous_user"] = state.get("user_id", "default_user") if state else "default_user"
+            chat["tmp"] = path.with_name(path.name + ".importing")
+            chat["out"] = open(chat["tmp"], "wb")
+            chat["out"].write(b'{"messages":[')
+            if record.get("offset"):
+                archive = archive_path(self.chats_dir, record["chat"])
+                archive.parent.mkdir(parents=True, exist_ok=True)
+                chat["archive_tmp"] = archive.with_name(archive.name + ".importing")
+                chat["archive"] = open(chat["archive_tmp"], "wb")
+        self._chat = chat
+
+    def _on_message(self, record: Dict[str, Any]):
+        chat = self._chat
+        if chat is None or chat["chat"] != record.get("chat"):
+            raise ValueError(f"line {self._line}: message outside its chat record")
+        if chat["skip"]:
+            return
+        raw = dumps(record["message"])
+        if record["index"] < chat.get("offset", 0):
+            chat["archive"].write(raw + b"\n")
+            chat["archived"] += 1
+        else:
+            chat["out"].write((b"," if chat["live"] else b"") + raw)
+            chat["live"] += 1
+        if self.index is not None:
+            text = content_text(record["message"].get("content"))
+            if text:
+                chat["texts"].append((record["index"], text))
+        self.counts["messages"] += 1
+
+    def _finish_chat(self):
+        chat, self._chat = self._chat, None
+        if chat is None or chat["skip"]:
+            return
+        out = chat["out"]
+        out.write(b"]")
+        if chat["archived"]:
+            archive = chat.pop("archive")
+            out.write(b',"offset":' + str(chat["archived"]).encode())
+            out.write(b',"summaries":' + dumps(chat.get("summaries", [])))
+            out.write(b',"archive_bytes":' + str(archive.tell()).encode())
+            archive.close()
+        elif "archive" in chat:
+            chat.pop("archive").close()
+            os.unlink(chat.pop("archive_tmp"))
+        out.write(b"}")
+        chat.pop("out").close()
+        self._ready.append(chat)
+
+    def _on_state(self, record: Dict[str, Any]):
+        path = self.chats_dir / f"{self._name(record['chat'])}_state.json"
+        if not self._skip(path):
+            self.chats_dir.mkdir(parents=True, exist_ok=True)
+            replace_bytes(path, dumps(record["data"]))
+            self.counts["states"] += 1
+
+    def _on_profile(self, record: Dict[str, Any]):
+        path = self.chats_dir / f"profile_{self._name(record.get('user'))}.json"
+        if not self._skip(path):
+            self.chats_dir.mkdir(parents=True, exist_ok=True)
+            replace_bytes(path, dumps(record["data"]))
+            self.counts["profiles"] += 1
+
+
+def import_stream(chats_dir: Path, chunks: Iterable[bytes], index: Optional[Any] = None, skip_existing: bool = False) -> Dict[str, int]:
+    """Import an export stream (plain or gzip) from an iterable of byte chunks."""
+    importer = ChatImporter(chats_dir, index, skip_existing)
+    decoder = NDJSONDecoder()
+    try:
+        for chunk in chunks:
+            importer.feed(decoder.feed(chunk))
+            for chat in importer.ready():
+                importer.commit(chat)
+        importer.feed(decoder.close())
+        importer.close()
+        for chat in importer.ready():
+            importer.commit(chat)
+    except BaseException:
+        importer.abort()
+        raise
+    return importer.counts
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    import sys
+
+    parser = argparse.ArgumentParser(description="Stream chats, states and profiles to or from NDJSON")
+    parser.add_argument("--chats", default="chats", help="Chat storage directory")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export", help="Write an export to a file or stdout")
+    export.add_argument("-o", "--output", help="Output file (default stdout); .gz implies --gzip")
+    export.add_argument("--user")
+    export.add_argument("--since", type=datetime.fromisoformat)
+    export.add_argument("--until", type=datetime.fromisoformat)
+    export.add_argument("--gzip", action="store_true")
+    restore = sub.add_parser("import", help="Read an export (plain or gzip) from a file or stdin")
+    restore.add_argument("input", nargs="?", help="Input file (default stdin)")
+    restore.add_argument("--skip-existing", action="store_true")
+    restore.add_argument("--no-index", action="store_true", help="Do not add messages to the search index")
+    args = parser.parse_args()
+
+    chats_dir = Path(args.chats)
+    if args.command == "export":
+        compress = args.gzip or (args.output or "").endswith(".gz")
+        out = open(args.output, "wb") if args.output else sys.stdout.buffer
+        with out:
+            for chunk in export_stream(chats_dir, args.user, args.since, args.until, compress):
+                out.write(chunk)
+    else:
+        from bm25_index import IndexStore
+
+        source = open(args.input, "rb") if args.input else sys.stdin.buffer
+        with source:
+            chunks = iter(lambda: source.read(CHUNK_SIZE), b"")
+            index = None if args.no_index else IndexStore(chats_dir)
+            print(json.dumps(import_stream(chats_dir, chunks, index, args.skip_existing)))
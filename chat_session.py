@@ -0,0 +1,73 @@
+import asyncio
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from conversation_models import ConversationState, UserProfile
+
+Signature = Optional[Tuple[int, int]]
+
+
+class CachedChat:
+    """A parsed chat kept between turns, valid while its file signature is unchanged."""
+
+    def __init__(self, signature: Signature, data: Optional[Dict[str, Any]]):
+        self.signature = signature
+        self.data = data
+        self.state: Optional[ConversationState] = None
+        # Set once the state has been loaded, so a chat without one is not reloaded every turn
+        self.warm = False
+
+
+class ChatSession:
+    """Warm per-connection state for the chats one WebSocket client is working in.
+
+    Each turn over HTTP parses the chat file and loads the conversation
+    state and user profile again. A session keeps them between turns and
+    only checks the chat file's (mtime, size) signature, so a turn costs a
+    stat instead of a parse. Writes made elsewhere (another tab, background
+    compaction) change the signature and the chat is reloaded.
+    """
+
+    def __init__(self, user: str, max_chats: int = 8):
+        self.user = user
+        self.max_chats = max_chats
+        self.chats: "OrderedDict[str, CachedChat]" = OrderedDict()
+        self.profile: Optional[UserProfile] = None
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def lock(self, chat: Optional[str]) -> asyncio.Lock:
+        """Turns on the same chat run one after another; different chats run concurrently."""
+        return self._locks.setdefault(chat or "", asyncio.Lock())
+
+    def get(self, chat: str, signature: Signature) -> Optional[CachedChat]:
+        entry = self.chats.get(chat)
+        if entry is None or entry.signature != signature:
+            self.misses += 1
+            return None
+        self.chats.move_to_end(chat)
+        self.hits += 1
+        return entry
+
+    def put(self, chat: str, signature: Signature, data: Optional[Dict[str, Any]]) -> CachedChat:
+        entry = self.chats[chat] = CachedChat(signature, data)
+        self.chats.move_to_end(chat)
+        while len(self.chats) > self.max_chats:
+            self.chats.popitem(last=False)
+        return entry
+
+    def appended(self, chat: str, message: dict, before: Signature, after: Signature):
+        """Apply a message this session wrote, given the file signature just before and after the write."""
+        entry = self.chats.get(chat)
+        if entry is None:
+            return
+        if entry.data is None or entry.signature != before:
+            # Someone else wrote in between, so the cached copy is missing messages
+            del self.chats[chat]
+            return
+        entry.data.setdefault("messages", []).append(message)
+        entry.signature = after
+
+    def stats(self) -> Dict[str, int]:
+        return {"chats": len(self.chats), "hits": self.hits, "misses": self.misses}
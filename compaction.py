@@ -0,0 +1,296 @@
+import abc
+import asyncio
+import hashlib
+import os
+import re
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from conversation_models import SegmentSummary
+from io_executor import path_lock, read_json, replace_bytes, run_io
+from scheduler import FairScheduler, SchedulerFull
+from serialization import content_text, dumps, loads
+from tiered_storage import archive_path, open_archive, read_chat
+
+# Scheduler user that background summaries are queued under
+SYSTEM_USER = "system:compaction"
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+|\n+")
+_DECISION_RE = re.compile(r"\b(decided|agreed|let's|we will|important|remember|must)\b", re.IGNORECASE)
+
+
+def read_archive(chats_dir: Path, chat: str, start: int = 0, end: Optional[int] = None) -> List[dict]:
+    """Compacted raw messages [start:end) of a chat, one JSON line each."""
+    f = open_archive(chats_dir, chat)
+    if f is None:
+        return []
+    messages = []
+    with f:
+        for i, line in enumerate(f):
+            if end is not None and i >= end:
+                break
+            if i >= start:
+                messages.append(loads(line))
+    return messages
+
+
+def stored_messages(
+    chats_dir: Path, chat: str, start: int = 0, end: Optional[int] = None, data: Optional[Dict[str, Any]] = None
+) -> List[dict]:
+    """Raw messages [start:end) of a chat by absolute index, compacted or not.
+
+    The archive is only read when the range reaches back past the messages
+    still kept in the chat file; pass data to reuse an already parsed file.
+    """
+    if data is None:
+        data = read_chat(chats_dir, chat)
+        if data is None:
+            return []
+    offset = data.get("offset", 0)
+    live = data.get("messages", [])
+    end = offset + len(live) if end is None else min(end, offset + len(live))
+    messages = read_archive(chats_dir, chat, start, min(end, offset)) if start < offset else []
+    return messages + live[max(start - offset, 0):max(end - offset, 0)]
+
+
+def segment_digest(messages: Sequence[dict]) -> str:
+    """Fingerprint of a run of stored messages, to tell whether the chat still holds them."""
+    digest = hashlib.sha256()
+    for msg in messages:
+        digest.update(dumps(msg) + b"\n")
+    return digest.hexdigest()
+
+
+def segment_importance(texts: Sequence[str], entities: Sequence[str]) -> float:
+    """Heuristic weight of a segment: entity density, plus code and explicit decisions."""
+    words = sum(len(text.split()) for text in texts) or 1
+    score = 0.3 + min(0.4, 4 * len(entities) / words)
+    if any("```" in text for text in texts):
+        score += 0.15
+    if any(_DECISION_RE.search(text) for text in texts):
+        score += 0.15
+    return round(min(1.0, score), 3)
+
+
+class Summarizer(abc.ABC):
+    """Turns a run of stored chat messages into a short summary."""
+
+    @abc.abstractmethod
+    async def summarize(self, messages: List[dict]) -> str:
+        ...
+
+
+class ExtractiveSummarizer(Summarizer):
+    """Local summary: the sentences mentioning the segment's most frequent entities."""
+
+    def __init__(self, extract_entities: Callable[[str], List[str]], max_sentences: int = 3, max_chars: int = 600):
+        self.extract_entities = extract_entities
+        self.max_sentences = max_sentences
+        self.max_chars = max_chars
+
+    async def summarize(self, messages: List[dict]) -> str:
+        sentences = [
+            (msg.get("role", "user"), sentence.strip())
+            for msg in messages
+            for sentence in _SENTENCE_RE.split(content_text(msg.get("content")))
+            if sentence.strip()
+        ]
+        entities = [set(self.extract_entities(sentence)) for _, sentence in sentences]
+        counts = Counter(entity for found in entities for entity in found)
+        ranked = sorted(range(len(sentences)), key=lambda i: sum(counts[e] for e in entities[i]), reverse=True)
+        chosen = sorted(ranked[:self.max_sentences])
+        return " ".join(f"{sentences[i][0]}: {sentences[i][1]}" for i in chosen)[:self.max_chars]
+
+
+class LLMSummarizer(Summarizer):
+    """Summary written by the upstream model; falls back when no client is configured.
+
+    With a scheduler, each call takes a ticket as the system user, so
+    background compaction counts against the same concurrency cap as chat
+    turns; when that user's queue is full the fallback is used instead.
+    """
+
+    def __init__(
+        self,
+        get_client: Callable[[], Any],
+        model: str,
+        fallback: Summarizer,
+        max_tokens: int = 200,
+        scheduler: Optional[FairScheduler] = None,
+        user: str = SYSTEM_USER,
+    ):
+        self.get_client = get_client
+        self.model = model
+        self.fallback = fallback
+        self.max_tokens = max_tokens
+        self.scheduler = scheduler
+        self.user = user
+
+    async def summarize(self, messages: List[dict]) -> str:
+        client = self.get_client()
+        if client is None:
+            return await self.fallback.summarize(messages)
+        if self.scheduler is None:
+            return await self._stream(client, messages)
+        try:
+            ticket = self.scheduler.admit(self.user)
+        except SchedulerFull:
+            return await self.fallback.summarize(messages)
+        try:
+            async with ticket:
+                return await self._stream(client, messages)
+        finally:
+            ticket.cancel()
+
+    async def _stream(self, client: Any, messages: List[dict]) -> str:
+        transcript = "\n".join(
+            f"{msg.get('role', 'user')}: {content_text(msg.get('content'))[:2000]}" for msg in messages
+        )
+        prompt = [
+            {"role": "system", "content": "Summarize this part of a conversation in at most three sentences. "
+                                          "Keep names, files, numbers and decisions."},
+            {"role": "user", "content": transcript},
+        ]
+        parts = []
+        async for text in client.stream_text(messages=prompt, model=self.model, max_tokens=self.max_tokens, temperature=0):
+            parts.append(text)
+        return "".join(parts).strip()
+
+
+class FakeSummarizer(Summarizer):
+    """Deterministic summarizer for tests; records the segments it was given."""
+
+    def __init__(self):
+        self.calls: List[List[dict]] = []
+
+    async def summarize(self, messages: List[dict]) -> str:
+        self.calls.append(messages)
+        return f"{len(messages)} messages starting with {content_text(messages[0].get('content'))[:40]!r}"
+
+
+class HistoryCompactor:
+    """Fold messages older than a recent window into stored segment summaries.
+
+    A compacted chat file keeps only its recent messages and the summaries:
+
+        {"offset": N, "messages": [...recent...], "summaries": [...], "archive_bytes": B}
+
+    The N compacted messages are moved verbatim to archive/<chat>.jsonl,
+    so they stay retrievable with stored_messages(). Each turn then reads
+    and scores at most window + segment_size messages, however long the
+    chat has grown.
+    """
+
+    def __init__(
+        self,
+        chats_dir: Path,
+        summarizer: Summarizer,
+        extract_entities: Callable[[str], List[str]],
+        window: int = 20,
+        segment_size: int = 20,
+    ):
+        self.chats_dir = chats_dir
+        self.summarizer = summarizer
+        self.extract_entities = extract_entities
+        self.window = window
+        self.segment_size = segment_size
+        self._running: Dict[str, asyncio.Task] = {}
+
+    @classmethod
+    def from_env(
+        cls,
+        chats_dir: Path,
+        extract_entities: Callable[[str], List[str]],
+        get_client: Optional[Callable[[], Any]] = None,
+        scheduler: Optional[FairScheduler] = None,
+    ) -> "HistoryCompactor":
+        summarizer: Summarizer = ExtractiveSummarizer(extract_entities)
+        if os.environ.get("HISTORY_SUMMARIZER", "extractive") == "llm" and get_client is not None:
+            summarizer = LLMSummarizer(
+                get_client, os.environ.get("HISTORY_SUMMARY_MODEL", "gpt-3.5-turbo"), summarizer, scheduler=scheduler
+            )
+        return cls(
+            chats_dir,
+            summarizer,
+            extract_entities,
+            window=int(os.environ.get("HISTORY_WINDOW", "20")),
+            segment_size=int(os.environ.get("HISTORY_SEGMENT", "20")),
+        )
+
+    def needs_compaction(self, live_messages: int) -> bool:
+        return self.segment_size > 0 and live_messages >= self.window + self.segment_size
+
+    def schedule(self, chat: str) -> asyncio.Task:
+        """Compact a chat in the background, unless that is already running."""
+        task = self._running.get(chat)
+        if task is None or task.done():
+            task = asyncio.get_running_loop().create_task(self.compact(chat))
+            self._running[chat] = task
+        return task
+
+    async def compact(self, chat: str) -> int:
+        """Summarize whole segments until the chat is within the window; returns how many."""
+        path = self.chats_dir / f"{chat}.json"
+        written = 0
+        while True:
+            # Read and summarize outside the lock: messages are only ever appended, so the head is stable
+            data = await read_json(path)
+            if not data or not self.needs_compaction(len(data.get("messages", []))):
+                return written
+            summary = await self.summarize_segment(data["messages"][:self.segment_size], data.get("offset", 0))
+            async with path_lock(path):
+                if not await run_io(self._commit, chat, summary):
+                    return written
+            written += 1
+
+    async def summarize_segment(self, messages: List[dict], start: int) -> SegmentSummary:
+        texts = [content_text(msg.get("content")) for msg in messages]
+        entities = sorted({entity for text in texts for entity in self.extract_entities(text)})
+        return SegmentSummary(
+            start=start,
+            end=start + len(messages),
+            summary=await self.summarizer.summarize(messages),
+            entities=entities,
+            importance=segment_importance(texts, entities),
+            created_at=datetime.now(),
+            digest=segment_digest(messages),
+        )
+
+    def _commit(self, chat: str, summary: SegmentSummary) -> bool:
+        path = self.chats_dir / f"{chat}.json"
+        data = loads(path.read_bytes()) if path.exists() else None
+        count = summary.end - summary.start
+        if (
+            data is None
+            or data.get("offset", 0) != summary.start
+            or len(data["messages"]) < count
+            or segment_digest(data["messages"][:count]) != summary.digest
+        ):
+            return False  # recreated or compacted meanwhile
+        archive = archive_path(self.chats_dir, chat)
+        archive.parent.mkdir(parents=True, exist_ok=True)
+        with open(archive, "ab") as f:
+            # Drop anything left over from an interrupted commit so lines stay aligned with offsets
+            f.truncate(data.get("archive_bytes", 0))
+            f.write(b"".join(dumps(msg) + b"\n" for msg in data["messages"][:count]))
+            data["archive_bytes"] = f.tell()
+        data["messages"] = data["messages"][count:]
+        data["offset"] = summary.end
+        data.setdefault("summaries", []).append(summary.model_dump(mode="json"))
+        replace_bytes(path, dumps(data))
+        return True
+
+    def select(self, summaries: Sequence[Dict[str, Any]], current_message: str, k: int = 3) -> List[SegmentSummary]:
+        """The k summaries most relevant to the current message, in conversation order."""
+        query = set(self.extract_entities(current_message))
+
+        def score(i: int) -> float:
+            entities = set(summaries[i].get("entities", []))
+            overlap = len(query & entities) / (len(query | entities) or 1)
+            recency = (i + 1) / len(summaries)
+            return overlap * 0.6 + summaries[i].get("importance", 0.5) * 0.3 + recency * 0.1
+
+        best = sorted(range(len(summaries)), key=score, reverse=True)[:k]
+        return [SegmentSummary.model_validate(summaries[i]) for i in sorted(best)]
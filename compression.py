@@ -0,0 +1,105 @@
+import gzip
+from typing import Collection, List, Optional, Sequence
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli as _brotli
+except ImportError:  # optional encoding
+    _brotli = None
+
+# Content codings we can produce, most preferred first
+ENCODINGS: List[str] = (["br"] if _brotli is not None else []) + ["gzip"]
+
+
+def compress(body: bytes, encoding: str, level: int = 6) -> bytes:
+    """Compress body with a content coding; level is gzip's 1-9 scale (brotli uses it as its quality)."""
+    if encoding == "br":
+        return _brotli.compress(body, quality=level)
+    if encoding == "gzip":
+        # mtime=0 keeps the output, and so ETags of precompressed files, stable between runs
+        return gzip.compress(body, compresslevel=level, mtime=0)
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+def negotiate(accept_encoding: str, available: Collection[Optional[str]]) -> Optional[str]:
+    """The preferred encoding in available that the client accepts, or None for identity."""
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip()] = q
+    for encoding in ENCODINGS:
+        if encoding in available and accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+class CompressionMiddleware:
+    """Negotiated compression of large buffered responses of the given media types.
+
+    Only complete bodies are compressed. A streamed response (its first body
+    message has more_body set), such as the /chat token stream or the NDJSON
+    export, passes through untouched, so compression never holds back a token.
+    Responses that already carry a Content-Encoding are left alone too.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        level: int = 6,
+        media_types: Sequence[str] = ("application/json",),
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.level = level
+        self.media_types = set(media_types)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""), ENCODINGS)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Optional[Message] = None
+        decided = False
+
+        async def send_compressed(message: Message):
+            nonlocal start, decided
+            if decided:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                start = message  # held until the first body shows whether to compress
+                return
+            decided = True
+            body = message.get("body", b"")
+            headers = MutableHeaders(raw=start["headers"])
+            if (
+                message["type"] != "http.response.body"
+                or message.get("more_body", False)
+                or "content-encoding" in headers
+                or headers.get("content-type", "").split(";")[0].strip() not in self.media_types
+                or len(body) < self.minimum_size
+            ):
+                await send(start)
+                await send(message)
+                return
+            body = compress(body, encoding, self.level)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(body))
+            headers.add_vary_header("Accept-Encoding")
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_compressed)
@@ -1,18 +1,48 @@
-from typing import List, Dict, Any, Optional, Literal
+from typing import TYPE_CHECKING, List, Dict, Any, Optional, Literal
 from conversation_models import ConversationState, EnhancedMessage
+from io_executor import run_io
 import json
 import asyncio
+import uuid
 from datetime import datetime, timedelta
 import re
 
+if TYPE_CHECKING:
+    from bm25_index import IndexStore, SearchHit
+    from relevance_scorer import RelevanceScorer
+
 class ContextManager:
-    def __init__(self, max_context_messages: int = 20):
+    def __init__(
+        self,
+        max_context_messages: Optional[int] = None,
+        max_relevant_messages: int = 10,
+        memory: Optional["IndexStore"] = None,
+    ):
+        # None scores the whole history; the batched scorer keeps that cheap
         self.max_context_messages = max_context_messages
+        self.max_relevant_messages = max_relevant_messages
+        # Long-term memory: the user's BM25 index over all of their chats
+        self.memory = memory
         self.entity_patterns = [
             r'\b[A-Z][a-z]+(?:\s+[A-Z][a-z]+)*\b',  # Proper nouns
             r'\b\w+\.\w+\b',  # File names, URLs
             r'\b\d+(?:\.\d+)?\b',  # Numbers
         ]
+        self._scorer: Optional["RelevanceScorer"] = None
+
+    @property
+    def scorer(self) -> "RelevanceScorer":
+        # Built on first use so importing the app does not load NumPy
+        if self._scorer is None:
+            from relevance_scorer import RelevanceScorer
+
+            self._scorer = RelevanceScorer(self._extract_entities)
+        return self._scorer
+
+    def warmup(self):
+        """Compile the entity patterns ahead of the first request."""
+        for pattern in self.entity_patterns:
+            re.compile(pattern)
 
     async def update_conversation_state(
         self, 
@@ -61,32 +91,90 @@ class ContextManager:
         self, 
         conversation_state: ConversationState, 
         current_message: str,
-        full_history: List[EnhancedMessage]
+        full_history: List[EnhancedMessage],
+        include_memory: bool = False
     ) -> List[EnhancedMessage]:
-        """Get most relevant context for current message."""
-        
-        # Sort messages by importance and recency
-        scored_messages = []
-        current_time = datetime.now()
-        
-        for msg in full_history[-self.max_context_messages:]:
-            # Recency score (more recent = higher score)
-            time_diff = (current_time - msg.timestamp).total_seconds() / 3600  # hours
-            recency_score = max(0, 1 - (time_diff / 24))  # Decay over 24 hours
-            
-            # Importance score
-            importance_score = conversation_state.importance_scores.get(msg.message_id, 0.5)
-            
-            # Relevance score (check for entity/topic overlap)
-            relevance_score = self._calculate_relevance(current_message, str(msg.content))
-            
-            # Combined score
-            final_score = (recency_score * 0.3 + importance_score * 0.4 + relevance_score * 0.3)
-            scored_messages.append((msg, final_score))
+        """Get most relevant context for current message.
+
+        With include_memory, the best passages from the user's other chats
+        are appended after the in-chat context.
+        """
         
-        # Sort by score and return top messages
-        scored_messages.sort(key=lambda x: x[1], reverse=True)
-        return [msg for msg, score in scored_messages[:10]]
+        from relevance_scorer import top_k
+
+        # Score recency, importance and entity overlap for all messages in one batch,
+        # off the event loop since a long history takes a while. This is CPU work, so it
+        # runs on the default executor rather than holding a slot in the disk I/O pool
+        candidates = full_history if self.max_context_messages is None else full_history[-self.max_context_messages:]
+        scores = await asyncio.to_thread(
+            self.scorer.score,
+            current_message,
+            [str(msg.content) for msg in candidates],
+            timestamps=[msg.timestamp for msg in candidates],
+            importance=[conversation_state.importance_scores.get(msg.message_id, 0.5) for msg in candidates],
+        )
+        relevant = [candidates[i] for i in top_k(scores, self.max_relevant_messages)]
+        if include_memory:
+            relevant += [
+                EnhancedMessage(
+                    role=hit.role or "user",
+                    content=hit.content or "",
+                    timestamp=datetime.now(),
+                    message_id=str(uuid.uuid4()),
+                    importance_score=0.5,
+                )
+                for hit in await self.recall(conversation_state, current_message)
+            ]
+        return relevant
+
+    async def recall(self, conversation_state: ConversationState, current_message: str) -> List["SearchHit"]:
+        """Top passages from the user's older chats, or none if the latency budget runs out."""
+        if self.memory is None or self.memory.recall_k <= 0:
+            return []
+        budget = self.memory.budget_ms / 1000
+        try:
+            # The search itself stops scoring at the budget; the timeout also bounds the queue wait
+            return await asyncio.wait_for(
+                run_io(
+                    self.memory.search,
+                    conversation_state.user_id,
+                    current_message,
+                    self.memory.recall_k,
+                    exclude_chats=[conversation_state.chat_id],
+                    budget_ms=self.memory.budget_ms,
+                ),
+                timeout=budget * 2,
+            )
+        except asyncio.TimeoutError:
+            return []
+
+    async def select_relevant(
+        self,
+        conversation_state: ConversationState,
+        current_message: str,
+        texts: List[str],
+        first_index: int = 0,
+    ) -> List[int]:
+        """Indices into texts of the most relevant stored messages, best first.
+
+        Works on plain texts so callers can score a long history without
+        building an EnhancedMessage per message; stored messages carry no
+        timestamp or id, so they count as recent with default importance.
+        first_index is the absolute index of texts[0], which moves forward
+        when older messages are compacted.
+        """
+        from relevance_scorer import top_k
+
+        if self.max_context_messages is None:
+            # A growing history keeps its entity matrix between turns
+            candidates, key = texts, (conversation_state.chat_id, first_index)
+        else:
+            candidates, key = texts[-self.max_context_messages:], None
+        offset = len(texts) - len(candidates)
+        # Entity extraction over a cold history is regex work per message; keep it off the
+        # event loop, and off the disk I/O pool like the scoring above
+        scores = await asyncio.to_thread(self.scorer.score, current_message, candidates, key=key)
+        return [offset + int(i) for i in top_k(scores, self.max_relevant_messages)]
 
     def _extract_entities(self, text: str) -> List[str]:
         """Extract key entities from text."""
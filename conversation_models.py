@@ -35,3 +35,12 @@ class EnhancedMessage(BaseModel):
     importance_score: float = 0.5
     intent_clarity: Optional[IntentClarity] = None
     tool: Optional[str] = None
+
+class SegmentSummary(BaseModel):
+    start: int  # absolute index of the first summarized message
+    end: int  # one past the last summarized message
+    summary: str
+    entities: List[str]
+    importance: float
+    created_at: datetime
+    digest: Optional[str] = None  # sha256 of the summarized messages, checked before they are archived
@@ -1,66 +1,137 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.responses import StreamingResponse, JSONResponse
-from typing import List, Dict, Any, Optional
+from pydantic import ValidationError
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple
 import json
+import asyncio
 import base64
+import time
 import uuid
 from datetime import datetime
 from models import Message, ChatRequest
-from utils import run_tool, save_chat_message, CHATS_DIR, client, APIConnectionError, APIStatusError
+from utils import run_tool, save_chat_message, CHATS_DIR, get_client, memory_index, APIConnectionError, APIStatusError
 from intent_analyzer import IntentAnalyzer
 from context_manager import ContextManager
 from style_adapter import StyleAdapter
 from conversation_models import ConversationState, UserProfile, EnhancedMessage, IntentClarity
+from singleflight import SingleFlight, canonical_key
+from scheduler import FairScheduler, SchedulerFull, Ticket
+from model_router import ModelRouter
+from io_executor import run_io, iterate_io, write_json, read_model, write_model, path_lock
+from serialization import MessageView, dumps, loads, message_views
+from loop_monitor import LoopLagMonitor
+from compaction import HistoryCompactor, stored_messages
+from chat_export import ChatImporter, export_stream, ndjson_lines
+from tiered_storage import TieringJob, chat_names, chat_signature, discard_cold, read_chat, tier_metrics, tier_stats
+from chat_session import CachedChat, ChatSession, Signature
 
 router = APIRouter()
 
 # Initialize the conversation understanding modules
 intent_analyzer = IntentAnalyzer()
-context_manager = ContextManager()
+context_manager = ContextManager(memory=memory_index)
 style_adapter = StyleAdapter()
 
+# Identical concurrent upstream requests share one call
+llm_flight = SingleFlight()
+tool_flight = SingleFlight()
+
+# Caps concurrent upstream completions and queues them fairly per user
+llm_scheduler = FairScheduler.from_env()
+
+# Sends short, simple turns to a small model and demanding ones to a larger model
+model_router = ModelRouter.from_env(CHATS_DIR)
+
+# Samples event-loop lag and reports blocking call sites; started by the app lifespan
+loop_monitor = LoopLagMonitor.from_env()
+
+# Folds messages older than a recent window into stored segment summaries
+compactor = HistoryCompactor.from_env(CHATS_DIR, context_manager._extract_entities, get_client, llm_scheduler)
+
+# Compresses chats that have gone idle; started by the app lifespan
+tiering_job = TieringJob.from_env(CHATS_DIR)
+
+# Tools without side effects whose concurrent identical calls can be shared
+COALESCED_TOOLS = {"ddgs"}
+
+async def run_tool_coalesced(tool: str, tool_input: str) -> str:
+    """Run a tool, sharing the result between identical concurrent calls."""
+    if tool not in COALESCED_TOOLS:
+        # Other tools (save_file) write to disk
+        return await run_io(run_tool, tool, tool_input)
+    return await tool_flight.call(canonical_key("tool", tool, tool_input), run_tool, tool, tool_input)
+
+async def warmup(preload_client: bool = True):
+    """Startup hook: compile analyzer patterns, open storage and build the upstream client."""
+    intent_analyzer.warmup()
+    context_manager.warmup()
+    style_adapter.warmup()
+    await run_io(CHATS_DIR.mkdir, exist_ok=True)
+    if preload_client:
+        await asyncio.to_thread(get_client)
+
 # Add new utility functions
 async def load_conversation_state(chat_id: str) -> Optional[ConversationState]:
     """Load conversation state from storage."""
-    state_path = CHATS_DIR / f"{chat_id}_state.json"
-    if state_path.exists():
-        data = json.loads(state_path.read_text(encoding="utf-8"))
-        return ConversationState.model_validate(data)
-    return None
+    return await read_model(CHATS_DIR / f"{chat_id}_state.json", ConversationState)
 
 async def save_conversation_state(state: ConversationState):
     """Save conversation state to storage."""
-    state_path = CHATS_DIR / f"{state.chat_id}_state.json"
-    CHATS_DIR.mkdir(exist_ok=True)
-    state_path.write_text(json.dumps(state.model_dump(), default=str), encoding="utf-8")
+    await write_model(CHATS_DIR / f"{state.chat_id}_state.json", state)
 
 async def load_user_profile(user_id: str) -> Optional[UserProfile]:
     """Load user profile from storage."""
-    profile_path = CHATS_DIR / f"profile_{user_id}.json"
-    if profile_path.exists():
-        data = json.loads(profile_path.read_text(encoding="utf-8"))
-        return UserProfile.model_validate(data)
-    return None
+    return await read_model(CHATS_DIR / f"profile_{user_id}.json", UserProfile)
 
 async def save_user_profile(profile: UserProfile):
     """Save user profile to storage."""
-    profile_path = CHATS_DIR / f"profile_{profile.user_id}.json"
-    CHATS_DIR.mkdir(exist_ok=True)
-    profile_path.write_text(json.dumps(profile.model_dump(), default=str), encoding="utf-8")
+    await write_model(CHATS_DIR / f"profile_{profile.user_id}.json", profile)
+
+async def load_chat(chat: str) -> Optional[Dict[str, Any]]:
+    """Load a chat file from whichever storage tier holds it."""
+    return await run_io(read_chat, CHATS_DIR, chat)
+
+async def load_chat_history(chat: str) -> List[MessageView]:
+    """Load a chat's messages as lightweight views."""
+    return message_views(await load_chat(chat))
+
+def _append_signed(chat: str, message: dict, user: Optional[str]) -> Tuple[Signature, Signature]:
+    before = chat_signature(CHATS_DIR, chat)
+    save_chat_message(chat, message, user)
+    return before, chat_signature(CHATS_DIR, chat)
+
+async def append_chat_message(chat: str, message: dict, user: Optional[str] = None) -> Tuple[Signature, Signature]:
+    """Append a message to a chat file without blocking the event loop; user's messages are indexed.
+
+    Returns the chat file's signature just before and after the write.
+    """
+    async with path_lock(CHATS_DIR / f"{chat}.json"):
+        return await run_io(_append_signed, chat, message, user)
+
+async def load_turn_chat(chat: str, session: Optional[ChatSession] = None) -> CachedChat:
+    """Load a chat for a turn, reusing the session's parsed copy while the file is unchanged."""
+    if session is None:
+        return CachedChat(None, await load_chat(chat))
+    # Stat before reading: a write in between leaves an older signature, so the copy is reloaded next turn
+    signature = await run_io(chat_signature, CHATS_DIR, chat)
+    entry = session.get(chat, signature)
+    if entry is None:
+        entry = session.put(chat, signature, await load_chat(chat))
+    return entry
 
 @router.get("/list_chats")
 async def list_chats():
-    if not CHATS_DIR.exists():
-        return {"chats": []}
-    return {"chats": [f.stem for f in CHATS_DIR.glob("*.json") if f.is_file()]}
+    # Hot and cold chats; state and profile files are not chats
+    return {"chats": await run_io(chat_names, CHATS_DIR)}
 
 @router.get("/get_chat")
-async def get_chat(chat: str):
-    chat_path = CHATS_DIR / f"{chat}.json"
-    if not chat_path.exists():
+async def get_chat(chat: str, start: int = 0, end: Optional[int] = None):
+    data = await load_chat(chat)
+    if data is None:
         return {"messages": []}
-    data = json.loads(chat_path.read_text(encoding="utf-8"))
-    return {"messages": data.get("messages", [])}
+    # Compacted messages are read back from the chat's archive
+    messages = await run_io(stored_messages, CHATS_DIR, chat, start, end, data)
+    return {"messages": messages, "summaries": data.get("summaries", [])}
 
 @router.post("/upload_image")
 async def upload_image(file: UploadFile = File(...)):
@@ -69,22 +140,58 @@ async def upload_image(file: UploadFile = File(...)):
 
 @router.post("/create_chat")
 async def create_chat(chat_name: str = Form(...)) -> JSONResponse:
-    chat_path = CHATS_DIR / f"{chat_name}.json"
-    CHATS_DIR.mkdir(exist_ok=True)
-    chat_path.write_text(json.dumps({"messages": []}), encoding="utf-8")
+    async with path_lock(CHATS_DIR / f"{chat_name}.json"):
+        await write_json(CHATS_DIR / f"{chat_name}.json", {"messages": []})
+        await run_io(discard_cold, CHATS_DIR, chat_name)
     return JSONResponse(content={"status": "ok", "chat": chat_name}, media_type="application/json")
 
+@router.get("/export")
+async def export_chats(
+    user: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    gzip: bool = False,
+) -> StreamingResponse:
+    """Stream chats, states and profiles as NDJSON, read from disk as it is sent."""
+    chunks = iterate_io(export_stream(CHATS_DIR, user, since, until, compress=gzip))
+    filename = "chats.ndjson.gz" if gzip else "chats.ndjson"
+    return StreamingResponse(
+        chunks,
+        media_type="application/gzip" if gzip else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@router.post("/import")
+async def import_chats(request: Request, skip_existing: bool = False):
+    """Restore an NDJSON export (plain or gzip) from the request body as it arrives."""
+    importer = ChatImporter(CHATS_DIR, index=memory_index, skip_existing=skip_existing)
+
+    async def commit_ready():
+        # Swap each finished chat in under its lock, so a concurrent append cannot overwrite it
+        for chat in importer.ready():
+            async with path_lock(chat["path"]):
+                await run_io(importer.commit, chat)
+
+    try:
+        async for lines in ndjson_lines(request.stream()):
+            await run_io(importer.feed, lines)
+            await commit_ready()
+        await run_io(importer.close)
+        await commit_ready()
+    except ValueError as e:
+        await run_io(importer.abort)
+        raise HTTPException(status_code=400, detail=str(e))
+    except BaseException:
+        await run_io(importer.abort)
+        raise
+    return importer.counts
+
 @router.post("/clarify")
 async def clarify_intent(chat_req: ChatRequest) -> JSONResponse:
     """Analyze message for intent clarity and return clarification if needed."""
     
     # Load conversation history for context
-    history = []
-    if chat_req.chat:
-        chat_path = CHATS_DIR / f"{chat_req.chat}.json"
-        if chat_path.exists():
-            data = json.loads(chat_path.read_text(encoding="utf-8"))
-            history = [msg.get("content", "") for msg in data.get("messages", [])]
+    history = [view.text for view in await load_chat_history(chat_req.chat)] if chat_req.chat else []
     
     # Analyze intent
     intent_clarity = await intent_analyzer.analyze_intent(chat_req.message, history[-5:])
@@ -96,92 +203,152 @@ async def clarify_intent(chat_req: ChatRequest) -> JSONResponse:
         "ambiguous_elements": intent_clarity.ambiguous_elements
     })
 
-@router.post("/chat")
-async def enhanced_chat_endpoint(chat_req: ChatRequest) -> StreamingResponse:
-    async def enhanced_event_stream():
-        try:
-            # Step 1: Intent Analysis
-            conversation_history = []
-            if chat_req.chat:
-                chat_path = CHATS_DIR / f"{chat_req.chat}.json"
-                if chat_path.exists():
-                    data = json.loads(chat_path.read_text(encoding="utf-8"))
-                    conversation_history = [msg.get("content", "") for msg in data.get("messages", [])]
-            
-            intent_clarity = await intent_analyzer.analyze_intent(
-                chat_req.message, 
-                conversation_history[-5:]
-            )
-            
-            # Step 2: Check if clarification is needed
-            if intent_clarity.clarity_score < 0.6 and len(intent_clarity.suggested_clarifications) > 0:
-                yield f"I want to make sure I understand correctly. {intent_clarity.suggested_clarifications[0]}"
-                return
-            
-            # Step 3: Load conversation state and user profile
-            user_id = chat_req.user or "default_user"
+@router.get("/search")
+async def search_messages(q: str, user: str = "default_user", k: int = 10, exclude_chat: Optional[str] = None):
+    """BM25 search over all of a user's stored messages."""
+    started = time.perf_counter()
+    hits = await run_io(memory_index.search, user, q, k, exclude_chats=[exclude_chat] if exclude_chat else [])
+    return {
+        "results": [hit.model_dump() for hit in hits],
+        "took_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
+
+@router.get("/storage_stats")
+async def storage_stats():
+    return {"tiers": await run_io(tier_stats, CHATS_DIR), "reads": tier_metrics.summary()}
+
+@router.get("/scheduler_stats")
+async def scheduler_stats():
+    return llm_scheduler.metrics()
+
+@router.get("/loop_lag")
+async def loop_lag():
+    return loop_monitor.stats()
+
+@router.get("/llm_health")
+async def llm_health():
+    client = get_client()
+    if client is None:
+        return {"endpoints": []}
+    return client.health()
+
+async def run_chat_turn(
+    chat_req: ChatRequest, ticket: Ticket, session: Optional[ChatSession] = None
+) -> AsyncIterator[Tuple[str, Any]]:
+    """Run one chat turn as a stream of typed events, shared by POST /chat and the WebSocket channel.
+
+    Yields ("clarify", IntentClarity) and stops when the message is too
+    ambiguous to answer (unless chat_req.skip_clarify), ("text", str) for
+    each piece of the reply, and ("error", str) if the turn fails. With a
+    session, the chat, its state and the user's profile stay warm between
+    turns instead of being reloaded from storage.
+    """
+    async def scheduled_completion(**kwargs):
+        # Only the flight leader runs this, so coalesced followers never take a slot
+        async with ticket:
+            async for text in get_client().stream_text(**kwargs):
+                yield text
+
+    def start_completion(**kwargs):
+        # The flight's pump now owns the ticket and enters it for every subscriber,
+        # so this turn leaving early must not give it back
+        nonlocal handed_off
+        handed_off = True
+        return scheduled_completion(**kwargs)
+
+    handed_off = False
+
+    async def append(message: dict):
+        signatures = await append_chat_message(chat_req.chat, message, user_id)
+        if session is not None:
+            session.appended(chat_req.chat, message, *signatures)
+
+    user_id = chat_req.user or "default_user"
+    try:
+        # Step 1: Intent Analysis
+        # A compacted chat file only holds recent messages and summaries of older segments
+        chat = await load_turn_chat(chat_req.chat, session) if chat_req.chat else None
+        chat_data = chat.data if chat else None
+        conversation_history = message_views(chat_data)
+        summaries = chat_data.get("summaries", []) if chat_data else []
+        
+        intent_clarity = await intent_analyzer.analyze_intent(
+            chat_req.message, 
+            [view.text for view in conversation_history[-5:]]
+        )
+        
+        # Step 2: Check if clarification is needed
+        if (
+            not chat_req.skip_clarify
+            and intent_clarity.clarity_score < 0.6
+            and len(intent_clarity.suggested_clarifications) > 0
+        ):
+            yield "clarify", intent_clarity
+            return
+        
+        # Step 3: Load conversation state and user profile
+        if chat is not None and chat.warm:
+            conversation_state, user_profile = chat.state, session.profile
+        else:
             conversation_state = await load_conversation_state(chat_req.chat) if chat_req.chat else None
             user_profile = await load_user_profile(user_id)
-            
-            # Step 4: Create enhanced message
-            message_id = str(uuid.uuid4())
-            enhanced_message = EnhancedMessage(
-                role="user",
-                content=chat_req.message,
-                timestamp=datetime.now(),
-                message_id=message_id,
-                importance_score=min(1.0, intent_clarity.clarity_score + 0.2),
-                intent_clarity=intent_clarity
+        
+        # Step 4: Create enhanced message
+        message_id = str(uuid.uuid4())
+        enhanced_message = EnhancedMessage(
+            role="user",
+            content=chat_req.message,
+            timestamp=datetime.now(),
+            message_id=message_id,
+            importance_score=min(1.0, intent_clarity.clarity_score + 0.2),
+            intent_clarity=intent_clarity
+        )
+        
+        # Step 5: Update conversation state
+        if chat_req.chat:
+            conversation_state = await context_manager.update_conversation_state(
+                chat_req.chat, user_id, enhanced_message, conversation_state
             )
-            
-            # Step 5: Update conversation state
+            await save_conversation_state(conversation_state)
+            chat.state, chat.warm = conversation_state, True
+        if session is not None:
+            session.profile = user_profile
+        
+        # Step 6: Handle tool usage (existing logic)
+        if chat_req.tool:
+            tool_input = chat_req.tool_input if chat_req.tool_input is not None else ""
+            result = await run_tool_coalesced(chat_req.tool, tool_input)
+            yield "text", f"[Tool:{chat_req.tool}] {result}"
             if chat_req.chat:
-                conversation_state = await context_manager.update_conversation_state(
-                    chat_req.chat, user_id, enhanced_message, conversation_state
-                )
-                await save_conversation_state(conversation_state)
-            
-            # Step 6: Handle tool usage (existing logic)
-            if chat_req.tool:
-                tool_input = chat_req.tool_input if chat_req.tool_input is not None else ""
-                result = run_tool(chat_req.tool, tool_input)
-                yield f"[Tool:{chat_req.tool}] {result}"
-                if chat_req.chat:
-                    save_chat_message(chat_req.chat, {"role": "tool", "content": result, "tool": chat_req.tool})
-                return
-            
-            # Step 7: Prepare enhanced context for LLM
-            from typing import Any
-            user_content: List[Dict[str, Any]] = [{"type": "text", "text": chat_req.message}]
-            if chat_req.image_base64:
-                user_content.append({"type": "image_url", "image_url": {"url": f"data:image/png;base64,{chat_req.image_base64}"}})
-            
-            # Load full message history as EnhancedMessage objects
-            full_history = []
-            if chat_req.chat and conversation_history:
-                for i, msg_content in enumerate(conversation_history):
-                    full_history.append(EnhancedMessage(
-                        role="assistant" if i % 2 == 1 else "user",
-                        content=msg_content,
-                        timestamp=datetime.now(),
-                        message_id=str(uuid.uuid4()),
-                        importance_score=0.5
-                    ))
-            
-            # Get relevant context
-            relevant_context = []
-            if conversation_state and full_history:
-                relevant_context = await context_manager.get_relevant_context(
-                    conversation_state, chat_req.message, full_history
-                )
-            
-            # Prepare messages for LLM with enhanced context
-            messages = []
+                await append({"role": "tool", "content": result, "tool": chat_req.tool})
+            return
+        
+        # Step 7: Prepare enhanced context for LLM
+        user_content: List[Dict[str, Any]] = [{"type": "text", "text": chat_req.message}]
+        if chat_req.image_base64:
+            user_content.append({"type": "image_url", "image_url": {"url": f"data:image/png;base64,{chat_req.image_base64}"}})
+        
+        # Score the whole history in one batch; only the selected messages become EnhancedMessage models
+        relevant_context = []
+        if conversation_state and conversation_history:
+            selected = await context_manager.select_relevant(
+                conversation_state,
+                chat_req.message,
+                [view.text for view in conversation_history],
+                first_index=conversation_history[0].index,
+            )
+            relevant_context = [conversation_history[i].to_enhanced() for i in selected]
+        
+        # Pull matching passages from the user's older chats, within the memory latency budget
+        recalled = await context_manager.recall(conversation_state, chat_req.message) if conversation_state else []
+        
+        # Prepare messages for LLM with enhanced context
+        messages = []
+        
+        # Add system message with conversation context
+        if conversation_state:
+            system_prompt = f"""You are a helpful assistant. 
             
-            # Add system message with conversation context
-            if conversation_state:
-                system_prompt = f"""You are a helpful assistant. 
-                
 Conversation context:
 - Topic: {conversation_state.topic_summary}
 - Stage: {conversation_state.conversation_stage}
@@ -189,88 +356,248 @@ Conversation context:
 
 User communication style: {user_profile.communication_style if user_profile else 'Unknown'}
 """
-                messages.append({"role": "system", "content": system_prompt})
-            
-            # Add relevant context messages
-            for ctx_msg in relevant_context[-5:]:  # Last 5 relevant messages
-                if ctx_msg.role == "user":
-                    messages.append({"role": "user", "content": str(ctx_msg.content)})
-                elif ctx_msg.role == "assistant":
-                    messages.append({"role": "assistant", "content": str(ctx_msg.content)})
-            
-            # Add current message
-            messages.append({"role": "user", "content": user_content})
-            
-            # Step 8: Generate response
-            if chat_req.chat:
-                save_chat_message(chat_req.chat, {"role": "user", "content": user_content})
-            
-            # Handle case where no API client is available (development mode)
-            if client is None:
-                yield "Hello! I'm running in development mode without an API key. "
-                yield "The conversation understanding protocol has been successfully implemented with the following features:\n\n"
-                yield f"📊 Intent Analysis: Your message clarity score is {intent_clarity.clarity_score:.2f}\n"
-                yield f"💬 Conversation Stage: {conversation_state.conversation_stage if conversation_state else 'opening'}\n"
-                yield f"🎯 Key Entities: {', '.join(conversation_state.key_entities) if conversation_state else 'None detected'}\n"
-                yield f"🎨 User Style: {user_profile.communication_style if user_profile else 'Being analyzed'}\n\n"
-                yield "To enable full AI responses, please set your LLAMA_API_KEY or OPENAI_API_KEY environment variable."
-                return
-            
-            stream = client.chat.completions.create(
-                messages=messages,
-                model="gpt-3.5-turbo",  # Use standard model for better compatibility
-                temperature=chat_req.temperature,
-                max_tokens=chat_req.max_completion_tokens,
-                user=chat_req.user,
-                stream=True,
+            messages.append({"role": "system", "content": system_prompt})
+        
+        if summaries:
+            earlier = "\n".join(f"- {s.summary}" for s in compactor.select(summaries, chat_req.message))
+            messages.append({"role": "system", "content": f"Summary of earlier parts of this conversation:\n{earlier}"})
+        
+        if recalled:
+            notes = "\n".join(f"- [{hit.chat}] {hit.role}: {hit.content[:500]}" for hit in recalled)
+            messages.append({"role": "system", "content": f"Possibly relevant excerpts from earlier conversations:\n{notes}"})
+        
+        # Add relevant context messages
+        for ctx_msg in relevant_context[-5:]:  # Last 5 relevant messages
+            if ctx_msg.role == "user":
+                messages.append({"role": "user", "content": str(ctx_msg.content)})
+            elif ctx_msg.role == "assistant":
+                messages.append({"role": "assistant", "content": str(ctx_msg.content)})
+        
+        # Add current message
+        messages.append({"role": "user", "content": user_content})
+        
+        # Step 8: Generate response
+        if chat_req.chat:
+            await append({"role": "user", "content": user_content})
+        
+        # Handle case where no API client is available (development mode)
+        if get_client() is None:
+            yield "text", "Hello! I'm running in development mode without an API key. "
+            yield "text", "The conversation understanding protocol has been successfully implemented with the following features:\n\n"
+            yield "text", f"📊 Intent Analysis: Your message clarity score is {intent_clarity.clarity_score:.2f}\n"
+            yield "text", f"💬 Conversation Stage: {conversation_state.conversation_stage if conversation_state else 'opening'}\n"
+            yield "text", f"🎯 Key Entities: {', '.join(conversation_state.key_entities) if conversation_state else 'None detected'}\n"
+            yield "text", f"🎨 User Style: {user_profile.communication_style if user_profile else 'Being analyzed'}\n\n"
+            yield "text", "To enable full AI responses, please set your LLAMA_API_KEY or OPENAI_API_KEY environment variable."
+            return
+        
+        route = model_router.route(
+            chat_req.message,
+            intent_clarity,
+            user_profile.communication_style if user_profile else None,
+            messages,
+        )
+        completion_kwargs = dict(
+            messages=messages,
+            model=route.model,
+            temperature=chat_req.temperature,
+            max_tokens=chat_req.max_completion_tokens,
+        )
+        # The user tag is left out of the key so identical prompts from different users coalesce
+        flight_key = canonical_key("chat", **completion_kwargs)
+        
+        if llm_flight.in_flight(flight_key):
+            # Joining a running completion needs no slot; free the reservation for other requests
+            ticket.cancel()
+        
+        full_response = ""
+        started = time.perf_counter()
+        ttft_ms = None
+        async for text in llm_flight.stream(
+            flight_key,
+            lambda: start_completion(user=chat_req.user, **completion_kwargs),
+        ):
+            if ttft_ms is None:
+                ttft_ms = (time.perf_counter() - started) * 1000
+            full_response += text
+            yield "text", text
+        await run_io(
+            model_router.record,
+            route,
+            chat=chat_req.chat,
+            user=user_id,
+            ttft_ms=ttft_ms,
+            total_ms=(time.perf_counter() - started) * 1000,
+            response_chars=len(full_response),
+        )
+        
+        # Step 9: Apply style adaptation
+        if user_profile:
+            adapted_response = await style_adapter.adapt_response_style(
+                full_response, user_profile, conversation_state.topic_summary if conversation_state else ""
             )
             
-            full_response = ""
-            for chunk in stream:
-                if chunk.choices and len(chunk.choices) > 0:
-                    delta = chunk.choices[0].delta
-                    if hasattr(delta, 'content') and delta.content is not None:
-                        full_response += delta.content
-                        yield delta.content
-            
-            # Step 9: Apply style adaptation
-            if user_profile:
-                adapted_response = await style_adapter.adapt_response_style(
-                    full_response, user_profile, conversation_state.topic_summary if conversation_state else ""
-                )
-                
-                # If significantly different, yield the adaptation
-                if len(adapted_response) != len(full_response):
-                    yield f"\n\n[Adapted to your style: {adapted_response[len(full_response):]}]"
-            
-            # Step 10: Update user profile based on interaction
-            if user_profile is None:
-                user_profile = UserProfile(
-                    user_id=user_id,
-                    communication_style=await style_adapter.analyze_user_style([chat_req.message]),
-                    preferred_response_length="adaptive",
-                    topic_preferences={},
-                    clarification_frequency=1.0 if intent_clarity.clarity_score < 0.6 else 0.0,
-                    last_updated=datetime.now()
-                )
-            else:
-                # Update style analysis
-                user_messages = [chat_req.message] + [msg for i, msg in enumerate(conversation_history) if i % 2 == 0]
-                user_profile.communication_style = await style_adapter.analyze_user_style(user_messages[-10:])
-                user_profile.last_updated = datetime.now()
-            
-            await save_user_profile(user_profile)
+            # If significantly different, yield the adaptation
+            if len(adapted_response) != len(full_response):
+                yield "text", f"\n\n[Adapted to your style: {adapted_response[len(full_response):]}]"
+        
+        # Step 10: Update user profile based on interaction
+        if user_profile is None:
+            user_profile = UserProfile(
+                user_id=user_id,
+                communication_style=await style_adapter.analyze_user_style([chat_req.message]),
+                preferred_response_length="adaptive",
+                topic_preferences={},
+                clarification_frequency=1.0 if intent_clarity.clarity_score < 0.6 else 0.0,
+                last_updated=datetime.now()
+            )
+        else:
+            # Update style analysis
+            user_messages = [chat_req.message] + [view.text for view in conversation_history if view.role == "user"]
+            user_profile.communication_style = await style_adapter.analyze_user_style(user_messages[-10:])
+            user_profile.last_updated = datetime.now()
+        
+        await save_user_profile(user_profile)
+        if session is not None:
+            session.profile = user_profile
+        
+        # Save assistant response
+        if chat_req.chat:
+            await append({"role": "assistant", "content": full_response})
+            if compactor.needs_compaction(len(conversation_history) + 2):
+                compactor.schedule(chat_req.chat)
             
-            # Save assistant response
-            if chat_req.chat:
-                save_chat_message(chat_req.chat, {"role": "assistant", "content": full_response})
-                
-        except Exception as e:
-            if "APIConnectionError" in str(type(e)):
-                yield "[Error: Could not connect to API]"
-            elif hasattr(e, 'status_code'):
-                yield f"[Error: API returned status {getattr(e, 'status_code', 'unknown')}]"
+    except Exception as e:
+        if "APIConnectionError" in str(type(e)):
+            yield "error", "Could not connect to API"
+        elif hasattr(e, 'status_code'):
+            yield "error", f"API returned status {getattr(e, 'status_code', 'unknown')}"
+        else:
+            yield "error", str(e)
+    finally:
+        if not handed_off:
+            ticket.cancel()
+
+@router.post("/chat")
+async def enhanced_chat_endpoint(chat_req: ChatRequest) -> StreamingResponse:
+    # Reserve a place in the upstream queue up front so overload is rejected before streaming starts
+    try:
+        ticket = llm_scheduler.admit(chat_req.user or "default_user")
+    except SchedulerFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+
+    async def enhanced_event_stream():
+        async for kind, payload in run_chat_turn(chat_req, ticket):
+            if kind == "clarify":
+                yield f"I want to make sure I understand correctly. {payload.suggested_clarifications[0]}"
+            elif kind == "error":
+                yield f"[Error: {payload}]"
             else:
-                yield f"[Error: {str(e)}]"
+                yield payload
     
     return StreamingResponse(enhanced_event_stream(), media_type="text/plain")
+
+# Turns one socket may have running or waiting at once
+MAX_SOCKET_TURNS = 16
+
+@router.websocket("/ws")
+async def chat_socket(websocket: WebSocket, user: str = "default_user"):
+    """Chat over one persistent connection, with several chats multiplexed on it.
+
+    Client frames (JSON):
+        {"type": "chat", "id": "r1", "chat": "work", "message": "...", ...}   any ChatRequest field
+        {"type": "cancel", "id": "r1"}
+        {"type": "ping"}
+
+    Server frames carry the id and chat of the turn they belong to:
+        {"type": "clarify", "id", "chat", "clarity_score", "suggested_clarifications", "ambiguous_elements"}
+        {"type": "token", "id", "chat", "text"}
+        {"type": "done", "id", "chat"}                      also after clarify; "cancelled": true if cancelled
+        {"type": "error", "id", "chat", "message"}          ends the turn; "retry_after" when the queue is full
+        {"type": "pong"}
+
+    The clarify decision runs inline, so a clear message is answered in the
+    same round-trip; to answer an ambiguous one anyway, resend it with
+    "skip_clarify": true. Turns on one chat run in order, turns on
+    different chats run concurrently.
+    """
+    await websocket.accept()
+    session = ChatSession(user)
+    send_lock = asyncio.Lock()
+    turns: Dict[str, Tuple[asyncio.Task, Optional[str]]] = {}
+
+    async def send(frame: Dict[str, Any]):
+        async with send_lock:
+            await websocket.send_text(dumps(frame).decode())
+
+    async def run_turn(turn_id: str, chat_req: ChatRequest):
+        frame = {"id": turn_id, "chat": chat_req.chat}
+        try:
+            async with session.lock(chat_req.chat):
+                try:
+                    ticket = llm_scheduler.admit(session.user)
+                except SchedulerFull as e:
+                    await send({"type": "error", **frame, "message": str(e), "retry_after": 1})
+                    return
+                async for kind, payload in run_chat_turn(chat_req, ticket, session):
+                    if kind == "text":
+                        await send({"type": "token", **frame, "text": payload})
+                    elif kind == "clarify":
+                        await send({
+                            "type": "clarify",
+                            **frame,
+                            "clarity_score": payload.clarity_score,
+                            "suggested_clarifications": payload.suggested_clarifications,
+                            "ambiguous_elements": payload.ambiguous_elements,
+                        })
+                    else:
+                        await send({"type": "error", **frame, "message": payload})
+                        return
+            await send({"type": "done", **frame})
+        finally:
+            turns.pop(turn_id, None)
+
+    async def handle(frame: Any):
+        kind = frame.get("type") if isinstance(frame, dict) else None
+        turn_id = str(frame.get("id", "")) if isinstance(frame, dict) else ""
+        if kind == "ping":
+            await send({"type": "pong"})
+        elif kind == "cancel":
+            if turn_id in turns:
+                task, chat = turns[turn_id]
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                await send({"type": "done", "id": turn_id, "chat": chat, "cancelled": True})
+        elif kind == "chat":
+            if not turn_id or turn_id in turns:
+                await send({"type": "error", "id": turn_id, "chat": frame.get("chat"), "message": "Missing or duplicate id"})
+                return
+            if len(turns) >= MAX_SOCKET_TURNS:
+                await send({"type": "error", "id": turn_id, "chat": frame.get("chat"), "message": "Too many turns in flight", "retry_after": 1})
+                return
+            fields = {k: v for k, v in frame.items() if k not in ("type", "id")}
+            try:
+                chat_req = ChatRequest.model_validate({**fields, "user": session.user})
+            except ValidationError as e:
+                await send({"type": "error", "id": turn_id, "chat": frame.get("chat"), "message": str(e)})
+                return
+            turns[turn_id] = (asyncio.create_task(run_turn(turn_id, chat_req)), chat_req.chat)
+        else:
+            await send({"type": "error", "id": turn_id or None, "chat": None, "message": f"Unknown frame type: {kind!r}"})
+
+    try:
+        while True:
+            text = await websocket.receive_text()
+            try:
+                frame = loads(text)
+            except ValueError:
+                await send({"type": "error", "id": None, "chat": None, "message": "Frames must be JSON"})
+                continue
+            await handle(frame)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        pending = [task for task, _ in turns.values()]
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
@@ -0,0 +1,152 @@
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients dropping idle keep-alive connections is normal, not worth a traceback
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class FakeOpenAIServer:
+    """A local OpenAI-compatible chat completions server for tests and benchmarks.
+
+    latency delays the response headers (time to first byte), chunk_delay
+    spaces out the streamed chunks, and fail_status makes every request
+    fail with that HTTP status.
+    """
+
+    def __init__(
+        self,
+        tokens: Optional[List[str]] = None,
+        latency: float = 0.0,
+        chunk_delay: float = 0.0,
+        fail_status: Optional[int] = None,
+        port: int = 0,
+    ):
+        self.tokens = tokens or ["Hello", " from", " the", " fake", " model."]
+        self.latency = latency
+        self.chunk_delay = chunk_delay
+        self.fail_status = fail_status
+        self.requests: List[dict] = []
+        self._lock = threading.Lock()
+        self._server = _Server(("127.0.0.1", port), self._handler())
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/v1"
+
+    def start(self) -> "FakeOpenAIServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeOpenAIServer":
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                payload = json.loads(body or b"{}")
+                with fake._lock:
+                    fake.requests.append(payload)
+                if fake.latency:
+                    time.sleep(fake.latency)
+                if fake.fail_status:
+                    self._send_json(fake.fail_status, {"error": {"message": "injected failure", "type": "server_error"}})
+                    return
+                if not self.path.endswith("/chat/completions"):
+                    self._send_json(404, {"error": {"message": "not found"}})
+                    return
+                if payload.get("stream"):
+                    self._stream(payload)
+                else:
+                    self._send_json(200, {
+                        "id": "chatcmpl-fake",
+                        "object": "chat.completion",
+                        "created": int(time.time()),
+                        "model": payload.get("model", "fake"),
+                        "choices": [{
+                            "index": 0,
+                            "message": {"role": "assistant", "content": "".join(fake.tokens)},
+                            "finish_reason": "stop",
+                        }],
+                    })
+
+            def _send_json(self, status, data):
+                raw = json.dumps(data).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(raw)))
+                self.end_headers()
+                self.wfile.write(raw)
+
+            def _stream(self, payload):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for i, token in enumerate(fake.tokens):
+                    if i and fake.chunk_delay:
+                        time.sleep(fake.chunk_delay)
+                    self._write_event({
+                        "id": "chatcmpl-fake",
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": payload.get("model", "fake"),
+                        "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}],
+                    })
+                self._write_chunk(b"data: [DONE]\n\n")
+                self._write_chunk(b"")
+
+            def _write_event(self, data):
+                self._write_chunk(f"data: {json.dumps(data)}\n\n".encode("utf-8"))
+
+            def _write_chunk(self, raw: bytes):
+                try:
+                    self.wfile.write(f"{len(raw):x}\r\n".encode("ascii") + raw + b"\r\n")
+                    self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+        return Handler
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run a fake OpenAI-compatible streaming server")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--chunk-delay", type=float, default=0.01)
+    args = parser.parse_args()
+    server = FakeOpenAIServer(latency=args.latency, chunk_delay=args.chunk_delay, port=args.port)
+    print(f"Fake OpenAI server listening on {server.url}")
+    server._server.serve_forever()
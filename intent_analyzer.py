@@ -26,6 +26,13 @@ class IntentAnalyzer:
             (r'\b\w+\.\w+\b', 0.05),  # File extensions, URLs
         ]
 
+    def warmup(self):
+        """Compile the patterns ahead of the first request (re caches compiled patterns)."""
+        for pattern, _, _ in self.ambiguity_patterns:
+            re.compile(pattern, re.IGNORECASE)
+        for pattern, _ in self.clarity_boosters:
+            re.compile(pattern, re.IGNORECASE)
+
     async def analyze_intent(self, message: str, conversation_history: Optional[List[str]] = None) -> IntentClarity:
         """Analyze message for intent clarity and suggest clarifications."""
         
@@ -0,0 +1,128 @@
+import asyncio
+import os
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple, Type, TypeVar
+
+from pydantic import BaseModel
+
+from serialization import dumps, loads, dump_model, load_model
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+# Dedicated pool for disk I/O so it never runs on the event loop or competes
+# with the default executor used for network calls
+IO_WORKERS = int(os.environ.get("IO_WORKERS", "4"))
+IO_MAX_PENDING = int(os.environ.get("IO_MAX_PENDING", str(IO_WORKERS * 16)))
+
+io_executor = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="io")
+
+# asyncio primitives belong to one event loop, so keep a set per loop
+_loop_state: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Tuple[asyncio.Semaphore, Dict]]" = weakref.WeakKeyDictionary()
+
+
+def _state() -> Tuple[asyncio.Semaphore, "weakref.WeakValueDictionary[str, asyncio.Lock]"]:
+    loop = asyncio.get_running_loop()
+    state = _loop_state.get(loop)
+    if state is None:
+        state = (asyncio.Semaphore(IO_MAX_PENDING), weakref.WeakValueDictionary())
+        _loop_state[loop] = state
+    return state
+
+
+async def run_io(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Run blocking disk I/O on the I/O executor, bounding how much can queue up."""
+    pending, _ = _state()
+    async with pending:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(io_executor, partial(fn, *args, **kwargs))
+
+
+async def iterate_io(iterator: Iterator[Any]) -> AsyncIterator[Any]:
+    """Drive a blocking iterator, such as a file-reading generator, on the I/O executor."""
+    done = object()
+    try:
+        while True:
+            item = await run_io(next, iterator, done)
+            if item is done:
+                return
+            yield item
+    finally:
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            try:
+                close()
+            except ValueError:
+                # Still running in its worker thread after a cancellation
+                pass
+
+
+def path_lock(path: Path) -> asyncio.Lock:
+    """Lock serializing read-modify-write cycles on one file across I/O threads."""
+    _, locks = _state()
+    key = str(path)
+    lock = locks.get(key)
+    if lock is None:
+        lock = asyncio.Lock()
+        locks[key] = lock
+    return lock
+
+
+def _read_bytes(path: Path) -> Optional[bytes]:
+    if not path.exists():
+        return None
+    return path.read_bytes()
+
+
+def replace_bytes(path: Path, data: bytes):
+    """Write a file through a temporary sibling, so readers never see it half written."""
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def _write_bytes(path: Path, data: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    replace_bytes(path, data)
+
+
+def _read_json(path: Path) -> Optional[Any]:
+    raw = _read_bytes(path)
+    return None if raw is None else loads(raw)
+
+
+def _read_model(path: Path, cls: Type[ModelT]) -> Optional[ModelT]:
+    raw = _read_bytes(path)
+    return None if raw is None else load_model(cls, raw)
+
+
+async def read_json(path: Path) -> Optional[Any]:
+    """Load a JSON file, or None if it does not exist."""
+    return await run_io(_read_json, path)
+
+
+async def write_json(path: Path, data: Any):
+    """Serialize and write a JSON file, creating its directory if needed."""
+    await run_io(lambda: _write_bytes(path, dumps(data)))
+
+
+async def read_model(path: Path, cls: Type[ModelT]) -> Optional[ModelT]:
+    """Load a pydantic model from a JSON file, or None if it does not exist."""
+    return await run_io(_read_model, path, cls)
+
+
+async def write_model(path: Path, model: BaseModel):
+    """Write a pydantic model as JSON, creating its directory if needed."""
+    await run_io(lambda: _write_bytes(path, dump_model(model)))
+
+
+async def list_files(directory: Path, pattern: str) -> List[Path]:
+    """Glob a directory for regular files without blocking the event loop."""
+    def scan():
+        if not directory.exists():
+            return []
+        return [f for f in directory.glob(pattern) if f.is_file()]
+    return await run_io(scan)
@@ -0,0 +1,232 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from metrics import LatencyRecorder
+
+logger = logging.getLogger(__name__)
+
+
+async def iterate_in_thread(fn: Callable[..., Iterable[Any]], *args: Any, **kwargs: Any) -> AsyncIterator[Any]:
+    """Drive a blocking iterator from async code without stalling the event loop."""
+    iterator = iter(await asyncio.to_thread(fn, *args, **kwargs))
+    done = object()
+    try:
+        while True:
+            item = await asyncio.to_thread(next, iterator, done)
+            if item is done:
+                return
+            yield item
+    finally:
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            try:
+                close()
+            except ValueError:
+                # Still running in its worker thread after a cancellation
+                pass
+
+
+def completion_text(client: Any, **kwargs: Any) -> Iterator[str]:
+    """Yield the text deltas of a streaming chat completion."""
+    stream = client.chat.completions.create(stream=True, **kwargs)
+    try:
+        for chunk in stream:
+            if chunk.choices and len(chunk.choices) > 0:
+                delta = chunk.choices[0].delta
+                if hasattr(delta, 'content') and delta.content is not None:
+                    yield delta.content
+    finally:
+        close = getattr(stream, "close", None)
+        if close is not None:
+            close()
+
+
+def is_retryable(error: Exception) -> bool:
+    """Connection problems, timeouts, 429 and 5xx are worth retrying; other 4xx are not."""
+    status = getattr(error, "status_code", None)
+    return status is None or status == 429 or status >= 500
+
+
+class Endpoint:
+    """One upstream base URL with its client and health record."""
+
+    def __init__(self, base_url: str, client: Any, index: int = 0):
+        self.base_url = base_url
+        self.client = client
+        self.index = index
+        self.consecutive_failures = 0
+        self.down_until = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.ttft_ms = LatencyRecorder(window=200)
+
+    def is_down(self, now: float) -> bool:
+        return now < self.down_until
+
+    def rank(self, now: float) -> Tuple[bool, int, float, int]:
+        return (self.is_down(now), self.consecutive_failures, self.ttft_ms.percentile(50) or 0.0, self.index)
+
+    def health(self) -> Dict[str, Any]:
+        return {
+            "base_url": self.base_url,
+            "down": self.is_down(time.monotonic()),
+            "requests": self.requests,
+            "failures": self.failures,
+            "consecutive_failures": self.consecutive_failures,
+            "ttft_ms": self.ttft_ms.summary(),
+        }
+
+
+class FailoverClient:
+    """Stream chat completions from a pool of equivalent OpenAI-compatible endpoints.
+
+    Until the first token arrives, failed attempts are retried with
+    exponential backoff on the healthiest endpoint, and an endpoint that
+    fails failure_threshold times in a row is skipped for cooldown seconds.
+    With hedging on, a second request goes to another endpoint once the
+    first has waited longer than the hedge_percentile of observed
+    time-to-first-token, and whichever answers first is kept. Errors after
+    the first token are passed on, since the partial answer has already
+    been streamed.
+    """
+
+    def __init__(
+        self,
+        endpoints: List[Tuple[str, Any]],
+        max_retries: int = 2,
+        backoff: float = 0.2,
+        backoff_max: float = 2.0,
+        failure_threshold: int = 3,
+        cooldown: float = 30.0,
+        hedge: bool = False,
+        hedge_percentile: float = 95.0,
+        hedge_min_samples: int = 20,
+        hedge_min_delay: float = 0.05,
+    ):
+        if not endpoints:
+            raise ValueError("FailoverClient needs at least one endpoint")
+        self.endpoints = [Endpoint(url, client, i) for i, (url, client) in enumerate(endpoints)]
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_min_delay = hedge_min_delay
+        self.ttft_ms = LatencyRecorder()
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    @classmethod
+    def from_urls(cls, base_urls: List[str], api_key: str, **options: Any) -> "FailoverClient":
+        from openai import OpenAI
+
+        # Retries are handled here across endpoints, so the SDK's own are disabled
+        return cls([(url, OpenAI(api_key=api_key, base_url=url, max_retries=0)) for url in base_urls], **options)
+
+    def _ranked(self) -> List[Endpoint]:
+        now = time.monotonic()
+        return sorted(self.endpoints, key=lambda e: e.rank(now))
+
+    def _hedge_delay(self) -> Optional[float]:
+        if not self.hedge or len(self.endpoints) < 2 or len(self.ttft_ms.samples) < self.hedge_min_samples:
+            return None
+        return max(self.hedge_min_delay, self.ttft_ms.percentile(self.hedge_percentile) / 1000)
+
+    def _record_success(self, endpoint: Endpoint, ttft_ms: float):
+        endpoint.consecutive_failures = 0
+        endpoint.down_until = 0.0
+        endpoint.ttft_ms.record(ttft_ms)
+        self.ttft_ms.record(ttft_ms)
+
+    def _record_failure(self, endpoint: Endpoint, error: Exception):
+        endpoint.failures += 1
+        endpoint.consecutive_failures += 1
+        if endpoint.consecutive_failures >= self.failure_threshold:
+            endpoint.down_until = time.monotonic() + self.cooldown
+        logger.warning("LLM endpoint %s failed: %s", endpoint.base_url, error)
+
+    def _first_token(self, endpoint: Endpoint, kwargs: Dict[str, Any]) -> Tuple[Iterator[str], Optional[str], float]:
+        # Runs in a worker thread: open the stream and block until the first text delta
+        started = time.perf_counter()
+        texts = completion_text(endpoint.client, **kwargs)
+        first = next(texts, None)
+        return texts, first, (time.perf_counter() - started) * 1000
+
+    async def _attempt(self, endpoint: Endpoint, kwargs: Dict[str, Any]):
+        endpoint.requests += 1
+        return await asyncio.to_thread(self._first_token, endpoint, kwargs)
+
+    async def _open(self, kwargs: Dict[str, Any]) -> Tuple[Iterator[str], Optional[str]]:
+        last_error: Optional[Exception] = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self.retries += 1
+                delay = min(self.backoff_max, self.backoff * 2 ** (attempt - 1))
+                await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+
+            ranked = self._ranked()
+            pending: Dict[asyncio.Task, Endpoint] = {
+                asyncio.create_task(self._attempt(ranked[0], kwargs)): ranked[0]
+            }
+            hedge_delay = self._hedge_delay()
+            if hedge_delay is not None:
+                done, _ = await asyncio.wait(pending, timeout=hedge_delay)
+                if not done:
+                    self.hedges += 1
+                    pending[asyncio.create_task(self._attempt(ranked[1], kwargs))] = ranked[1]
+
+            primary = ranked[0]
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    endpoint = pending.pop(task)
+                    error = task.exception()
+                    if error is not None:
+                        self._record_failure(endpoint, error)
+                        last_error = error
+                        continue
+                    texts, first, ttft_ms = task.result()
+                    self._record_success(endpoint, ttft_ms)
+                    if endpoint is not primary:
+                        self.hedge_wins += 1
+                    for loser in pending:
+                        loser.add_done_callback(_close_loser)
+                    return texts, first
+            if last_error is not None and not is_retryable(last_error):
+                break
+        raise last_error
+
+    async def stream_text(self, **kwargs: Any) -> AsyncIterator[str]:
+        """Stream the text deltas of a chat completion with failover and optional hedging."""
+        texts, first = await self._open(kwargs)
+        if first is None:
+            return
+        yield first
+        async for text in iterate_in_thread(lambda: texts):
+            yield text
+
+    def health(self) -> Dict[str, Any]:
+        return {
+            "hedging": self.hedge,
+            "hedge_delay_ms": round(self._hedge_delay() * 1000, 1) if self._hedge_delay() else None,
+            "retries": self.retries,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "ttft_ms": self.ttft_ms.summary(),
+            "endpoints": [e.health() for e in self.endpoints],
+        }
+
+
+def _close_loser(task: asyncio.Task):
+    # A hedged attempt that lost the race: close its stream once it has opened
+    if task.cancelled() or task.exception() is not None:
+        return
+    texts, _, _ = task.result()
+    texts.close()
@@ -0,0 +1,99 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Any, Dict, Optional
+
+from metrics import LatencyRecorder
+
+logger = logging.getLogger(__name__)
+
+
+class LoopLagMonitor:
+    """Measure event-loop lag and report what was blocking the loop.
+
+    A sampler task sleeps for interval seconds and records how late it
+    wakes up. A watchdog thread checks the sampler's heartbeat; when the
+    loop has not ticked for longer than threshold it captures the loop
+    thread's current stack, which is the call site doing the blocking.
+    """
+
+    def __init__(self, interval: float = 0.05, threshold: float = 0.1, max_stalls: int = 50):
+        self.interval = interval
+        self.threshold = threshold
+        self.lag_ms = LatencyRecorder()
+        self.stalls = deque(maxlen=max_stalls)
+        self.stall_count = 0
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    @classmethod
+    def from_env(cls) -> "LoopLagMonitor":
+        return cls(
+            interval=float(os.environ.get("LOOP_LAG_INTERVAL", "0.05")),
+            threshold=float(os.environ.get("LOOP_LAG_THRESHOLD", "0.1")),
+        )
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Start sampling the running event loop."""
+        if self.running:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.get_running_loop().create_task(self._sample())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-lag-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self):
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _sample(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = time.perf_counter() - started - self.interval
+            self.lag_ms.record(max(0.0, lag) * 1000)
+            self._heartbeat = time.monotonic()
+
+    def _watch(self):
+        reported_beat = None
+        while not self._stopped.wait(self.threshold / 2):
+            beat = self._heartbeat
+            stalled_for = time.monotonic() - beat - self.interval
+            if stalled_for <= self.threshold or beat == reported_beat:
+                continue
+            # Report each stall once, while it is still in progress
+            reported_beat = beat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else ""
+            self.stall_count += 1
+            self.stalls.append({"lag_ms": round(stalled_for * 1000, 1), "at": time.time(), "stack": stack})
+            logger.warning("Event loop blocked for %.0f ms at:\n%s", stalled_for * 1000, stack)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "threshold_ms": self.threshold * 1000,
+            "lag_ms": self.lag_ms.summary(),
+            "stalls": self.stall_count,
+            "recent_stalls": list(self.stalls)[-5:],
+        }
@@ -1,20 +1,41 @@
+from contextlib import asynccontextmanager
+from pathlib import Path
+from fastapi import FastAPI, Request
+from endpoints import router as endpoints_router, loop_monitor, tiering_job, warmup
+from compression import CompressionMiddleware
+from io_executor import run_io
+from static_assets import StaticAssets
 
-from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
-from endpoints import router as endpoints_router
-
-from fastapi.responses import FileResponse
 import os
 
-app = FastAPI()
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# Served from memory with content-hashed URLs and precompressed variants
+assets = StaticAssets(Path("static"))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    loop_monitor.start()
+    await run_io(assets.build)
+    if os.environ.get("WARMUP", "1") == "1":
+        await warmup()
+    tiering_job.start()
+    yield
+    await tiering_job.stop()
+    await loop_monitor.stop()
+
+app = FastAPI(lifespan=lifespan)
+# Large JSON bodies (e.g. /get_chat) are compressed; streamed tokens and exports pass through as they are
+app.add_middleware(CompressionMiddleware, minimum_size=int(os.environ.get("COMPRESS_MIN_BYTES", "1024")))
 app.include_router(endpoints_router)
 
-# Serve index.html at root
+@app.get("/static/{name}")
+async def static_file(request: Request, name: str):
+    return assets.serve(request, name)
+
+# Serve index.html at root, pointing at the hashed asset URLs
 @app.get("/")
-async def root():
-    return FileResponse(os.path.join("static", "index.html"), media_type="text/html")
+async def root(request: Request):
+    return assets.index(request)
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=3001)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=3001)
@@ -0,0 +1,40 @@
+from collections import deque
+from typing import Dict, Iterable, Optional
+
+
+def percentile(values: Iterable[float], q: float) -> float:
+    """Return the q-th percentile (0-100) of values, interpolating between ranks."""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = (len(ordered) - 1) * q / 100.0
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+class LatencyRecorder:
+    """Keep a bounded window of latency samples and summarize them."""
+
+    def __init__(self, window: int = 1000):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+
+    def record(self, value: float):
+        self.samples.append(value)
+        self.count += 1
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        return percentile(self.samples, q)
+
+    def summary(self) -> Dict[str, float]:
+        samples = list(self.samples)
+        return {
+            "count": self.count,
+            "p50": round(percentile(samples, 50), 3),
+            "p95": round(percentile(samples, 95), 3),
+            "p99": round(percentile(samples, 99), 3),
+            "max": round(max(samples), 3) if samples else 0.0,
+        }
@@ -0,0 +1,165 @@
+import json
+import logging
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel
+
+from conversation_models import IntentClarity
+from metrics import percentile
+
+logger = logging.getLogger(__name__)
+
+# Rough cost of an image part in prompt tokens
+IMAGE_TOKEN_ESTIMATE = 765
+
+
+def estimate_tokens(messages: List[Dict[str, Any]]) -> int:
+    """Estimate prompt tokens for chat messages (about four characters per token)."""
+    chars = 0
+    images = 0
+    for message in messages:
+        content = message.get("content", "")
+        if isinstance(content, list):
+            for part in content:
+                if part.get("type") == "image_url":
+                    images += 1
+                else:
+                    chars += len(str(part.get("text", "")))
+        else:
+            chars += len(str(content))
+    return chars // 4 + images * IMAGE_TOKEN_ESTIMATE + 4 * len(messages)
+
+
+class RouteDecision(BaseModel):
+    model: str
+    tier: str  # "small" or "large"
+    complexity: float
+    prompt_tokens: int
+    signals: Dict[str, float]
+    reasons: List[str]
+
+
+class ModelRouter:
+    """Pick a fast small model or a larger one from signals the pipeline already has.
+
+    The complexity score blends message length, the user's technical depth,
+    the assembled prompt size and how unclear the intent still is. Turns that
+    score above complexity_threshold, carry an image, or have a prompt larger
+    than max_small_prompt_tokens go to the large model. Without a large
+    model every turn stays on the small one, so routing is opt-in.
+    """
+
+    def __init__(
+        self,
+        small_model: str = "gpt-3.5-turbo",
+        large_model: Optional[str] = None,
+        complexity_threshold: float = 0.45,
+        max_small_prompt_tokens: int = 3000,
+        log_path: Optional[Path] = None,
+    ):
+        self.small_model = small_model
+        self.large_model = large_model or small_model
+        self.complexity_threshold = complexity_threshold
+        self.max_small_prompt_tokens = max_small_prompt_tokens
+        self.log_path = log_path
+
+    @classmethod
+    def from_env(cls, chats_dir: Path = Path("chats")) -> "ModelRouter":
+        """Build a router from LLM_* environment variables; the log defaults to chats_dir/routing_log.jsonl."""
+        log_path = os.environ.get("LLM_ROUTING_LOG", str(chats_dir / "routing_log.jsonl"))
+        return cls(
+            small_model=os.environ.get("LLM_SMALL_MODEL", "gpt-3.5-turbo"),
+            large_model=os.environ.get("LLM_LARGE_MODEL") or None,
+            complexity_threshold=float(os.environ.get("LLM_ROUTING_THRESHOLD", "0.45")),
+            max_small_prompt_tokens=int(os.environ.get("LLM_SMALL_MAX_PROMPT_TOKENS", "3000")),
+            log_path=Path(log_path) if log_path else None,
+        )
+
+    def route(
+        self,
+        message: str,
+        intent_clarity: Optional[IntentClarity],
+        communication_style: Optional[Dict[str, float]],
+        messages: List[Dict[str, Any]],
+    ) -> RouteDecision:
+        """Choose a model for the assembled prompt."""
+        prompt_tokens = estimate_tokens(messages)
+        clarity = intent_clarity.clarity_score if intent_clarity else 1.0
+        technical_depth = (communication_style or {}).get("technical_depth", 0.0)
+        signals = {
+            "length": min(1.0, len(message.split()) / 150),
+            "technical_depth": max(0.0, min(1.0, technical_depth)),
+            "prompt_size": min(1.0, prompt_tokens / self.max_small_prompt_tokens),
+            "ambiguity": 1.0 - clarity,
+        }
+        complexity = (
+            signals["length"] * 0.3
+            + signals["technical_depth"] * 0.3
+            + signals["prompt_size"] * 0.25
+            + signals["ambiguity"] * 0.15
+        )
+
+        reasons = []
+        if complexity >= self.complexity_threshold:
+            reasons.append(f"complexity {complexity:.2f} >= {self.complexity_threshold}")
+        if prompt_tokens > self.max_small_prompt_tokens:
+            reasons.append(f"prompt ~{prompt_tokens} tokens exceeds small model budget")
+        if any(
+            isinstance(m.get("content"), list) and any(p.get("type") == "image_url" for p in m["content"])
+            for m in messages
+        ):
+            reasons.append("image input")
+
+        tier = "large" if reasons else "small"
+        return RouteDecision(
+            model=self.large_model if tier == "large" else self.small_model,
+            tier=tier,
+            complexity=round(complexity, 4),
+            prompt_tokens=prompt_tokens,
+            signals={k: round(v, 4) for k, v in signals.items()},
+            reasons=reasons or ["short, simple turn"],
+        )
+
+    def record(self, decision: RouteDecision, **outcome: Any):
+        """Append a decision and its observed outcome (latency, size) as one JSON line."""
+        entry = {"timestamp": datetime.now().isoformat(), **decision.model_dump(), **outcome}
+        logger.info("route %s -> %s (%s)", decision.tier, decision.model, ", ".join(decision.reasons))
+        if self.log_path is None:
+            return
+        self.log_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.log_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, default=str) + "\n")
+
+
+def load_routing_log(path: Path) -> List[Dict[str, Any]]:
+    """Read a routing log back for offline latency and cost analysis."""
+    if not path.exists():
+        return []
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines() if line.strip()]
+
+
+def summarize_routing_log(entries: List[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    """Per-model request counts, latency percentiles and prompt size from a routing log."""
+    summary = {}
+    for model in sorted({e["model"] for e in entries}):
+        rows = [e for e in entries if e["model"] == model]
+        ttft = [e["ttft_ms"] for e in rows if e.get("ttft_ms") is not None]
+        total = [e["total_ms"] for e in rows if e.get("total_ms") is not None]
+        summary[model] = {
+            "requests": len(rows),
+            "ttft_p50_ms": round(percentile(ttft, 50), 1),
+            "ttft_p95_ms": round(percentile(ttft, 95), 1),
+            "total_p50_ms": round(percentile(total, 50), 1),
+            "total_p95_ms": round(percentile(total, 95), 1),
+            "prompt_tokens": sum(e["prompt_tokens"] for e in rows),
+        }
+    return summary
+
+
+if __name__ == "__main__":
+    import sys
+    log = Path(sys.argv[1]) if len(sys.argv) > 1 else ModelRouter.from_env(Path(os.environ.get("CHATS_DIR", "chats"))).log_path
+    print(json.dumps(summarize_routing_log(load_routing_log(log)), indent=2))
@@ -19,3 +19,5 @@ class ChatRequest(BaseModel):
     tool_input: Optional[str] = None
     chat: Optional[str] = None
     history: List[Dict[str, Any]] = []
+    # Answer even if the message looks ambiguous (the user chose to proceed)
+    skip_clarify: bool = False
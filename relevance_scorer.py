@@ -0,0 +1,175 @@
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Callable, Dict, Hashable, List, Optional, Sequence
+
+import numpy as np
+
+# Weights of the combined relevance score
+RECENCY_WEIGHT = 0.3
+IMPORTANCE_WEIGHT = 0.4
+OVERLAP_WEIGHT = 0.3
+
+_EPOCH = datetime(1970, 1, 1)
+_EPOCH_UTC = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+class EntityMatrix:
+    """Append-only sparse matrix of entity ids, one row per message (CSR layout)."""
+
+    def __init__(self):
+        self.flat = np.zeros(0, dtype=np.int64)
+        self.lengths = np.zeros(0, dtype=np.int64)
+        self.last_text: Optional[str] = None
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+    def extend(self, rows: List[np.ndarray], last_text: Optional[str]):
+        if not rows:
+            return
+        self.flat = np.concatenate([self.flat] + rows)
+        self.lengths = np.concatenate([self.lengths, np.fromiter((len(r) for r in rows), dtype=np.int64, count=len(rows))])
+        self.last_text = last_text
+
+    def continues(self, texts: Sequence[str]) -> bool:
+        """True when texts starts with the messages already in the matrix."""
+        n = len(self)
+        return n <= len(texts) and (n == 0 or texts[n - 1] == self.last_text)
+
+
+class RelevanceScorer:
+    """Score every message of a history in one batched NumPy pass.
+
+    Each message's entities are interned into integer ids and stored as a
+    sparse row, so the Jaccard overlap with the current message is a
+    vectorized membership test and a bincount. Recency and importance are
+    plain float arrays. The arithmetic matches ContextManager's original
+    per-message loop exactly.
+
+    Passing a key (such as the chat id) keeps that history's matrix between
+    calls, so a new turn only extracts entities from the new messages.
+    Entity ids only mean something within the scorer's vocabulary, so once
+    it passes max_vocab entries the vocabulary, the cached matrices and the
+    entity cache are dropped together.
+
+    Calls are serialized by a lock, so the scorer can be used from worker
+    threads.
+    """
+
+    def __init__(
+        self,
+        extract_entities: Callable[[str], List[str]],
+        cache_size: int = 4096,
+        max_histories: int = 64,
+        max_vocab: int = 200_000,
+    ):
+        self._extract_entities = extract_entities
+        self._vocab: Dict[str, int] = {}
+        self._histories: "OrderedDict[Hashable, EntityMatrix]" = OrderedDict()
+        self.max_histories = max_histories
+        self.max_vocab = max_vocab
+        self.entity_ids = lru_cache(maxsize=cache_size)(self._entity_ids)
+        self._lock = threading.RLock()
+
+    def reset(self):
+        """Forget the vocabulary and everything built from it."""
+        with self._lock:
+            self._vocab.clear()
+            self._histories.clear()
+            self.entity_ids.cache_clear()
+
+    def _entity_ids(self, text: str) -> np.ndarray:
+        ids = [self._vocab.setdefault(entity, len(self._vocab)) for entity in set(self._extract_entities(text))]
+        return np.array(sorted(ids), dtype=np.int64)
+
+    def matrix(self, texts: Sequence[str], key: Optional[Hashable] = None) -> EntityMatrix:
+        """Entity matrix for texts, reusing and extending the one cached under key."""
+        with self._lock:
+            matrix = self._histories.get(key) if key is not None else None
+            if matrix is None or not matrix.continues(texts):
+                matrix = EntityMatrix()
+            start = len(matrix)
+            if start < len(texts):
+                matrix.extend([self.entity_ids(text) for text in texts[start:]], texts[-1])
+            if key is not None:
+                self._histories[key] = matrix
+                self._histories.move_to_end(key)
+                while len(self._histories) > self.max_histories:
+                    self._histories.popitem(last=False)
+            return matrix
+
+    def overlap_scores(self, current_message: str, texts: Sequence[str], key: Optional[Hashable] = None) -> np.ndarray:
+        """Jaccard entity overlap of current_message with each text (0.1 when both have none)."""
+        n = len(texts)
+        if n == 0:
+            return np.zeros(0)
+        with self._lock:
+            if len(self._vocab) > self.max_vocab:
+                self.reset()
+            query = self.entity_ids(current_message)
+            matrix = self.matrix(texts, key)
+            # extend() replaces both arrays, so take them together
+            flat, lengths = matrix.flat, matrix.lengths
+        row_of = np.repeat(np.arange(n), lengths)
+        intersection = np.bincount(row_of[np.isin(flat, query)], minlength=n)
+        union = len(query) + lengths - intersection
+        with np.errstate(divide="ignore", invalid="ignore"):
+            scores = np.where(union > 0, intersection / union, 0.0)
+        if len(query) == 0:
+            scores[lengths == 0] = 0.1
+        return scores
+
+    def score(
+        self,
+        current_message: str,
+        texts: Sequence[str],
+        timestamps: Optional[Sequence[datetime]] = None,
+        importance: Optional[Sequence[float]] = None,
+        now: Optional[datetime] = None,
+        key: Optional[Hashable] = None,
+    ) -> np.ndarray:
+        """Combined recency, importance and overlap score for every text.
+
+        Missing timestamps count as now and missing importance as 0.5.
+        """
+        n = len(texts)
+        if timestamps is None:
+            recency = np.ones(n)
+        else:
+            now = now or datetime.now()
+            elapsed_us = epoch_us([now])[0] - epoch_us(timestamps)
+            time_diff = elapsed_us / 1_000_000 / 3600  # hours
+            recency = np.maximum(0, 1 - (time_diff / 24))  # Decay over 24 hours
+        weights = np.full(n, 0.5) if importance is None else np.asarray(importance, dtype=np.float64)
+        overlap = self.overlap_scores(current_message, texts, key)
+        return recency * RECENCY_WEIGHT + weights * IMPORTANCE_WEIGHT + overlap * OVERLAP_WEIGHT
+
+
+def epoch_us(timestamps: Sequence[datetime]) -> np.ndarray:
+    """Whole microseconds since the epoch for each timestamp (exact, unlike float timestamps)."""
+    if isinstance(timestamps, np.ndarray) and np.issubdtype(timestamps.dtype, np.datetime64):
+        return timestamps.astype("datetime64[us]").astype(np.int64)
+    if not len(timestamps):
+        return np.zeros(0, dtype=np.int64)
+    epoch = _EPOCH_UTC if timestamps[0].tzinfo is not None else _EPOCH
+    return np.fromiter(((t - epoch) // _MICROSECOND for t in timestamps), dtype=np.int64, count=len(timestamps))
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k best scores, best first; ties keep history order like a stable sort."""
+    n = len(scores)
+    if n == 0 or k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    if k >= n:
+        candidates = np.arange(n)
+    else:
+        # Partial sort for the threshold, then take ties in index order
+        kth = scores[np.argpartition(-scores, k - 1)[k - 1]]
+        above = np.flatnonzero(scores > kth)
+        ties = np.flatnonzero(scores == kth)[: k - len(above)]
+        candidates = np.concatenate([above, ties])
+    order = np.lexsort((candidates, -scores[candidates]))
+    return candidates[order]
@@ -0,0 +1,184 @@
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+from metrics import LatencyRecorder
+
+
+class SchedulerFull(Exception):
+    """Raised when a request cannot be queued because a queue bound is reached."""
+
+    def __init__(self, message: str, user: str):
+        super().__init__(message)
+        self.user = user
+
+
+class Ticket:
+    """A reserved place in the scheduler queue for one upstream call.
+
+    Use it as an async context manager to wait for a concurrency slot and
+    hold it for the duration of the call. A ticket that is never entered
+    must be given back with cancel().
+    """
+
+    def __init__(self, scheduler: "FairScheduler", user: str):
+        self.scheduler = scheduler
+        self.user = user
+        self.state = "reserved"  # reserved -> queued -> running -> done
+        self.finish_tag = 0.0
+        self.start_tag = 0.0
+        self.enqueued_at = 0.0
+        self.granted: Optional[asyncio.Future] = None
+
+    async def __aenter__(self) -> "Ticket":
+        await self.scheduler._acquire(self)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.scheduler._release(self)
+
+    def cancel(self):
+        """Give back a reservation that was never entered.
+
+        A queued or running ticket is left to the task that entered it:
+        cancelling that task drops it from the queue, leaving the context
+        releases its slot.
+        """
+        if self.state == "reserved":
+            self.scheduler._drop(self)
+
+
+class FairScheduler:
+    """Admission control and weighted fair queueing for upstream LLM calls.
+
+    At most max_concurrency calls run at once. Waiting calls are ordered by
+    start-time fair queueing: each user's requests get virtual finish tags
+    spaced 1/weight apart, so a user with many queued requests cannot starve
+    the others. Admission fails fast with SchedulerFull when the user's or
+    the global queue is full.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 4,
+        max_queue: int = 64,
+        max_queue_per_user: int = 8,
+        weights: Optional[Dict[str, float]] = None,
+        default_weight: float = 1.0,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_queue_per_user = max_queue_per_user
+        self.weights = weights or {}
+        self.default_weight = default_weight
+
+        self.active = 0
+        self.virtual_time = 0.0
+        self._heap: List[Any] = []
+        self._seq = itertools.count()
+        self._last_finish: Dict[str, float] = {}
+        self._pending: Dict[str, int] = {}  # user -> reserved or queued tickets
+        self._running: Dict[str, int] = {}
+
+        self.admitted = 0
+        self.rejected = 0
+        self.wait_ms = LatencyRecorder()
+
+    @classmethod
+    def from_env(cls) -> "FairScheduler":
+        """Build a scheduler from LLM_* environment variables."""
+        weights = {}
+        for item in os.environ.get("LLM_USER_WEIGHTS", "").split(","):
+            if "=" in item:
+                user, weight = item.split("=", 1)
+                weights[user.strip()] = float(weight)
+        return cls(
+            max_concurrency=int(os.environ.get("LLM_MAX_CONCURRENCY", "4")),
+            max_queue=int(os.environ.get("LLM_MAX_QUEUE", "64")),
+            max_queue_per_user=int(os.environ.get("LLM_MAX_QUEUE_PER_USER", "8")),
+            weights=weights,
+        )
+
+    @property
+    def queued(self) -> int:
+        return sum(self._pending.values())
+
+    def admit(self, user: str) -> Ticket:
+        """Reserve a queue slot for user or raise SchedulerFull immediately."""
+        if self._pending.get(user, 0) >= self.max_queue_per_user:
+            self.rejected += 1
+            raise SchedulerFull(f"Too many queued requests for user '{user}'", user)
+        if self.queued >= self.max_queue:
+            self.rejected += 1
+            raise SchedulerFull("Upstream queue is full", user)
+        self._pending[user] = self._pending.get(user, 0) + 1
+        self.admitted += 1
+        return Ticket(self, user)
+
+    async def _acquire(self, ticket: Ticket):
+        if ticket.state != "reserved":
+            raise RuntimeError(f"Ticket cannot be entered from state '{ticket.state}'")
+        ticket.enqueued_at = time.perf_counter()
+        weight = self.weights.get(ticket.user, self.default_weight)
+        ticket.start_tag = max(self.virtual_time, self._last_finish.get(ticket.user, 0.0))
+        ticket.finish_tag = ticket.start_tag + 1.0 / weight
+        self._last_finish[ticket.user] = ticket.finish_tag
+        ticket.granted = asyncio.get_running_loop().create_future()
+        ticket.state = "queued"
+        heapq.heappush(self._heap, (ticket.finish_tag, next(self._seq), ticket))
+        self._dispatch()
+        try:
+            await ticket.granted
+        except asyncio.CancelledError:
+            if ticket.state == "running":
+                self._release(ticket)
+            else:
+                self._drop(ticket)
+            raise
+
+    def _dispatch(self):
+        while self.active < self.max_concurrency and self._heap:
+            _, _, ticket = heapq.heappop(self._heap)
+            if ticket.state != "queued":
+                continue  # dropped while waiting
+            ticket.state = "running"
+            self.virtual_time = ticket.start_tag
+            self.active += 1
+            self._pending[ticket.user] -= 1
+            self._running[ticket.user] = self._running.get(ticket.user, 0) + 1
+            self.wait_ms.record((time.perf_counter() - ticket.enqueued_at) * 1000)
+            ticket.granted.set_result(None)
+
+    def _release(self, ticket: Ticket):
+        if ticket.state != "running":
+            return
+        ticket.state = "done"
+        self.active -= 1
+        self._running[ticket.user] -= 1
+        self._dispatch()
+
+    def _drop(self, ticket: Ticket):
+        if ticket.state not in ("reserved", "queued"):
+            return  # already dispatched or dropped
+        # Queued tickets stay in the heap and are skipped when popped
+        ticket.state = "done"
+        self._pending[ticket.user] -= 1
+
+    def metrics(self) -> Dict[str, Any]:
+        users = set(self._pending) | set(self._running)
+        return {
+            "max_concurrency": self.max_concurrency,
+            "active": self.active,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "queue_wait_ms": self.wait_ms.summary(),
+            "users": {
+                user: {"queued": self._pending.get(user, 0), "running": self._running.get(user, 0)}
+                for user in sorted(users)
+                if self._pending.get(user, 0) or self._running.get(user, 0)
+            },
+        }
@@ -0,0 +1,98 @@
+import json
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Type, TypeVar, Union
+
+from pydantic import BaseModel
+
+from conversation_models import EnhancedMessage
+
+try:
+    import orjson as _orjson
+except ImportError:  # optional faster backend
+    _orjson = None
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+
+def dumps(obj: Any) -> bytes:
+    """Serialize plain JSON data to UTF-8 bytes, using orjson when installed."""
+    if _orjson is not None:
+        return _orjson.dumps(obj, default=str)
+    return json.dumps(obj, default=str, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """Parse JSON bytes or text, using orjson when installed."""
+    if _orjson is not None:
+        return _orjson.loads(data)
+    return json.loads(data)
+
+
+def dump_model(model: BaseModel) -> bytes:
+    """Serialize a pydantic model with its native JSON serializer."""
+    return model.model_dump_json().encode("utf-8")
+
+
+def load_model(cls: Type[ModelT], data: Union[bytes, str]) -> ModelT:
+    """Validate JSON straight into a pydantic model without an intermediate dict."""
+    return cls.model_validate_json(data)
+
+
+def content_text(content: Any) -> str:
+    """Text of a stored message; multimodal contents keep only their text parts."""
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return " ".join(
+            str(part.get("text", "")) for part in content if isinstance(part, dict) and part.get("type") == "text"
+        )
+    return "" if content is None else str(content)
+
+
+class MessageView:
+    """Lightweight read-only view of a stored chat message.
+
+    Hydrating a pydantic EnhancedMessage for every stored message on every
+    turn is the expensive part of loading history; views are built instead
+    and only the messages that are actually used become full models.
+    """
+
+    __slots__ = ("index", "role", "content", "tool")
+
+    def __init__(self, index: int, role: str, content: Any, tool: Optional[str] = None):
+        self.index = index
+        self.role = role
+        self.content = content
+        self.tool = tool
+
+    @property
+    def text(self) -> str:
+        return content_text(self.content)
+
+    def to_enhanced(self, timestamp: Optional[datetime] = None, importance_score: float = 0.5) -> EnhancedMessage:
+        return EnhancedMessage(
+            role=self.role,
+            content=self.text,
+            timestamp=timestamp or datetime.now(),
+            message_id=str(uuid.uuid4()),
+            importance_score=importance_score,
+            tool=self.tool,
+        )
+
+    def __repr__(self) -> str:
+        return f"MessageView({self.index}, {self.role!r}, {self.text[:40]!r})"
+
+
+def message_views(data: Optional[Dict[str, Any]]) -> List[MessageView]:
+    """Build views over the messages of a parsed chat document.
+
+    Indexes are absolute: a compacted chat only stores its recent messages,
+    starting at data["offset"].
+    """
+    if not data:
+        return []
+    return [
+        MessageView(i, msg.get("role", "user"), msg.get("content", ""), msg.get("tool"))
+        for i, msg in enumerate(data.get("messages", []), start=data.get("offset", 0))
+    ]
@@ -0,0 +1,114 @@
+import asyncio
+import hashlib
+import json
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+
+def canonical_key(*parts: Any, **fields: Any) -> str:
+    """Build a stable key for a request so identical requests hash the same."""
+    payload = json.dumps([parts, fields], sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class _Flight:
+    """One in-flight upstream stream shared by every subscriber of a key."""
+
+    def __init__(self):
+        self.chunks: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.changed = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    def notify(self):
+        # Wake everyone waiting on the current event and hand out a fresh one
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+
+class SingleFlight:
+    """Coalesce concurrent identical requests into a single upstream call.
+
+    The first caller for a key (the leader) starts the upstream work; callers
+    that arrive while it is still running join it. Stream subscribers replay
+    the chunks produced so far and then follow the live stream, so late
+    joiners see the full response. Once a flight finishes or fails it is
+    forgotten, so later requests always trigger a fresh upstream call.
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+        self._calls: Dict[str, asyncio.Future] = {}
+        self.stats = {"leaders": 0, "followers": 0}
+
+    def in_flight(self, key: str) -> bool:
+        return key in self._flights or key in self._calls
+
+    async def stream(self, key: str, factory: Callable[[], AsyncIterator[Any]]) -> AsyncIterator[Any]:
+        """Subscribe to the stream for key, starting it with factory() if needed."""
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight()
+            self._flights[key] = flight
+            flight.task = asyncio.create_task(self._pump(key, flight, factory))
+            self.stats["leaders"] += 1
+        else:
+            self.stats["followers"] += 1
+
+        flight.subscribers += 1
+        index = 0
+        try:
+            while True:
+                while index < len(flight.chunks):
+                    yield flight.chunks[index]
+                    index += 1
+                if flight.done:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+                await flight.changed.wait()
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done and flight.task is not None:
+                # Nobody is listening any more; stop paying for the upstream call.
+                # Forget the flight now so a request arriving before _pump has
+                # wound down starts a fresh one instead of joining a dying stream.
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                flight.task.cancel()
+
+    async def _pump(self, key: str, flight: _Flight, factory: Callable[[], AsyncIterator[Any]]):
+        try:
+            async for chunk in factory():
+                flight.chunks.append(chunk)
+                flight.notify()
+        except asyncio.CancelledError:
+            flight.error = ConnectionAbortedError("Upstream stream was cancelled")
+        except Exception as e:
+            flight.error = e
+        finally:
+            flight.done = True
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            flight.notify()
+
+    async def call(self, key: str, fn: Callable[..., Any], *args: Any) -> Any:
+        """Run a blocking fn(*args) once per key in a worker thread and share its result."""
+        future = self._calls.get(key)
+        if future is None:
+            future = asyncio.ensure_future(asyncio.to_thread(fn, *args))
+            self._calls[key] = future
+            future.add_done_callback(lambda f: self._forget_call(key, f))
+            self.stats["leaders"] += 1
+        else:
+            self.stats["followers"] += 1
+        # Shield so one caller going away does not cancel the shared call
+        return await asyncio.shield(future)
+
+    def _forget_call(self, key: str, future: asyncio.Future):
+        if self._calls.get(key) is future:
+            del self._calls[key]
+        if not future.cancelled():
+            # Mark the exception as retrieved even if every caller went away
+            future.exception()
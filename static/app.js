@@ -90,8 +90,8 @@ function showClarificationDialog(suggestions) {
     document.getElementById('clarify-proceed').onclick = () => {
         document.body.removeChild(dialog);
         clarificationMode = false;
-        // Proceed with original message
-        sendMessageToChatEndpoint(pendingClarification.message);
+        // Proceed with original message, without asking again
+        sendMessageToChatEndpoint(pendingClarification.message, true);
     };
     
     document.getElementById('clarify-modify').onclick = () => {
@@ -217,6 +217,64 @@ applyToolBtn.addEventListener('click', async () => {
     reasoningTrace.textContent = '';
 });
 
+// --- Chat Socket ---
+// One WebSocket carries every chat turn: the server decides on clarification
+// inline and streams typed frames tagged with the turn id. If it cannot be
+// opened, messages go over /clarify and POST /chat instead.
+let socket = null;
+let socketOpening = null;
+let turnCounter = 0;
+const turns = new Map();
+
+function openSocket() {
+    if (socket && socket.readyState === WebSocket.OPEN) return Promise.resolve(socket);
+    if (socketOpening) return socketOpening;
+    if (!('WebSocket' in window)) return Promise.resolve(null);
+    socketOpening = new Promise((resolve) => {
+        const scheme = location.protocol === 'https:' ? 'wss' : 'ws';
+        const ws = new WebSocket(`${scheme}://${location.host}/ws`);
+        ws.onopen = () => {
+            socket = ws;
+            socketOpening = null;
+            resolve(ws);
+        };
+        ws.onerror = () => {
+            socketOpening = null;
+            resolve(null);
+        };
+        ws.onmessage = (event) => handleFrame(JSON.parse(event.data));
+        ws.onclose = () => {
+            socket = null;
+            // Turns cut off by the disconnect end with an error; the next send reconnects
+            turns.forEach((turn) => turn.onError('Connection lost'));
+            turns.clear();
+        };
+    });
+    return socketOpening;
+}
+
+function handleFrame(frame) {
+    const turn = turns.get(frame.id);
+    if (!turn) return;
+    if (frame.type === 'token') {
+        turn.onToken(frame.text);
+    } else if (frame.type === 'clarify') {
+        turn.onClarify(frame.suggested_clarifications);
+    } else if (frame.type === 'done') {
+        turns.delete(frame.id);
+        turn.onDone();
+    } else if (frame.type === 'error') {
+        turns.delete(frame.id);
+        turn.onError(frame.message);
+    }
+}
+
+function sendOverSocket(ws, request, handlers) {
+    const id = String(++turnCounter);
+    turns.set(id, handlers);
+    ws.send(JSON.stringify({ type: 'chat', id, ...request }));
+}
+
 // --- Chat Send ---
 chatForm.addEventListener('submit', async (e) => {
     e.preventDefault();
@@ -228,8 +286,10 @@ chatForm.addEventListener('submit', async (e) => {
     const message = userInput.value.trim();
     if (!message) return;
     
-    // Check for clarification need (unless we're already in clarification mode)
-    if (!clarificationMode) {
+    // Over the socket the server checks clarity itself; otherwise ask /clarify first
+    // (unless we're already in clarification mode)
+    const ws = await openSocket();
+    if (!ws && !clarificationMode) {
         const clarificationResult = await checkForClarification(message);
         
         if (clarificationResult.needsClarification) {
@@ -241,31 +301,75 @@ chatForm.addEventListener('submit', async (e) => {
     }
     
     // Proceed with normal message sending
-    await sendMessageToChatEndpoint(message);
     userInput.value = '';
+    await sendMessageToChatEndpoint(message, clarificationMode);
     clarificationMode = false;
 });
 
 // Extract message sending logic to separate function
-async function sendMessageToChatEndpoint(message) {
+async function sendMessageToChatEndpoint(message, skipClarify = false) {
     appendMessage('user', message);
+    const userMsg = chatWindow.lastElementChild;
     appendMessage('assistant', '...');
     const lastMsg = chatWindow.querySelector('.message.assistant:last-child');
     lastMsg.textContent = '';
     
     if (reasoningTrace) reasoningTrace.textContent = 'Thinking...';
     
+    const requestBody = {
+        message,
+        chat: currentChat,
+        history: [], // Add actual history if needed
+        skip_clarify: skipClarify
+    };
+    
+    if (imageBase64) {
+        requestBody.image_base64 = imageBase64;
+    }
+    
+    const finish = () => {
+        if (reasoningTrace) reasoningTrace.textContent = '';
+        imageBase64 = null;
+        imageBtn.textContent = '📷';
+        showError('');
+    };
+    const fail = (msg) => {
+        lastMsg.textContent = '[Error: ' + msg + ']';
+        if (reasoningTrace) reasoningTrace.textContent = '';
+        showError('Failed to send message: ' + msg);
+    };
+    
+    const ws = await openSocket();
+    if (ws) {
+        await new Promise((resolve) => {
+            sendOverSocket(ws, requestBody, {
+                onToken: (text) => {
+                    lastMsg.textContent += text;
+                    chatWindow.scrollTop = chatWindow.scrollHeight;
+                },
+                onClarify: (suggestions) => {
+                    // Nothing was stored; take the message back and ask
+                    userMsg.remove();
+                    lastMsg.remove();
+                    if (reasoningTrace) reasoningTrace.textContent = '';
+                    pendingClarification = { message: message };
+                    clarificationMode = true;
+                    showClarificationDialog(suggestions);
+                },
+                onDone: () => {
+                    if (lastMsg.isConnected) finish();
+                    resolve();
+                },
+                onError: (msg) => {
+                    fail(msg);
+                    resolve();
+                }
+            });
+        });
+        return;
+    }
+    
     try {
-        const requestBody = {
-            message,
-            chat: currentChat,
-            history: [] // Add actual history if needed
-        };
-        
-        if (imageBase64) {
-            requestBody.image_base64 = imageBase64;
-        }
-
         const res = await fetch('/chat', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
@@ -292,17 +396,13 @@ async function sendMessageToChatEndpoint(message) {
             }
         }
         
-        if (reasoningTrace) reasoningTrace.textContent = '';
-        imageBase64 = null;
-        imageBtn.textContent = '📷';
-        showError('');
+        finish();
         
     } catch (err) {
-        lastMsg.textContent = '[Error: ' + err.message + ']';
-        if (reasoningTrace) reasoningTrace.textContent = '';
-        showError('Failed to send message: ' + err.message);
+        fail(err.message);
     }
 }
 
 // --- Initialize ---
 refreshChats();
+openSocket();
@@ -0,0 +1,111 @@
+import hashlib
+import mimetypes
+import re
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Sequence
+
+from fastapi import HTTPException, Request
+from fastapi.responses import Response
+
+from compression import ENCODINGS, compress, negotiate
+
+# Files under static/ that the UI uses; anything else there (the old app_backup.js and app_new.js) is not served
+SERVED_ASSETS = ("app.js", "style.css", "profiles.js", "favicon.ico")
+_COMPRESSIBLE = {".js", ".css", ".html", ".svg", ".json", ".txt"}
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+_STATIC_URL_RE = re.compile(r"""(["'])/static/([^"'?#]+)\1""")
+
+
+class Asset:
+    """One static file held in memory with its precompressed variants."""
+
+    def __init__(self, name: str, body: bytes, media_type: Optional[str] = None):
+        self.name = name
+        self.media_type = media_type or mimetypes.guess_type(name)[0] or "application/octet-stream"
+        self.digest = hashlib.sha256(body).hexdigest()[:12]
+        stem, dot, suffix = name.rpartition(".")
+        self.hashed_name = f"{stem}.{self.digest}.{suffix}" if dot else f"{name}.{self.digest}"
+        self.variants: Dict[Optional[str], bytes] = {None: body}
+        if Path(name).suffix in _COMPRESSIBLE:
+            for encoding in ENCODINGS:
+                compressed = compress(body, encoding, 11 if encoding == "br" else 9)
+                # Not worth a variant unless it saves a tenth
+                if len(compressed) < len(body) * 0.9:
+                    self.variants[encoding] = compressed
+
+    def response(self, request: Request, cache_control: str) -> Response:
+        encoding = negotiate(request.headers.get("accept-encoding", ""), self.variants)
+        etag = f'"{self.digest}-{encoding}"' if encoding else f'"{self.digest}"'
+        headers = {"Cache-Control": cache_control, "ETag": etag}
+        if len(self.variants) > 1:
+            headers["Vary"] = "Accept-Encoding"
+        if_none_match = request.headers.get("if-none-match", "")
+        if etag in if_none_match or if_none_match.strip() == "*":
+            return Response(status_code=304, headers=headers)
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        return Response(self.variants[encoding], media_type=self.media_type, headers=headers)
+
+
+class StaticAssets:
+    """static/ served from memory, with content-hashed URLs for long-lived caching.
+
+    build() reads the served files once, precompresses the text ones (gzip,
+    and brotli when installed) and rewrites index.html so it references
+    /static/app.<hash>.js instead of /static/app.js. Hashed URLs are cached
+    as immutable, since any change to a file changes its URL; the page and
+    the plain names are revalidated with their ETag on each load.
+    """
+
+    def __init__(self, directory: Path, names: Sequence[str] = SERVED_ASSETS, index: str = "index.html"):
+        self.directory = directory
+        self.names = tuple(names)
+        self.index_name = index
+        self._assets: Dict[str, Asset] = {}
+        self._hashed: Dict[str, Asset] = {}
+        self._index: Optional[Asset] = None
+        self._lock = threading.Lock()
+
+    def build(self):
+        with self._lock:
+            assets = {
+                name: Asset(name, (self.directory / name).read_bytes())
+                for name in self.names
+                if (self.directory / name).is_file()
+            }
+
+            def hashed_url(match: "re.Match[str]") -> str:
+                asset = assets.get(match.group(2))
+                return f"{match.group(1)}/static/{asset.hashed_name}{match.group(1)}" if asset else match.group(0)
+
+            page = _STATIC_URL_RE.sub(hashed_url, (self.directory / self.index_name).read_text(encoding="utf-8"))
+            self._assets = assets
+            self._hashed = {asset.hashed_name: asset for asset in assets.values()}
+            self._index = Asset(self.index_name, page.encode("utf-8"), "text/html; charset=utf-8")
+
+    def _ensure_built(self):
+        if self._index is None:
+            self.build()
+
+    def url(self, name: str) -> str:
+        self._ensure_built()
+        asset = self._assets.get(name)
+        return f"/static/{asset.hashed_name}" if asset else f"/static/{name}"
+
+    def serve(self, request: Request, name: str) -> Response:
+        self._ensure_built()
+        asset = self._hashed.get(name)
+        if asset is not None:
+            return asset.response(request, IMMUTABLE)
+        asset = self._assets.get(name)
+        if asset is None:
+            raise HTTPException(status_code=404, detail="Not Found")
+        return asset.response(request, REVALIDATE)
+
+    def index(self, request: Request) -> Response:
+        self._ensure_built()
+        return self._index.response(request, REVALIDATE)
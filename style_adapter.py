@@ -31,6 +31,12 @@ class StyleAdapter:
             ]
         }
 
+    def warmup(self):
+        """Compile the style patterns ahead of the first request."""
+        for patterns in self.style_indicators.values():
+            for pattern, _ in patterns:
+                re.compile(pattern, re.IGNORECASE | re.MULTILINE)
+
     async def analyze_user_style(self, messages: List[str]) -> Dict[str, float]:
         """Analyze user's communication style from their message history."""
         style_scores = {key: 0.0 for key in self.style_indicators.keys()}
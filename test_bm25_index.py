@@ -0,0 +1,195 @@
+import pytest
+import json
+import math
+import sys
+import os
+from collections import Counter
+from datetime import datetime
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bm25_index import BM25Index, IndexStore, tokenize, K1, B
+from context_manager import ContextManager
+from conversation_models import ConversationState
+
+DOCS = [
+    ("work", "Deploying the Kubernetes cluster with Helm charts"),
+    ("work", "The cluster autoscaler keeps adding nodes"),
+    ("cooking", "A sourdough starter needs daily feeding"),
+    ("cooking", "Bake the sourdough at high heat with steam"),
+    ("travel", "Flights to Lisbon are cheaper in winter"),
+]
+
+
+def reference_scores(docs, query):
+    """Textbook BM25 over every document."""
+    tokens = [tokenize(text) for _, text in docs]
+    avgdl = sum(map(len, tokens)) / len(tokens)
+    scores = []
+    for doc in tokens:
+        tf = Counter(doc)
+        score = 0.0
+        for term in set(tokenize(query)):
+            df = sum(term in d for d in tokens)
+            if tf[term]:
+                idf = math.log(1 + (len(tokens) - df + 0.5) / (df + 0.5))
+                score += idf * tf[term] * (K1 + 1) / (tf[term] + K1 * (1 - B + B * len(doc) / avgdl))
+        scores.append(score)
+    return scores
+
+
+def build(directory, docs, merge_threshold=2000):
+    index = BM25Index(directory, merge_threshold=merge_threshold)
+    for i, (chat, text) in enumerate(docs):
+        index.add(chat, i, text)
+    return index
+
+
+class TestBM25Index:
+    @pytest.mark.parametrize("merge_threshold", [2000, 2])
+    def test_scores_match_reference(self, tmp_path, merge_threshold):
+        index = build(tmp_path, DOCS, merge_threshold)
+        expected = reference_scores(DOCS, "sourdough cluster heat")
+        hits = index.search("sourdough cluster heat", k=10)
+        assert {hit.message: pytest.approx(hit.score) for hit in hits} == {
+            i: pytest.approx(score) for i, score in enumerate(expected) if score > 0
+        }
+        assert hits[0].message == 3
+
+    def test_reopens_segment_and_delta(self, tmp_path):
+        index = build(tmp_path, DOCS, merge_threshold=3)
+        assert index.stats()["segment_documents"] == 3
+        before = index.search("sourdough winter")
+        reopened = BM25Index(tmp_path, merge_threshold=3)
+        assert isinstance(reopened.postings, np.memmap)
+        assert reopened.stats() == index.stats()
+        assert reopened.search("sourdough winter") == before
+
+    def test_merge_keeps_results_and_drops_old_generation(self, tmp_path):
+        index = build(tmp_path, DOCS)
+        before = index.search("cluster sourdough")
+        index.merge()
+        assert index.search("cluster sourdough") == before
+        assert sorted(p.name for p in tmp_path.iterdir()) == ["CURRENT", "seg-1"]
+
+    def test_excludes_chats_and_unknown_terms(self, tmp_path):
+        index = build(tmp_path, DOCS)
+        assert {hit.chat for hit in index.search("sourdough cluster", exclude_chats=["work"])} == {"cooking"}
+        assert index.search("zebra") == []
+
+    def test_expired_deadline_still_scores_rarest_term(self, tmp_path):
+        index = build(tmp_path, DOCS)
+        hits = index.search("the lisbon", deadline=0)
+        assert [hit.message for hit in hits] == [4]
+
+    def test_torn_delta_line_is_dropped_on_reopen(self, tmp_path):
+        index = build(tmp_path, DOCS)
+        delta = index._delta_path()
+        with open(delta, "ab") as f:
+            f.write(b'{"chat": "travel", "message": 5, "tf": {"lis')  # crashed mid-add
+        reopened = BM25Index(tmp_path)
+        assert reopened.search("sourdough winter") == index.search("sourdough winter")
+        reopened.add("travel", 5, "Lisbon trams in winter")
+        assert {hit.message for hit in BM25Index(tmp_path).search("lisbon")} == {4, 5}
+
+
+    @pytest.mark.parametrize("merge", [False, True])
+    def test_removed_chat_is_gone_and_can_be_readded(self, tmp_path, merge):
+        index = build(tmp_path, DOCS, merge_threshold=3)
+        index.remove_chat("cooking")
+        index.add("cooking", 9, "Sourdough again")
+        if merge:
+            index.merge()
+        without = [(chat, text) for chat, text in DOCS if chat != "cooking"] + [("cooking", "Sourdough again")]
+        expected = build(tmp_path / "fresh", without).search("sourdough cluster")
+        for reopened in (index, BM25Index(tmp_path, merge_threshold=3)):
+            hits = reopened.search("sourdough cluster")
+            assert [(hit.chat, hit.score) for hit in hits] == [(hit.chat, pytest.approx(hit.score)) for hit in expected]
+            assert [hit.message for hit in hits if hit.chat == "cooking"] == [9]
+            assert reopened.stats()["documents"] == 4
+
+
+class TestIndexStore:
+    def test_search_attaches_stored_messages(self, tmp_path):
+        store = IndexStore(tmp_path)
+        messages = [{"role": "user", "content": [{"type": "text", "text": "Plan a trip to Lisbon"}]},
+                    {"role": "assistant", "content": "Lisbon is lovely in spring"}]
+        (tmp_path / "trip.json").write_text(json.dumps({"messages": messages}))
+        for i, message in enumerate(messages):
+            store.add("alice", "trip", i, message["content"])
+        store.add("alice", "gone", 7, "Lisbon notes from a deleted chat")
+
+        hits = store.search("alice", "lisbon", k=5)
+        assert [(hit.chat, hit.message, hit.role) for hit in hits] == [("trip", 0, "user"), ("trip", 1, "assistant")]
+        assert hits[0].content == "Plan a trip to Lisbon"
+        assert store.search("bob", "lisbon") == []
+
+    def test_similar_user_ids_get_separate_indexes(self, tmp_path):
+        (tmp_path / "secrets.json").write_text(json.dumps({"messages": [{"role": "user", "content": "my password"}]}))
+        store = IndexStore(tmp_path)
+        store.add("alice@corp.com", "secrets", 0, "my password")
+        assert store.search("alice_corp_com", "password") == []
+        assert IndexStore(tmp_path).search("alice_corp_com", "password") == []
+        assert [hit.chat for hit in IndexStore(tmp_path).search("alice@corp.com", "password")] == ["secrets"]
+
+    def test_rebuild_uses_state_owner(self, tmp_path):
+        (tmp_path / "c1.json").write_text(json.dumps({"messages": [{"role": "user", "content": "Rust borrow checker"}]}))
+        (tmp_path / "c1_state.json").write_text(json.dumps({"user_id": "carol"}))
+        (tmp_path / "c2.json").write_text(json.dumps({"messages": [{"role": "user", "content": "Rust lifetimes"}]}))
+        store = IndexStore(tmp_path)
+        assert store.rebuild() == {"carol": 1, "default_user": 1}
+        assert [hit.chat for hit in IndexStore(tmp_path).search("carol", "rust")] == ["c1"]
+
+
+def test_message_is_saved_when_indexing_fails(monkeypatch, tmp_path):
+    import utils
+
+    class BrokenIndex:
+        def add(self, *args):
+            raise ValueError("corrupt index")
+
+    monkeypatch.setattr(utils, "CHATS_DIR", tmp_path)
+    monkeypatch.setattr(utils, "memory_index", BrokenIndex())
+    (tmp_path / "c.json").write_text(json.dumps({"messages": []}))
+    utils.save_chat_message("c", {"role": "user", "content": "hello"}, user="alice")
+    assert json.loads((tmp_path / "c.json").read_text())["messages"] == [{"role": "user", "content": "hello"}]
+
+
+@pytest.mark.asyncio
+async def test_relevant_context_recalls_other_chats(tmp_path):
+    store = IndexStore(tmp_path)
+    for chat, text in DOCS:
+        path = tmp_path / f"{chat}.json"
+        data = json.loads(path.read_text()) if path.exists() else {"messages": []}
+        data["messages"].append({"role": "user", "content": text})
+        path.write_text(json.dumps(data))
+        store.add("u1", chat, len(data["messages"]) - 1, text)
+
+    manager = ContextManager(memory=store)
+    state = ConversationState(
+        chat_id="work", user_id="u1", topic_summary="", key_entities=[],
+        conversation_stage="developing", last_updated=datetime.now(), importance_scores={},
+    )
+    recalled = await manager.recall(state, "bake sourdough")
+    assert [hit.chat for hit in recalled] == ["cooking", "cooking"]
+    assert recalled[0].content.startswith("Bake the sourdough")
+
+    relevant = await manager.get_relevant_context(state, "sourdough cluster", [], include_memory=True)
+    assert [msg.content for msg in relevant] == [DOCS[2][1], DOCS[3][1]]
+    assert await ContextManager().recall(state, "sourdough") == []
+
+
+def test_search_endpoint(monkeypatch, tmp_path):
+    from fastapi.testclient import TestClient
+    import endpoints
+    import main
+
+    store = IndexStore(tmp_path)
+    (tmp_path / "c1.json").write_text(json.dumps({"messages": [{"role": "user", "content": "Postgres vacuum settings"}]}))
+    store.add("dave", "c1", 0, "Postgres vacuum settings")
+    monkeypatch.setattr(endpoints, "memory_index", store)
+
+    data = TestClient(main.app).get("/search", params={"q": "vacuum", "user": "dave"}).json()
+    assert [(r["chat"], r["message"], r["content"]) for r in data["results"]] == [("c1", 0, "Postgres vacuum settings")]
@@ -0,0 +1,188 @@
+import pytest
+import gzip
+import json
+import sys
+import os
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bm25_index import IndexStore
+from chat_export import export_stream, import_stream, export_records, NDJSONDecoder
+from compaction import HistoryCompactor, FakeSummarizer, stored_messages
+from context_manager import ContextManager
+
+
+def make_corpus(chats_dir):
+    chats_dir.mkdir(parents=True, exist_ok=True)
+    for chat, user, day, count in [("alpha", "ann", 1, 30), ("beta", "bob", 5, 3), ("loose", None, None, 2)]:
+        messages = [{"role": "user", "content": f"{chat} message {i} about Postgres"} for i in range(count)]
+        (chats_dir / f"{chat}.json").write_text(json.dumps({"messages": messages}))
+        if user:
+            state = {"chat_id": chat, "user_id": user, "last_updated": f"2024-03-0{day}T10:00:00"}
+            (chats_dir / f"{chat}_state.json").write_text(json.dumps(state))
+            profile = {"user_id": user, "last_updated": f"2024-03-0{day}T10:00:00"}
+            (chats_dir / f"profile_{user}.json").write_text(json.dumps(profile))
+
+
+def snapshot(chats_dir):
+    return {
+        p.stem: stored_messages(chats_dir, p.stem) if not p.stem.endswith("_state") and not p.stem.startswith("profile_")
+        else json.loads(p.read_text())
+        for p in chats_dir.glob("*.json")
+    }
+
+
+class TestExportImport:
+    @pytest.mark.parametrize("compress", [False, True])
+    def test_round_trip(self, tmp_path, compress):
+        source, target = tmp_path / "source", tmp_path / "target"
+        make_corpus(source)
+        chunks = list(export_stream(source, compress=compress))
+        if compress:
+            assert json.loads(gzip.decompress(b"".join(chunks)).splitlines()[0])["type"] == "chat"
+        counts = import_stream(target, iter(chunks))
+        assert counts == {"chats": 3, "messages": 35, "states": 2, "profiles": 2, "skipped": 0}
+        assert snapshot(target) == snapshot(source)
+
+    @pytest.mark.asyncio
+    async def test_round_trip_keeps_compacted_layout(self, tmp_path):
+        source, target = tmp_path / "source", tmp_path / "target"
+        make_corpus(source)
+        extract = ContextManager()._extract_entities
+        await HistoryCompactor(source, FakeSummarizer(), extract, window=10, segment_size=10).compact("alpha")
+
+        import_stream(target, export_stream(source), index=IndexStore(target))
+        data = json.loads((target / "alpha.json").read_text())
+        assert data["offset"] == 20 and len(data["messages"]) == 10 and len(data["summaries"]) == 2
+        assert stored_messages(target, "alpha") == stored_messages(source, "alpha")
+        hits = IndexStore(target).search("ann", "alpha message 3", k=1)
+        assert (hits[0].chat, hits[0].message) == ("alpha", 3)
+
+    def test_filters_by_user_and_date(self, tmp_path):
+        make_corpus(tmp_path)
+
+        def exported(**filters):
+            records = [json.loads(line) for line in export_records(tmp_path, **filters)]
+            return sorted((r["type"], r.get("chat") or r.get("user")) for r in records if r["type"] != "message")
+
+        assert exported(user="bob") == [("chat", "beta"), ("profile", "bob"), ("state", "beta")]
+        assert exported(since=datetime(2024, 3, 2), until=datetime(2024, 3, 31)) == [
+            ("chat", "beta"), ("profile", "bob"), ("state", "beta"),
+        ]
+        assert ("chat", "loose") in exported(user="default_user")
+
+    def test_skip_existing(self, tmp_path):
+        make_corpus(tmp_path)
+        (tmp_path / "beta.json").write_text(json.dumps({"messages": []}))
+        counts = import_stream(tmp_path, export_stream(tmp_path), skip_existing=True)
+        assert counts["chats"] == 0 and counts["skipped"] == 7
+        assert json.loads((tmp_path / "beta.json").read_text()) == {"messages": []}
+
+    def test_rejects_bad_records_and_cleans_up(self, tmp_path):
+        lines = [b'{"type":"chat","chat":"c","user":"u","offset":0}', b'{"type":"bogus"}']
+        with pytest.raises(ValueError, match="line 2"):
+            import_stream(tmp_path, iter([b"\n".join(lines)]))
+        assert list(tmp_path.iterdir()) == []
+        with pytest.raises(ValueError, match="invalid name"):
+            import_stream(tmp_path, iter([b'{"type":"profile","user":"../x","data":{}}']))
+
+    @pytest.mark.parametrize("record", [
+        b'{"type":"message","chat":"c","message":{"role":"user","content":"hi"}}',
+        b'{"type":"message","chat":"c","index":0,"message":"hi"}',
+        b'{"type":"message","chat":"c","index":"0","message":{}}',
+        b'{"type":"state","chat":"c"}',
+        b'{"type":"chat","chat":"d","offset":"2"}',
+    ])
+    def test_rejects_records_missing_fields(self, tmp_path, record):
+        lines = [b'{"type":"chat","chat":"c","user":"u","offset":0}', record]
+        with pytest.raises(ValueError, match="line 2: .* record needs"):
+            import_stream(tmp_path, iter([b"\n".join(lines)]))
+        assert list(tmp_path.iterdir()) == []
+
+    def test_profile_needs_user(self, tmp_path):
+        with pytest.raises(ValueError, match="line 1: profile record needs str 'user'"):
+            import_stream(tmp_path, iter([b'{"type":"profile","data":{}}']))
+
+    def test_reimport_replaces_index_entries(self, tmp_path):
+        source, target = tmp_path / "source", tmp_path / "target"
+        make_corpus(source)
+        body = b"".join(export_stream(source, user="bob"))
+        for _ in range(3):
+            import_stream(target, iter([body]), index=IndexStore(target))
+        hits = IndexStore(target).search("bob", "beta message 1", k=10)
+        assert sorted(hit.message for hit in hits) == [0, 1, 2]
+
+        # A chat handed to another owner leaves the previous owner's index
+        import_stream(target, iter([body.replace(b'"bob"', b'"ann"')]), index=IndexStore(target))
+        assert IndexStore(target).search("bob", "beta") == []
+        assert len(IndexStore(target).search("ann", "beta", k=10)) == 3
+
+    def test_aborted_import_leaves_index_untouched(self, tmp_path):
+        store = IndexStore(tmp_path)
+        lines = [b'{"type":"chat","chat":"c","user":"u","offset":0}',
+                 b'{"type":"message","chat":"c","index":0,"message":{"role":"user","content":"kubernetes"}}',
+                 b'{"type":"bogus"}']
+        with pytest.raises(ValueError):
+            import_stream(tmp_path, iter([b"\n".join(lines)]), index=store)
+        assert store.search("u", "kubernetes") == [] and IndexStore(tmp_path).search("u", "kubernetes") == []
+
+    def test_state_creates_chats_dir(self, tmp_path):
+        counts = import_stream(tmp_path / "new", iter([b'{"type":"state","chat":"c","data":{"user_id":"u"}}']))
+        assert counts["states"] == 1
+        assert json.loads((tmp_path / "new" / "c_state.json").read_text()) == {"user_id": "u"}
+
+    def test_decoder_handles_lines_split_across_chunks(self):
+        payload = gzip.compress(b'{"a":1}\n{"b":2}\n{"c":3}')
+        decoder = NDJSONDecoder()
+        lines = [line for i in range(0, len(payload), 5) for line in decoder.feed(payload[i:i + 5])]
+        assert lines + decoder.close() == [b'{"a":1}', b'{"b":2}', b'{"c":3}']
+
+
+def test_export_and_import_endpoints(monkeypatch, tmp_path):
+    from fastapi.testclient import TestClient
+    import endpoints
+    import main
+
+    source, target = tmp_path / "source", tmp_path / "target"
+    make_corpus(source)
+    client = TestClient(main.app)
+
+    monkeypatch.setattr(endpoints, "CHATS_DIR", source)
+    response = client.get("/export", params={"user": "ann", "gzip": True})
+    assert response.headers["content-type"] == "application/gzip"
+    body = response.content
+
+    monkeypatch.setattr(endpoints, "CHATS_DIR", target)
+    monkeypatch.setattr(endpoints, "memory_index", IndexStore(target))
+    assert client.post("/import", content=body).json()["messages"] == 30
+    assert stored_messages(target, "alpha") == stored_messages(source, "alpha")
+    assert client.post("/import", content=b"not json").status_code == 400
+    bad = b'{"type":"chat","chat":"c"}\n{"type":"message","chat":"c","message":{}}'
+    assert client.post("/import", content=bad).status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_import_endpoint_swaps_chats_under_their_lock(monkeypatch, tmp_path):
+    import asyncio
+    import httpx
+    import endpoints
+    import main
+    from io_executor import path_lock
+
+    source, target = tmp_path / "source", tmp_path / "target"
+    make_corpus(source)
+    body = b"".join(export_stream(source, user="bob"))
+    monkeypatch.setattr(endpoints, "CHATS_DIR", target)
+    monkeypatch.setattr(endpoints, "memory_index", IndexStore(target))
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test") as client:
+        async with path_lock(target / "beta.json"):
+            request = asyncio.create_task(client.post("/import", content=body))
+            await asyncio.sleep(0.2)
+            # The state record is written, but the chat waits for the lock held by a writer
+            assert (target / "beta_state.json").exists()
+            assert not (target / "beta.json").exists()
+        response = await request
+    assert response.json()["chats"] == 1
+    assert stored_messages(target, "beta") == stored_messages(source, "beta")
@@ -0,0 +1,179 @@
+import pytest
+import asyncio
+import json
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bm25_index import IndexStore
+from compaction import HistoryCompactor, ExtractiveSummarizer, FakeSummarizer, LLMSummarizer, Summarizer, stored_messages
+from scheduler import FairScheduler
+from context_manager import ContextManager
+from serialization import message_views
+
+extract_entities = ContextManager()._extract_entities
+
+TOPICS = ["Kafka", "Redis", "Docker", "Postgres", "Nginx", "Celery"]
+
+
+def write_chat(chats_dir, chat, count):
+    messages = [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": f"Message {i} about {TOPICS[i // 10]}"}
+        for i in range(count)
+    ]
+    (chats_dir / f"{chat}.json").write_text(json.dumps({"messages": messages}))
+    return messages
+
+
+@pytest.fixture
+def compactor(tmp_path):
+    return HistoryCompactor(tmp_path, FakeSummarizer(), extract_entities, window=10, segment_size=10)
+
+
+class TestHistoryCompactor:
+    @pytest.mark.asyncio
+    async def test_compacts_down_to_window_and_keeps_raw_messages(self, tmp_path, compactor):
+        original = write_chat(tmp_path, "long", 45)
+        assert await compactor.compact("long") == 3
+
+        data = json.loads((tmp_path / "long.json").read_text())
+        assert data["offset"] == 30
+        assert len(data["messages"]) == 15
+        assert [(s["start"], s["end"]) for s in data["summaries"]] == [(0, 10), (10, 20), (20, 30)]
+        assert "Redis" in data["summaries"][1]["entities"]
+        assert 0 <= data["summaries"][0]["importance"] <= 1
+        assert [len(call) for call in compactor.summarizer.calls] == [10, 10, 10]
+
+        assert stored_messages(tmp_path, "long") == original
+        assert stored_messages(tmp_path, "long", 28, 32) == original[28:32]
+        assert [view.index for view in message_views(data)][:2] == [30, 31]
+
+    @pytest.mark.asyncio
+    async def test_short_chat_is_left_alone(self, tmp_path, compactor):
+        write_chat(tmp_path, "short", 19)
+        assert await compactor.compact("short") == 0
+        assert "offset" not in json.loads((tmp_path / "short.json").read_text())
+
+    @pytest.mark.asyncio
+    async def test_interrupted_commit_does_not_misalign_archive(self, tmp_path, compactor):
+        original = write_chat(tmp_path, "c", 25)
+        await compactor.compact("c")
+        # Simulate a crash after the archive was appended but before the chat file was rewritten
+        with open(tmp_path / "archive" / "c.jsonl", "ab") as f:
+            f.write(b'{"role":"user","content":"orphan"}\n')
+        data = json.loads((tmp_path / "c.json").read_text())
+        data["messages"] += original[:10]
+        (tmp_path / "c.json").write_text(json.dumps(data))
+        await compactor.compact("c")
+        assert stored_messages(tmp_path, "c", 0, 20) == original[:10] + original[10:20]
+
+    @pytest.mark.parametrize("new_count", [1, 25])
+    @pytest.mark.asyncio
+    async def test_chat_recreated_while_summarizing_is_left_alone(self, tmp_path, new_count):
+        class RecreatingSummarizer(FakeSummarizer):
+            async def summarize(self, messages):
+                (tmp_path / "c.json").write_text(json.dumps({"messages": replacement}))
+                return await super().summarize(messages)
+
+        write_chat(tmp_path, "c", 30)
+        replacement = [{"role": "user", "content": f"New chat {i}"} for i in range(new_count)]
+        compactor = HistoryCompactor(tmp_path, RecreatingSummarizer(), extract_entities, window=10, segment_size=10)
+        assert await compactor.compact("c") == 0
+        assert json.loads((tmp_path / "c.json").read_text()) == {"messages": replacement}
+        assert stored_messages(tmp_path, "c") == replacement
+
+    @pytest.mark.asyncio
+    async def test_select_prefers_overlapping_segments(self, tmp_path, compactor):
+        write_chat(tmp_path, "long", 60)
+        await compactor.compact("long")
+        summaries = json.loads((tmp_path / "long.json").read_text())["summaries"]
+        selected = compactor.select(summaries, "Back to Redis please", k=2)
+        assert [s.start for s in selected] == [10, 40]  # the Redis segment, then the most recent
+
+    @pytest.mark.asyncio
+    async def test_schedule_runs_once_per_chat(self, tmp_path, compactor):
+        write_chat(tmp_path, "long", 40)
+        first, second = compactor.schedule("long"), compactor.schedule("long")
+        assert first is second
+        assert await first == 3
+
+    @pytest.mark.asyncio
+    async def test_bm25_hits_resolve_compacted_messages(self, tmp_path, compactor):
+        original = write_chat(tmp_path, "long", 40)
+        store = IndexStore(tmp_path)
+        for i, message in enumerate(original):
+            store.add("u1", "long", i, message["content"])
+        await compactor.compact("long")
+        hits = store.search("u1", "Message 3", k=1)
+        assert (hits[0].message, hits[0].content) == (3, original[3]["content"])
+
+
+class TestSummarizers:
+    @pytest.mark.asyncio
+    async def test_extractive_keeps_sentences_with_frequent_entities(self):
+        messages = [
+            {"role": "user", "content": "We use Postgres for orders. The weather is nice."},
+            {"role": "assistant", "content": "Postgres needs an index on customer_id. Sure."},
+        ]
+        summary = await ExtractiveSummarizer(extract_entities, max_sentences=2).summarize(messages)
+        assert summary == "user: We use Postgres for orders. assistant: Postgres needs an index on customer_id."
+
+    @pytest.mark.asyncio
+    async def test_llm_summarizer_falls_back_without_client(self):
+        fake = FakeSummarizer()
+        summarizer = LLMSummarizer(lambda: None, "small", fallback=fake)
+        assert await summarizer.summarize([{"role": "user", "content": "hi"}]) == "1 messages starting with 'hi'"
+
+    @pytest.mark.asyncio
+    async def test_llm_summarizer_uses_upstream_stream(self):
+        class Client:
+            async def stream_text(self, **kwargs):
+                self.kwargs = kwargs
+                for text in ["Discussed ", "Postgres."]:
+                    yield text
+
+        client = Client()
+        summarizer = LLMSummarizer(lambda: client, "small", fallback=FakeSummarizer())
+        assert await summarizer.summarize([{"role": "user", "content": "Postgres?"}]) == "Discussed Postgres."
+        assert client.kwargs["model"] == "small"
+        assert "user: Postgres?" in client.kwargs["messages"][1]["content"]
+
+    @pytest.mark.asyncio
+    async def test_llm_summarizer_waits_for_a_scheduler_slot(self):
+        class Client:
+            async def stream_text(self, **kwargs):
+                yield "Summary."
+
+        scheduler = FairScheduler(max_concurrency=1, max_queue_per_user=1)
+        summarizer = LLMSummarizer(lambda: Client(), "small", fallback=FakeSummarizer(), scheduler=scheduler)
+        async with scheduler.admit("alice"):
+            task = asyncio.create_task(summarizer.summarize([{"role": "user", "content": "hi"}]))
+            await asyncio.sleep(0.01)
+            assert not task.done()
+            assert scheduler.metrics()["queued"] == 1
+            # The system user's queue is full, so a second summary falls back to the local summarizer
+            assert await summarizer.summarize([{"role": "user", "content": "hi"}]) == "1 messages starting with 'hi'"
+        assert await task == "Summary."
+        assert scheduler.metrics()["active"] == 0
+
+    def test_summarizer_is_abstract(self):
+        with pytest.raises(TypeError):
+            Summarizer()
+
+
+def test_get_chat_returns_compacted_messages(monkeypatch, tmp_path):
+    from fastapi.testclient import TestClient
+    import asyncio
+    import endpoints
+    import main
+
+    original = write_chat(tmp_path, "long", 30)
+    asyncio.run(HistoryCompactor(tmp_path, FakeSummarizer(), extract_entities, 10, 10).compact("long"))
+    monkeypatch.setattr(endpoints, "CHATS_DIR", tmp_path)
+
+    client = TestClient(main.app)
+    data = client.get("/get_chat", params={"chat": "long"}).json()
+    assert data["messages"] == original
+    assert len(data["summaries"]) == 2
+    assert client.get("/get_chat", params={"chat": "long", "start": 5, "end": 7}).json()["messages"] == original[5:7]
@@ -0,0 +1,108 @@
+import pytest
+import asyncio
+import socket
+import time
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_openai_server import FakeOpenAIServer
+from llm_client import FailoverClient
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+def unused_url():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return f"http://127.0.0.1:{s.getsockname()[1]}/v1"
+
+
+async def complete(client):
+    return "".join([text async for text in client.stream_text(messages=MESSAGES, model="fake")])
+
+
+@pytest.fixture
+def servers():
+    a = FakeOpenAIServer(tokens=["from", " A"]).start()
+    b = FakeOpenAIServer(tokens=["from", " B"]).start()
+    yield a, b
+    a.stop()
+    b.stop()
+
+
+class TestFailoverClient:
+    @pytest.mark.asyncio
+    async def test_streams_from_primary(self, servers):
+        a, b = servers
+        client = FailoverClient.from_urls([a.url, b.url], "test")
+        assert await complete(client) == "from A"
+        assert len(a.requests) == 1
+        assert b.requests == []
+
+    @pytest.mark.asyncio
+    async def test_fails_over_on_server_error(self, servers):
+        broken, healthy = servers
+        broken.fail_status = 503
+        client = FailoverClient.from_urls([broken.url, healthy.url], "test", backoff=0.01)
+        assert await complete(client) == "from B"
+        assert client.retries == 1
+        assert client.endpoints[0].consecutive_failures == 1
+
+    @pytest.mark.asyncio
+    async def test_fails_over_on_connection_error(self, servers):
+        _, healthy = servers
+        client = FailoverClient.from_urls([unused_url(), healthy.url], "test", backoff=0.01)
+        assert await complete(client) == "from B"
+
+    @pytest.mark.asyncio
+    async def test_client_errors_are_not_retried(self, servers):
+        broken, healthy = servers
+        broken.fail_status = 400
+        client = FailoverClient.from_urls([broken.url, healthy.url], "test", backoff=0.01)
+        with pytest.raises(Exception):
+            await complete(client)
+        assert healthy.requests == []
+
+    @pytest.mark.asyncio
+    async def test_gives_up_after_retries(self, servers):
+        a, b = servers
+        a.fail_status = b.fail_status = 500
+        client = FailoverClient.from_urls([a.url, b.url], "test", max_retries=2, backoff=0.01)
+        with pytest.raises(Exception):
+            await complete(client)
+        assert len(a.requests) + len(b.requests) == 3
+
+    @pytest.mark.asyncio
+    async def test_unhealthy_endpoint_is_skipped(self, servers):
+        broken, healthy = servers
+        broken.fail_status = 500
+        client = FailoverClient.from_urls([broken.url, healthy.url], "test", backoff=0.01, failure_threshold=1)
+        await complete(client)
+        await complete(client)
+        assert len(broken.requests) == 1
+        assert client.health()["endpoints"][0]["down"]
+
+    @pytest.mark.asyncio
+    async def test_hedge_beats_slow_primary(self, servers):
+        slow, fast = servers
+        slow.latency = 0.6  # injected time to first byte on the primary
+        client = FailoverClient.from_urls([slow.url, fast.url], "test", hedge=True, hedge_min_samples=5)
+        for _ in range(5):
+            client.ttft_ms.record(20.0)  # typical time to first token
+        started = time.perf_counter()
+        assert await complete(client) == "from B"
+        assert time.perf_counter() - started < 0.5
+        assert client.hedges == 1
+        assert client.hedge_wins == 1
+        assert len(slow.requests) == 1
+
+    @pytest.mark.asyncio
+    async def test_no_hedge_without_enough_samples(self, servers):
+        slow, fast = servers
+        slow.latency = 0.2
+        client = FailoverClient.from_urls([slow.url, fast.url], "test", hedge=True)
+        assert await complete(client) == "from A"
+        assert client.hedges == 0
+        assert fast.requests == []
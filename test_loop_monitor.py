@@ -0,0 +1,90 @@
+import pytest
+import asyncio
+import threading
+import time
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from loop_monitor import LoopLagMonitor
+from io_executor import run_io, read_json, write_json, list_files, io_executor
+
+
+def blocking_call_site():
+    time.sleep(0.3)
+
+
+class TestLoopLagMonitor:
+    @pytest.mark.asyncio
+    async def test_reports_blocking_call_site(self):
+        monitor = LoopLagMonitor(interval=0.01, threshold=0.05)
+        monitor.start()
+        await asyncio.sleep(0.05)
+        blocking_call_site()
+        await asyncio.sleep(0.05)
+        await monitor.stop()
+        stats = monitor.stats()
+        assert stats["stalls"] == 1
+        assert "blocking_call_site" in stats["recent_stalls"][0]["stack"]
+        assert stats["lag_ms"]["max"] >= 250
+
+    @pytest.mark.asyncio
+    async def test_quiet_loop_has_no_stalls(self):
+        monitor = LoopLagMonitor(interval=0.01, threshold=0.1)
+        monitor.start()
+        await asyncio.sleep(0.1)
+        await monitor.stop()
+        assert monitor.stats()["stalls"] == 0
+        assert monitor.lag_ms.count > 0
+
+
+class TestIOExecutor:
+    @pytest.mark.asyncio
+    async def test_io_runs_off_the_event_loop(self):
+        loop_thread = threading.get_ident()
+        io_thread = await run_io(threading.get_ident)
+        assert io_thread != loop_thread
+
+    @pytest.mark.asyncio
+    async def test_json_round_trip(self, tmp_path):
+        path = tmp_path / "nested" / "chat.json"
+        assert await read_json(path) is None
+        await write_json(path, {"messages": [{"role": "user", "content": "hi"}]})
+        assert await read_json(path) == {"messages": [{"role": "user", "content": "hi"}]}
+        assert [f.name for f in await list_files(tmp_path / "nested", "*.json")] == ["chat.json"]
+        assert await list_files(tmp_path / "missing", "*.json") == []
+
+    @pytest.mark.asyncio
+    async def test_executor_is_bounded(self):
+        active = 0
+        peak = 0
+        lock = threading.Lock()
+
+        def work():
+            nonlocal active, peak
+            with lock:
+                active += 1
+                peak = max(peak, active)
+            time.sleep(0.02)
+            with lock:
+                active -= 1
+
+        await asyncio.gather(*[run_io(work) for _ in range(20)])
+        assert peak <= io_executor._max_workers
+
+    @pytest.mark.asyncio
+    async def test_concurrent_reads_never_see_a_partial_write(self, tmp_path):
+        path = tmp_path / "profile.json"
+        await write_json(path, {"history": list(range(20000))})
+
+        async def writer():
+            for i in range(30):
+                await write_json(path, {"history": list(range(20000 + i))})
+
+        async def reader():
+            for _ in range(30):
+                assert len((await read_json(path))["history"]) >= 20000
+
+        await asyncio.gather(writer(), reader(), reader())
+        assert [f.name for f in await list_files(tmp_path, "*")] == ["profile.json"]
@@ -1,28 +1,53 @@
+import tempfile
 import unittest
+from pathlib import Path
 from fastapi.testclient import TestClient
+import endpoints
+import utils
+from bm25_index import IndexStore
 from main import app
 
 class TestMain(unittest.TestCase):
     def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        chats_dir = Path(self.tmp.name)
+        self.patched = {
+            (endpoints, "CHATS_DIR"): chats_dir,
+            (utils, "CHATS_DIR"): chats_dir,
+            (utils, "memory_index"): IndexStore(chats_dir),
+            (endpoints, "get_client"): lambda: None,
+        }
+        self.saved = {key: getattr(*key) for key in self.patched}
+        for (module, name), value in self.patched.items():
+            setattr(module, name, value)
         self.client = TestClient(app)
 
+    def tearDown(self):
+        for (module, name), value in self.saved.items():
+            setattr(module, name, value)
+        self.tmp.cleanup()
+
     def test_root(self):
         response = self.client.get('/')
         self.assertEqual(response.status_code, 200)
         self.assertIn('text/html', response.headers.get('content-type', ''))
 
-    def test_create_project_and_list(self):
-        response = self.client.post('/create_project', data={'name': 'unittest_project'})
-        self.assertEqual(response.status_code, 200)
-        response = self.client.get('/list_projects')
-        self.assertIn('unittest_project', response.json().get('projects', []))
-
     def test_create_chat_and_list(self):
-        self.client.post('/create_project', data={'name': 'unittest_project2'})
-        response = self.client.post('/create_chat', data={'project': 'unittest_project2', 'chat_name': 'chat1'})
+        response = self.client.post('/create_chat', data={'chat_name': 'chat1'})
         self.assertEqual(response.status_code, 200)
-        response = self.client.get('/list_chats', params={'project': 'unittest_project2'})
+        self.assertEqual(response.json(), {'status': 'ok', 'chat': 'chat1'})
+        response = self.client.get('/list_chats')
         self.assertIn('chat1', response.json().get('chats', []))
+        response = self.client.get('/get_chat', params={'chat': 'chat1'})
+        self.assertEqual(response.json()['messages'], [])
+
+    def test_chat_is_stored(self):
+        self.client.post('/create_chat', data={'chat_name': 'chat2'})
+        response = self.client.post('/chat', json={'message': 'Explain Python decorators', 'chat': 'chat2'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('development mode', response.text)
+        messages = self.client.get('/get_chat', params={'chat': 'chat2'}).json()['messages']
+        self.assertEqual([m['role'] for m in messages], ['user'])
 
     def test_upload_image(self):
         img_bytes = b'\x89PNG\r\n\x1a\n' + b'0' * 100
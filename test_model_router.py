@@ -0,0 +1,75 @@
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from model_router import ModelRouter, estimate_tokens, load_routing_log, summarize_routing_log
+from conversation_models import IntentClarity
+
+
+def clarity(score):
+    return IntentClarity(message="", clarity_score=score, ambiguous_elements=[],
+                         suggested_clarifications=[], confidence=0.9)
+
+
+class TestModelRouter:
+    @pytest.fixture
+    def router(self, tmp_path):
+        return ModelRouter(small_model="small", large_model="large", log_path=tmp_path / "routing.jsonl")
+
+    def test_log_defaults_to_chats_dir(self, tmp_path, monkeypatch):
+        monkeypatch.delenv("LLM_ROUTING_LOG", raising=False)
+        assert ModelRouter.from_env(tmp_path).log_path == tmp_path / "routing_log.jsonl"
+        monkeypatch.setenv("LLM_ROUTING_LOG", "")
+        assert ModelRouter.from_env(tmp_path).log_path is None
+
+    def test_large_model_is_opt_in(self, tmp_path, monkeypatch):
+        monkeypatch.delenv("LLM_LARGE_MODEL", raising=False)
+        monkeypatch.setenv("LLM_SMALL_MODEL", "small")
+        router = ModelRouter.from_env(tmp_path)
+        messages = [{"role": "assistant", "content": "x" * 20000}, {"role": "user", "content": "ok"}]
+        assert router.route("ok", clarity(1.0), None, messages).model == "small"
+        monkeypatch.setenv("LLM_LARGE_MODEL", "large")
+        assert ModelRouter.from_env(tmp_path).route("ok", clarity(1.0), None, messages).model == "large"
+
+    def test_short_clear_turn_goes_to_small_model(self, router):
+        messages = [{"role": "user", "content": [{"type": "text", "text": "What time zone is Paris in?"}]}]
+        decision = router.route("What time zone is Paris in?", clarity(0.9), {"technical_depth": 0.0}, messages)
+        assert decision.model == "small"
+        assert decision.tier == "small"
+
+    def test_long_technical_turn_goes_to_large_model(self, router):
+        message = "Explain how the database query planner chooses a join algorithm for this API " * 12
+        messages = [{"role": "user", "content": message}]
+        decision = router.route(message, clarity(0.8), {"technical_depth": 0.9}, messages)
+        assert decision.model == "large"
+        assert decision.complexity >= router.complexity_threshold
+
+    def test_large_prompt_goes_to_large_model(self, router):
+        messages = [{"role": "assistant", "content": "x" * 20000}, {"role": "user", "content": "ok"}]
+        decision = router.route("ok", clarity(1.0), None, messages)
+        assert decision.model == "large"
+        assert decision.prompt_tokens > router.max_small_prompt_tokens
+
+    def test_image_goes_to_large_model(self, router):
+        messages = [{"role": "user", "content": [
+            {"type": "text", "text": "hi"},
+            {"type": "image_url", "image_url": {"url": "data:image/png;base64,AAAA"}},
+        ]}]
+        assert router.route("hi", clarity(1.0), None, messages).reasons == ["image input"]
+
+    def test_estimate_tokens(self):
+        assert estimate_tokens([{"role": "user", "content": "a" * 400}]) == 104
+
+    def test_decisions_are_logged_for_offline_analysis(self, router):
+        messages = [{"role": "user", "content": "hi"}]
+        decision = router.route("hi", clarity(1.0), None, messages)
+        router.record(decision, chat="c", ttft_ms=120.0, total_ms=900.0)
+        router.record(decision, chat="c", ttft_ms=80.0, total_ms=700.0)
+        entries = load_routing_log(router.log_path)
+        assert len(entries) == 2
+        assert entries[0]["model"] == "small"
+        summary = summarize_routing_log(entries)
+        assert summary["small"]["requests"] == 2
+        assert summary["small"]["ttft_p50_ms"] == 100.0
@@ -0,0 +1,154 @@
+import pytest
+import random
+import threading
+import sys
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from context_manager import ContextManager
+from conversation_models import ConversationState, EnhancedMessage
+from relevance_scorer import RelevanceScorer, top_k, epoch_us
+
+WORDS = ["Python", "FastAPI", "database", "Redis Cache", "main.py", "42", "3.14", "schema", "hello", "Docker"]
+
+
+def reference_scores(manager, state, current_message, history, now):
+    """The original per-message loop from ContextManager.get_relevant_context."""
+    scored = []
+    for msg in history:
+        time_diff = (now - msg.timestamp).total_seconds() / 3600
+        recency_score = max(0, 1 - (time_diff / 24))
+        importance_score = state.importance_scores.get(msg.message_id, 0.5)
+        relevance_score = manager._calculate_relevance(current_message, str(msg.content))
+        scored.append((msg, recency_score * 0.3 + importance_score * 0.4 + relevance_score * 0.3))
+    return scored
+
+
+def random_history(rng, n, now):
+    history = []
+    for i in range(n):
+        words = rng.sample(WORDS, rng.randint(0, 4))
+        history.append(EnhancedMessage(
+            role="user" if i % 2 == 0 else "assistant",
+            content=" ".join(words) if words else "ok",
+            timestamp=now - timedelta(minutes=rng.randint(0, 60 * 30)),
+            message_id=f"m{i}",
+        ))
+    return history
+
+
+@pytest.fixture
+def state():
+    return ConversationState(
+        chat_id="c", user_id="u", topic_summary="", key_entities=[], conversation_stage="developing",
+        last_updated=datetime.now(), importance_scores={f"m{i}": round(0.1 * (i % 10), 1) for i in range(0, 40, 3)},
+    )
+
+
+class TestRelevanceScorer:
+    @pytest.mark.parametrize("seed", range(5))
+    def test_matches_original_scores(self, state, seed):
+        rng = random.Random(seed)
+        manager = ContextManager()
+        now = datetime.now()
+        history = random_history(rng, 20, now)
+        current = " ".join(rng.sample(WORDS, 3))
+
+        expected = reference_scores(manager, state, current, history, now)
+        scores = manager.scorer.score(
+            current,
+            [str(m.content) for m in history],
+            timestamps=[m.timestamp for m in history],
+            importance=[state.importance_scores.get(m.message_id, 0.5) for m in history],
+            now=now,
+        )
+        assert scores.tolist() == [score for _, score in expected]
+
+        expected.sort(key=lambda x: x[1], reverse=True)
+        assert [history[i] for i in top_k(scores, 10)] == [msg for msg, _ in expected[:10]]
+
+    def test_overlap_matches_jaccard(self):
+        manager = ContextManager()
+        texts = ["Let's work on the database schema together", "", "Python and Docker", "nothing here"]
+        current = "I need help with Python"
+        expected = [manager._calculate_relevance(current, t) for t in texts]
+        assert manager.scorer.overlap_scores(current, texts).tolist() == expected
+        # Neither side has entities
+        assert manager.scorer.overlap_scores("nothing", ["at all"]).tolist() == [0.1]
+
+    def test_epoch_us_is_exact(self):
+        from datetime import timezone
+        naive = [datetime(2024, 1, 1, 0, 0, 0, 1), datetime(1970, 1, 1)]
+        assert epoch_us(naive).tolist() == [1704067200000001, 0]
+        aware = [datetime(1970, 1, 1, 0, 0, 1, tzinfo=timezone.utc)]
+        assert epoch_us(aware).tolist() == [1000000]
+        assert epoch_us(np.array(naive, dtype="datetime64[us]")).tolist() == [1704067200000001, 0]
+
+    def test_cached_history_only_extracts_new_messages(self):
+        calls = []
+        manager = ContextManager()
+        extract = manager._extract_entities
+        manager.scorer._extract_entities = lambda text: calls.append(text) or extract(text)
+        texts = [f"Topic{i} notes" for i in range(5)]
+        manager.scorer.score("Topic3", texts, key="chat")
+        calls.clear()
+        manager.scorer.score("Topic3", texts + ["Topic5 notes"], key="chat")
+        assert calls == ["Topic5 notes"]
+
+    def test_vocabulary_is_bounded(self):
+        scorer = RelevanceScorer(str.split, max_vocab=50)
+        fresh = RelevanceScorer(str.split)
+        for turn in range(20):
+            texts = [f"w{turn}_{i} shared" for i in range(10)]
+            scores = scorer.score("shared w3_1", texts, key=f"chat{turn}")
+            assert len(scorer._vocab) <= 50 + 12
+            assert scores.tolist() == fresh.score("shared w3_1", texts).tolist()
+        assert len(scorer._histories) < 20
+
+    def test_top_k_breaks_ties_in_history_order(self):
+        scores = np.array([0.5, 0.9, 0.5, 0.5, 0.1, 0.9])
+        assert top_k(scores, 4).tolist() == [1, 5, 0, 2]
+        assert top_k(scores, 10).tolist() == [1, 5, 0, 2, 3, 4]
+        assert top_k(np.zeros(0), 3).tolist() == []
+
+    @pytest.mark.asyncio
+    async def test_scores_whole_history(self, state):
+        manager = ContextManager()
+        now = datetime.now()
+        history = [
+            EnhancedMessage(role="user", content="Kubernetes deployment notes", timestamp=now, message_id="old"),
+        ] + [
+            EnhancedMessage(role="user", content="small talk", timestamp=now, message_id=f"x{i}") for i in range(50)
+        ]
+        relevant = await manager.get_relevant_context(state, "More about Kubernetes", history)
+        assert relevant[0].message_id == "old"
+
+    @pytest.mark.asyncio
+    async def test_select_relevant_on_texts(self, state):
+        manager = ContextManager()
+        texts = ["small talk"] * 30 + ["Redis Cache eviction"] + ["small talk"] * 30
+        assert (await manager.select_relevant(state, "Tune the Redis Cache", texts))[0] == 30
+
+    @pytest.mark.asyncio
+    async def test_scoring_runs_off_the_event_loop(self, state):
+        manager = ContextManager()
+        score, threads = manager.scorer.score, []
+        manager.scorer.score = lambda *args, **kwargs: threads.append(threading.current_thread()) or score(*args, **kwargs)
+        await manager.select_relevant(state, "Tune the Redis Cache", ["Redis Cache eviction"])
+        await manager.get_relevant_context(state, "More about Kubernetes", random_history(random.Random(0), 5, datetime.now()))
+        assert len(threads) == 2
+        assert threading.main_thread() not in threads
+        # CPU-bound scoring must not take the disk I/O pool's workers or queue slots
+        assert not any(thread.name.startswith("io") for thread in threads)
+
+    @pytest.mark.asyncio
+    async def test_window_limits_candidates(self, state):
+        manager = ContextManager(max_context_messages=5)
+        texts = ["Redis Cache eviction"] + ["small talk"] * 10
+        selected = await manager.select_relevant(state, "Tune the Redis Cache", texts)
+        assert 0 not in selected
+        assert min(selected) == 6
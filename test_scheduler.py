@@ -0,0 +1,174 @@
+import pytest
+import asyncio
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from scheduler import FairScheduler, SchedulerFull
+
+
+async def run_job(scheduler, user, order, hold=0.01):
+    ticket = scheduler.admit(user)
+    async with ticket:
+        order.append(user)
+        await asyncio.sleep(hold)
+
+
+class TestFairScheduler:
+    @pytest.mark.asyncio
+    async def test_concurrency_cap(self):
+        scheduler = FairScheduler(max_concurrency=2)
+        peak = 0
+
+        async def job():
+            nonlocal peak
+            async with scheduler.admit("u"):
+                peak = max(peak, scheduler.active)
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(*[job() for _ in range(6)])
+        assert peak == 2
+        assert scheduler.active == 0
+        assert scheduler.queued == 0
+
+    @pytest.mark.asyncio
+    async def test_light_user_not_starved_by_heavy_user(self):
+        scheduler = FairScheduler(max_concurrency=1, max_queue_per_user=10)
+        order = []
+        heavy = [asyncio.create_task(run_job(scheduler, "heavy", order)) for _ in range(6)]
+        await asyncio.sleep(0)  # heavy user's requests are queued first
+        light = asyncio.create_task(run_job(scheduler, "light", order))
+        await asyncio.gather(*heavy, light)
+        # The light user is interleaved instead of waiting behind all six heavy requests
+        assert order.index("light") <= 2
+
+    @pytest.mark.asyncio
+    async def test_weights_share_slots_proportionally(self):
+        scheduler = FairScheduler(max_concurrency=1, max_queue_per_user=10, weights={"gold": 2.0})
+        order = []
+        jobs = [run_job(scheduler, user, order, hold=0) for user in ["gold"] * 6 + ["basic"] * 6]
+        await asyncio.gather(*jobs)
+        assert order[:6].count("gold") == 4
+
+    def test_per_user_queue_bound_rejects_fast(self):
+        scheduler = FairScheduler(max_queue_per_user=2)
+        scheduler.admit("u")
+        scheduler.admit("u")
+        with pytest.raises(SchedulerFull):
+            scheduler.admit("u")
+        scheduler.admit("other")
+        assert scheduler.rejected == 1
+
+    def test_global_queue_bound_rejects_fast(self):
+        scheduler = FairScheduler(max_queue=2)
+        scheduler.admit("a")
+        scheduler.admit("b")
+        with pytest.raises(SchedulerFull):
+            scheduler.admit("c")
+
+    @pytest.mark.asyncio
+    async def test_cancelled_reservation_frees_queue_space(self):
+        scheduler = FairScheduler(max_queue_per_user=1)
+        ticket = scheduler.admit("u")
+        ticket.cancel()
+        async with scheduler.admit("u"):
+            assert scheduler.active == 1
+        assert scheduler.metrics()["queued"] == 0
+
+    @pytest.mark.asyncio
+    async def test_cancelled_waiter_leaves_queue(self):
+        scheduler = FairScheduler(max_concurrency=1)
+        holder = scheduler.admit("a")
+        await holder.__aenter__()
+        waiter = asyncio.create_task(run_job(scheduler, "b", []))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        await holder.__aexit__(None, None, None)
+        assert scheduler.active == 0
+        assert scheduler.queued == 0
+
+    @pytest.mark.asyncio
+    async def test_queue_wait_metrics(self):
+        scheduler = FairScheduler(max_concurrency=1)
+        await asyncio.gather(*[run_job(scheduler, "u", [], hold=0.02) for _ in range(3)])
+        wait = scheduler.metrics()["queue_wait_ms"]
+        assert wait["count"] == 3
+        assert wait["max"] >= 30
+
+
+def test_chat_endpoint_returns_429_when_queue_full(monkeypatch):
+    from fastapi.testclient import TestClient
+    import endpoints
+    from main import app
+
+    monkeypatch.setattr(endpoints, "llm_scheduler", FairScheduler(max_queue_per_user=0))
+    response = TestClient(app).post("/chat", json={"message": "hello", "user": "busy"})
+    assert response.status_code == 429
+    assert response.headers["retry-after"] == "1"
+
+
+@pytest.mark.asyncio
+async def test_follower_completes_when_leader_leaves_while_queued(monkeypatch, tmp_path):
+    import endpoints
+    from model_router import ModelRouter
+    from models import ChatRequest
+    from singleflight import SingleFlight
+
+    class Client:
+        calls = 0
+
+        async def stream_text(self, **kwargs):
+            Client.calls += 1
+            for text in ["shared ", "answer"]:
+                yield text
+
+    client = Client()
+    scheduler = FairScheduler(max_concurrency=1)
+    monkeypatch.setattr(endpoints, "CHATS_DIR", tmp_path)
+    monkeypatch.setattr(endpoints, "get_client", lambda: client)
+    monkeypatch.setattr(endpoints, "model_router", ModelRouter())
+    monkeypatch.setattr(endpoints, "llm_flight", SingleFlight())
+    monkeypatch.setattr(endpoints.context_manager, "memory", None)
+    request = ChatRequest(message="Explain Python decorators with a short example")
+
+    async def turn(user):
+        return "".join([payload async for kind, payload in endpoints.run_chat_turn(request, scheduler.admit(user))
+                        if kind == "text"])
+
+    holder = scheduler.admit("other")
+    await holder.__aenter__()
+    leader = asyncio.create_task(turn("ann"))
+    await asyncio.sleep(0.1)
+    follower = asyncio.create_task(turn("bob"))
+    await asyncio.sleep(0.1)
+    # Only the shared completion waits for a slot; the follower gave its reservation back
+    assert scheduler.metrics()["queued"] == 1
+    leader.cancel()
+    await asyncio.sleep(0.01)
+    await holder.__aexit__(None, None, None)
+    assert (await asyncio.wait_for(follower, 2)).startswith("shared answer")
+    assert Client.calls == 1
+    assert (scheduler.active, scheduler.queued) == (0, 0)
+
+
+@pytest.mark.asyncio
+async def test_dropping_a_ticket_twice_keeps_counts():
+    scheduler = FairScheduler(max_concurrency=1)
+    holder = scheduler.admit("a")
+    await holder.__aenter__()
+    ticket = scheduler.admit("b")
+    waiter = asyncio.create_task(ticket.__aenter__())
+    await asyncio.sleep(0)
+    ticket.cancel()  # queued: left to the waiting task
+    assert scheduler.queued == 1
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    ticket.cancel()
+    scheduler._drop(ticket)
+    assert scheduler.queued == 0
+    await holder.__aexit__(None, None, None)
+    assert scheduler.metrics()["queued"] == 0
@@ -0,0 +1,71 @@
+import pytest
+import json
+import sys
+import os
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import serialization
+from serialization import dumps, loads, dump_model, load_model, message_views, content_text
+from conversation_models import ConversationState, UserProfile
+
+
+@pytest.fixture
+def state():
+    return ConversationState(
+        chat_id="c1", user_id="u1", topic_summary="Discussion about: Python",
+        key_entities=["Python"], conversation_stage="developing",
+        last_updated=datetime(2024, 5, 1, 12, 30), importance_scores={"m1": 0.8},
+    )
+
+
+class TestSerialization:
+    def test_model_round_trip(self, state):
+        assert load_model(ConversationState, dump_model(state)) == state
+
+    def test_reads_files_written_with_legacy_json(self, state):
+        legacy = json.dumps(state.model_dump(), default=str)
+        assert load_model(ConversationState, legacy) == state
+
+    def test_profile_round_trip(self):
+        profile = UserProfile(
+            user_id="u1", communication_style={"formality": 0.4}, preferred_response_length="brief",
+            topic_preferences={}, clarification_frequency=0.0, last_updated=datetime(2024, 5, 1),
+        )
+        assert load_model(UserProfile, dump_model(profile)) == profile
+
+    @pytest.mark.parametrize("backend", ["default", "stdlib"])
+    def test_plain_json_round_trip(self, monkeypatch, backend):
+        if backend == "stdlib":
+            monkeypatch.setattr(serialization, "_orjson", None)
+        data = {"messages": [{"role": "user", "content": "héllo", "tool": None}]}
+        assert isinstance(dumps(data), bytes)
+        assert loads(dumps(data)) == data
+
+    def test_content_text(self):
+        assert content_text("plain") == "plain"
+        assert content_text([{"type": "text", "text": "look"}, {"type": "image_url", "image_url": {"url": "x"}}]) == "look"
+        assert content_text(None) == ""
+
+
+class TestMessageViews:
+    def test_views_keep_stored_roles(self):
+        views = message_views({"messages": [
+            {"role": "user", "content": [{"type": "text", "text": "hi"}]},
+            {"role": "tool", "content": "result", "tool": "ddgs"},
+            {"role": "assistant", "content": "hello"},
+        ]})
+        assert [(v.index, v.role, v.text) for v in views] == [(0, "user", "hi"), (1, "tool", "result"), (2, "assistant", "hello")]
+        assert views[1].tool == "ddgs"
+        assert not hasattr(views[0], "__dict__")
+
+    def test_missing_chat_has_no_views(self):
+        assert message_views(None) == []
+
+    def test_views_hydrate_to_enhanced_messages(self):
+        view = message_views({"messages": [{"role": "assistant", "content": "hello"}]})[0]
+        message = view.to_enhanced(importance_score=0.7)
+        assert message.role == "assistant"
+        assert message.content == "hello"
+        assert message.importance_score == 0.7
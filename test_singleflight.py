@@ -0,0 +1,121 @@
+import pytest
+import asyncio
+import threading
+import time
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from singleflight import SingleFlight, canonical_key
+
+
+class FakeUpstream:
+    """Streams a fixed list of chunks, pausing between them, and counts calls."""
+
+    def __init__(self, chunks, delay=0.01, fail_after=None):
+        self.chunks = chunks
+        self.delay = delay
+        self.fail_after = fail_after
+        self.calls = 0
+
+    async def stream(self):
+        self.calls += 1
+        for i, chunk in enumerate(self.chunks):
+            if self.fail_after is not None and i == self.fail_after:
+                raise RuntimeError("upstream exploded")
+            await asyncio.sleep(self.delay)
+            yield chunk
+
+
+async def collect(flight, key, factory):
+    return [chunk async for chunk in flight.stream(key, factory)]
+
+
+class TestSingleFlight:
+    def test_canonical_key_ignores_field_order(self):
+        a = canonical_key("chat", model="m", messages=[{"role": "user", "content": "hi"}])
+        b = canonical_key("chat", messages=[{"content": "hi", "role": "user"}], model="m")
+        assert a == b
+        assert a != canonical_key("chat", model="m", messages=[])
+
+    @pytest.mark.asyncio
+    async def test_concurrent_identical_streams_share_one_call(self):
+        flight = SingleFlight()
+        upstream = FakeUpstream(["a", "b", "c"])
+        results = await asyncio.gather(*[collect(flight, "k", upstream.stream) for _ in range(5)])
+        assert upstream.calls == 1
+        assert all(r == ["a", "b", "c"] for r in results)
+        assert flight.stats == {"leaders": 1, "followers": 4}
+        assert not flight.in_flight("k")
+
+    @pytest.mark.asyncio
+    async def test_late_joiner_replays_earlier_chunks(self):
+        flight = SingleFlight()
+        upstream = FakeUpstream(["a", "b", "c", "d"], delay=0.02)
+        first = asyncio.create_task(collect(flight, "k", upstream.stream))
+        await asyncio.sleep(0.05)  # leader is part way through the stream
+        late = await collect(flight, "k", upstream.stream)
+        assert await first == ["a", "b", "c", "d"]
+        assert late == ["a", "b", "c", "d"]
+        assert upstream.calls == 1
+
+    @pytest.mark.asyncio
+    async def test_finished_flight_is_not_reused(self):
+        flight = SingleFlight()
+        upstream = FakeUpstream(["a"])
+        await collect(flight, "k", upstream.stream)
+        await collect(flight, "k", upstream.stream)
+        assert upstream.calls == 2
+
+    @pytest.mark.asyncio
+    async def test_error_reaches_every_subscriber(self):
+        flight = SingleFlight()
+        upstream = FakeUpstream(["a", "b", "c"], fail_after=2)
+        results = await asyncio.gather(
+            *[collect(flight, "k", upstream.stream) for _ in range(3)], return_exceptions=True
+        )
+        assert upstream.calls == 1
+        assert all(isinstance(r, RuntimeError) for r in results)
+        # A failed flight is dropped so the next request retries upstream
+        retry = FakeUpstream(["ok"])
+        assert await collect(flight, "k", retry.stream) == ["ok"]
+
+    @pytest.mark.asyncio
+    async def test_upstream_cancelled_when_all_subscribers_leave(self):
+        flight = SingleFlight()
+        upstream = FakeUpstream(["a", "b", "c", "d"], delay=0.05)
+        agen = flight.stream("k", upstream.stream)
+        assert await agen.__anext__() == "a"
+        await agen.aclose()
+        await asyncio.sleep(0.01)
+        assert not flight.in_flight("k")
+
+    @pytest.mark.asyncio
+    async def test_request_after_cancel_starts_fresh_flight(self):
+        flight = SingleFlight()
+        upstream = FakeUpstream(["a", "b", "c"], delay=0.05)
+        agen = flight.stream("k", upstream.stream)
+        assert await agen.__anext__() == "a"
+        await agen.aclose()
+        # No yield to the loop: the cancelled pump has not run its cleanup yet
+        assert not flight.in_flight("k")
+        assert await collect(flight, "k", upstream.stream) == ["a", "b", "c"]
+        assert upstream.calls == 2
+        assert flight.stats == {"leaders": 2, "followers": 0}
+
+    @pytest.mark.asyncio
+    async def test_blocking_calls_are_coalesced(self):
+        flight = SingleFlight()
+        calls = []
+        lock = threading.Lock()
+
+        def search(query):
+            with lock:
+                calls.append(query)
+            time.sleep(0.05)
+            return f"results for {query}"
+
+        results = await asyncio.gather(*[flight.call("q", search, "python") for _ in range(4)])
+        assert results == ["results for python"] * 4
+        assert calls == ["python"]
@@ -0,0 +1,43 @@
+import pytest
+import json
+import subprocess
+import sys
+import os
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+
+
+def run_python(code, **env):
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, env=dict(os.environ, **env),
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+class TestColdStart:
+    def test_import_does_not_load_heavy_dependencies(self):
+        loaded = run_python(
+            "import json, sys, main; print(json.dumps([m for m in ('ddgs', 'openai', 'numpy') if m in sys.modules]))",
+            LLAMA_API_KEY="test-key",
+        )
+        assert loaded == []
+
+    def test_client_is_built_on_first_use(self):
+        result = run_python(
+            "import json, sys, utils\n"
+            "before = 'openai' in sys.modules\n"
+            "client = utils.get_client()\n"
+            "print(json.dumps([before, 'openai' in sys.modules, client is utils.get_client()]))",
+            LLAMA_API_KEY="test-key",
+        )
+        assert result == [False, True, True]
+
+    @pytest.mark.asyncio
+    async def test_warmup_opens_storage(self, monkeypatch, tmp_path):
+        import endpoints
+
+        monkeypatch.setattr(endpoints, "CHATS_DIR", tmp_path / "chats")
+        await endpoints.warmup(preload_client=False)
+        assert (tmp_path / "chats").is_dir()
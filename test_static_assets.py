@@ -0,0 +1,104 @@
+import json
+import os
+import re
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from compression import negotiate
+from static_assets import IMMUTABLE, StaticAssets
+
+
+@pytest.fixture
+def client():
+    from fastapi.testclient import TestClient
+    import main
+
+    return TestClient(main.app)
+
+
+def test_negotiate_respects_preferences_and_q_values():
+    assert negotiate("gzip, deflate", ["gzip"]) == "gzip"
+    assert negotiate("gzip;q=0, deflate", ["gzip"]) is None
+    assert negotiate("*", ["gzip"]) == "gzip"
+    assert negotiate("", ["gzip"]) is None
+    assert negotiate("gzip", [None]) is None
+
+
+class TestStaticAssets:
+    def test_index_points_at_hashed_immutable_assets(self, client):
+        page = client.get("/")
+        assert page.headers["cache-control"] == "no-cache"
+        urls = re.findall(r'"(/static/[^"]+)"', page.text)
+        assert sorted(url.split(".")[0] for url in urls) == ["/static/app", "/static/style"]
+        for url in urls:
+            response = client.get(url)
+            assert response.status_code == 200
+            assert response.headers["cache-control"] == IMMUTABLE
+
+    def test_precompressed_variant_matches_source(self, client):
+        response = client.get("/static/app.js", headers={"Accept-Encoding": "gzip"})
+        assert response.headers["content-encoding"] == "gzip"
+        assert int(response.headers["content-length"]) < len(response.content)
+        with open(os.path.join("static", "app.js"), "rb") as f:
+            assert response.content == f.read()
+
+        plain = client.get("/static/app.js", headers={"Accept-Encoding": "identity"})
+        assert "content-encoding" not in plain.headers
+        assert plain.headers["etag"] != response.headers["etag"]
+
+    def test_etag_revalidation(self, client):
+        etag = client.get("/static/style.css").headers["etag"]
+        assert client.get("/static/style.css", headers={"If-None-Match": etag}).status_code == 304
+
+    def test_unused_files_are_not_served(self, client):
+        for name in ("app_backup.js", "app_new.js", "index.html"):
+            assert client.get(f"/static/{name}").status_code == 404
+
+    def test_hash_follows_content(self, tmp_path):
+        (tmp_path / "index.html").write_text('<script src="/static/app.js"></script>')
+        (tmp_path / "app.js").write_text("console.log(1);")
+        assets = StaticAssets(tmp_path, names=["app.js"])
+        first = assets.url("app.js")
+        (tmp_path / "app.js").write_text("console.log(2);")
+        assets.build()
+        assert assets.url("app.js") != first
+        assert assets.url("missing.js") == "/static/missing.js"
+
+
+class TestCompressionMiddleware:
+    def test_large_json_is_compressed(self, client, monkeypatch, tmp_path):
+        import endpoints
+
+        messages = [{"role": "user", "content": f"Message number {i} " * 5} for i in range(100)]
+        (tmp_path / "big.json").write_text(json.dumps({"messages": messages}))
+        monkeypatch.setattr(endpoints, "CHATS_DIR", tmp_path)
+
+        response = client.get("/get_chat", params={"chat": "big"}, headers={"Accept-Encoding": "gzip"})
+        assert response.headers["content-encoding"] == "gzip"
+        assert "Accept-Encoding" in response.headers["vary"]
+        assert response.json()["messages"] == messages
+
+        raw = client.get("/get_chat", params={"chat": "big"}, headers={"Accept-Encoding": "identity"})
+        assert "content-encoding" not in raw.headers
+        assert int(response.headers["content-length"]) < int(raw.headers["content-length"])
+
+    def test_small_json_is_left_alone(self, client):
+        response = client.get("/loop_lag", headers={"Accept-Encoding": "gzip"})
+        assert "content-encoding" not in response.headers
+
+    def test_streams_are_not_compressed(self, client, monkeypatch, tmp_path):
+        import endpoints
+
+        monkeypatch.setattr(endpoints, "CHATS_DIR", tmp_path)
+        monkeypatch.setattr(endpoints, "get_client", lambda: None)
+        chat = client.post("/chat", json={"message": "What is the capital of France? " * 50})
+        assert chat.headers["content-type"].startswith("text/plain")
+        assert "content-encoding" not in chat.headers
+
+        (tmp_path / "c.json").write_text(json.dumps({"messages": [{"role": "user", "content": "x" * 5000}]}))
+        export = client.get("/export", headers={"Accept-Encoding": "gzip"})
+        assert "content-encoding" not in export.headers
+        assert json.loads(export.content.splitlines()[0])
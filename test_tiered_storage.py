@@ -0,0 +1,117 @@
+import pytest
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import tiered_storage
+import utils
+from chat_export import export_records
+from compaction import HistoryCompactor, FakeSummarizer, stored_messages
+from context_manager import ContextManager
+from tiered_storage import TieringJob, chat_names, demote, promote, read_chat, tier_metrics, tier_stats
+
+
+def write_chat(chats_dir, chat, count, age_days=0):
+    messages = [{"role": "user", "content": f"Message {i} " + "padding " * 50} for i in range(count)]
+    path = chats_dir / f"{chat}.json"
+    path.write_text(json.dumps({"messages": messages}))
+    stamp = time.time() - age_days * 86400
+    os.utime(path, (stamp, stamp))
+    return messages
+
+
+class TestTiers:
+    def test_demote_and_read_transparently(self, tmp_path):
+        messages = write_chat(tmp_path, "old", 20)
+        saved = demote(tmp_path, "old")
+        assert saved > 0
+        assert not (tmp_path / "old.json").exists() and (tmp_path / "old.json.gz").exists()
+
+        cold_reads = tier_metrics.cold_read_ms.count
+        assert read_chat(tmp_path, "old") == {"messages": messages}
+        assert tier_metrics.cold_read_ms.count == cold_reads + 1
+        assert chat_names(tmp_path) == ["old"]
+
+        stats = tier_stats(tmp_path)
+        assert stats["cold_chats"] == 1 and stats["hot_chats"] == 0
+        assert stats["saved_bytes"] == saved
+
+    def test_promote_restores_chat_and_mtime(self, tmp_path):
+        messages = write_chat(tmp_path, "old", 5, age_days=40)
+        mtime = (tmp_path / "old.json").stat().st_mtime
+        demote(tmp_path, "old")
+        assert promote(tmp_path, "old") is True
+        assert json.loads((tmp_path / "old.json").read_text()) == {"messages": messages}
+        assert (tmp_path / "old.json").stat().st_mtime == pytest.approx(mtime)
+        assert promote(tmp_path, "old") is False
+
+    @pytest.mark.asyncio
+    async def test_compacted_archive_goes_cold_too(self, tmp_path):
+        messages = write_chat(tmp_path, "long", 30)
+        extract = ContextManager()._extract_entities
+        await HistoryCompactor(tmp_path, FakeSummarizer(), extract, window=10, segment_size=10).compact("long")
+        demote(tmp_path, "long")
+        assert (tmp_path / "archive" / "long.jsonl.gz").exists()
+        assert stored_messages(tmp_path, "long") == messages
+        records = [json.loads(line) for line in export_records(tmp_path)]
+        assert [r["message"] for r in records if r["type"] == "message"] == messages
+
+    @pytest.mark.parametrize("hook", ["_cold", "_open_cold"])
+    def test_read_during_promotion_finds_hot_copy(self, tmp_path, monkeypatch, hook):
+        messages = write_chat(tmp_path, "old", 5)
+        demote(tmp_path, "old")
+        original, promoted = getattr(tiered_storage, hook), []
+
+        def promote_first(path, *args):
+            # A writer promotes the chat between the reader's lookups
+            if not promoted:
+                promoted.append(True)
+                promote(tmp_path, "old")
+            return original(path, *args)
+
+        monkeypatch.setattr(tiered_storage, hook, promote_first)
+        assert read_chat(tmp_path, "old") == {"messages": messages}
+        assert promoted
+
+    def test_write_promotes_to_hot(self, tmp_path, monkeypatch):
+        write_chat(tmp_path, "old", 2)
+        demote(tmp_path, "old")
+        monkeypatch.setattr(utils, "CHATS_DIR", tmp_path)
+        utils.save_chat_message("old", {"role": "user", "content": "back again"})
+        assert not (tmp_path / "old.json.gz").exists()
+        assert json.loads((tmp_path / "old.json").read_text())["messages"][-1]["content"] == "back again"
+
+    @pytest.mark.asyncio
+    async def test_job_moves_only_idle_chats(self, tmp_path):
+        write_chat(tmp_path, "idle", 3, age_days=10)
+        write_chat(tmp_path, "active", 3)
+        (tmp_path / "idle_state.json").write_text("{}")
+        os.utime(tmp_path / "idle_state.json", (0, 0))
+
+        job = TieringJob(tmp_path, idle_days=7, codec="no-such-codec")
+        result = await job.run_once()
+        assert result["demoted"] == 1 and result["saved_bytes"] > 0
+        assert sorted(p.name for p in tmp_path.iterdir()) == ["active.json", "idle.json.gz", "idle_state.json"]
+
+
+def test_endpoints_read_cold_chats(monkeypatch, tmp_path):
+    from fastapi.testclient import TestClient
+    import endpoints
+    import main
+
+    messages = write_chat(tmp_path, "old", 4)
+    demote(tmp_path, "old")
+    write_chat(tmp_path, "new", 1)
+    monkeypatch.setattr(endpoints, "CHATS_DIR", tmp_path)
+
+    client = TestClient(main.app)
+    assert client.get("/list_chats").json() == {"chats": ["new", "old"]}
+    assert client.get("/get_chat", params={"chat": "old"}).json()["messages"] == messages
+    clarify = client.post("/clarify", json={"message": "What about Message 3?", "chat": "old"})
+    assert clarify.status_code == 200
+    stats = client.get("/storage_stats").json()
+    assert stats["tiers"]["cold_chats"] == 1 and stats["tiers"]["saved_bytes"] > 0
+    assert stats["reads"]["cold_read_ms"]["count"] >= 2
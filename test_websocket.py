@@ -0,0 +1,168 @@
+import asyncio
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bm25_index import IndexStore
+from chat_session import ChatSession
+from model_router import ModelRouter
+
+AMBIGUOUS = "do it maybe or that"
+
+
+class EchoClient:
+    """Streams back the user's message; a "slow" message waits until a "fast" one has finished."""
+
+    def __init__(self):
+        self.calls = 0
+        self._fast_done = None
+
+    async def stream_text(self, messages, **kwargs):
+        self.calls += 1
+        if self._fast_done is None:
+            self._fast_done = asyncio.Event()
+        text = messages[-1]["content"][0]["text"]
+        if text == "slow":
+            await asyncio.wait_for(self._fast_done.wait(), 5)
+        yield "echo: "
+        yield text
+        if text == "fast":
+            self._fast_done.set()
+
+
+@pytest.fixture
+def app(monkeypatch, tmp_path):
+    import endpoints
+    import utils
+    import main
+
+    store = IndexStore(tmp_path)
+    client = EchoClient()
+    monkeypatch.setattr(utils, "CHATS_DIR", tmp_path)
+    monkeypatch.setattr(utils, "memory_index", store)
+    monkeypatch.setattr(endpoints, "CHATS_DIR", tmp_path)
+    monkeypatch.setattr(endpoints.context_manager, "memory", store)
+    monkeypatch.setattr(endpoints, "get_client", lambda: client)
+    monkeypatch.setattr(endpoints, "model_router", ModelRouter())
+    for chat in ("a", "b"):
+        (tmp_path / f"{chat}.json").write_text(json.dumps({"messages": []}))
+    return main.app
+
+
+def collect(ws, turns):
+    """Frames until every turn id in turns has ended."""
+    frames, open_turns = [], set(turns)
+    while open_turns:
+        frame = ws.receive_json()
+        frames.append(frame)
+        if frame["type"] in ("done", "error"):
+            open_turns.discard(frame["id"])
+    return frames
+
+
+def reply(frames, turn_id):
+    return "".join(f["text"] for f in frames if f["type"] == "token" and f["id"] == turn_id)
+
+
+def test_clarify_runs_inline_and_can_be_skipped(app, tmp_path):
+    from fastapi.testclient import TestClient
+
+    with TestClient(app).websocket_connect("/ws?user=alice") as ws:
+        ws.send_json({"type": "chat", "id": "1", "chat": "a", "message": AMBIGUOUS})
+        frames = collect(ws, ["1"])
+        assert [f["type"] for f in frames] == ["clarify", "done"]
+        assert frames[0]["chat"] == "a" and frames[0]["suggested_clarifications"]
+
+        ws.send_json({"type": "chat", "id": "2", "chat": "a", "message": AMBIGUOUS, "skip_clarify": True})
+        assert reply(collect(ws, ["2"]), "2") == f"echo: {AMBIGUOUS}"
+
+    messages = json.loads((tmp_path / "a.json").read_text())["messages"]
+    assert [m["role"] for m in messages] == ["user", "assistant"]
+
+
+def test_chats_are_multiplexed_on_one_socket(app):
+    from fastapi.testclient import TestClient
+
+    with TestClient(app).websocket_connect("/ws") as ws:
+        ws.send_json({"type": "chat", "id": "s", "chat": "a", "message": "slow"})
+        ws.send_json({"type": "chat", "id": "f", "chat": "b", "message": "fast"})
+        frames = collect(ws, ["s", "f"])
+
+    tokens = [f["id"] for f in frames if f["type"] == "token"]
+    assert tokens == ["f", "f", "s", "s"]  # the second chat was answered while the first was still waiting
+    assert reply(frames, "s") == "echo: slow" and reply(frames, "f") == "echo: fast"
+    assert {f["chat"] for f in frames if f["id"] == "s"} == {"a"}
+
+
+def test_session_keeps_chat_warm_until_written_elsewhere(app, monkeypatch, tmp_path):
+    from fastapi.testclient import TestClient
+    import endpoints
+
+    reads = []
+    read_chat = endpoints.read_chat
+    monkeypatch.setattr(endpoints, "read_chat", lambda *args: reads.append(args[1]) or read_chat(*args))
+
+    with TestClient(app).websocket_connect("/ws") as ws:
+        for turn_id in ("1", "2"):
+            ws.send_json({"type": "chat", "id": turn_id, "chat": "a", "message": f"What is item {turn_id}?"})
+            collect(ws, [turn_id])
+        assert reads == ["a"]
+
+        # Another writer appends a message, so the session's copy is stale
+        data = json.loads((tmp_path / "a.json").read_text())
+        data["messages"].append({"role": "user", "content": "Written from another tab"})
+        (tmp_path / "a.json").write_text(json.dumps(data))
+        ws.send_json({"type": "chat", "id": "3", "chat": "a", "message": "And item 3?"})
+        collect(ws, ["3"])
+        assert reads == ["a", "a"]
+
+    messages = json.loads((tmp_path / "a.json").read_text())["messages"]
+    assert len(messages) == 7
+
+
+def test_bad_frames_are_answered_without_closing(app):
+    from fastapi.testclient import TestClient
+
+    with TestClient(app).websocket_connect("/ws") as ws:
+        ws.send_text("not json")
+        assert ws.receive_json()["message"] == "Frames must be JSON"
+        ws.send_json({"type": "shout"})
+        assert ws.receive_json()["type"] == "error"
+        ws.send_json({"type": "chat", "chat": "a", "message": "no id"})
+        assert ws.receive_json()["message"] == "Missing or duplicate id"
+        ws.send_json({"type": "chat", "id": "1", "chat": "a"})
+        frame = ws.receive_json()
+        assert frame["type"] == "error" and frame["id"] == "1"
+        ws.send_json({"type": "ping"})
+        assert ws.receive_json() == {"type": "pong"}
+
+
+def test_http_chat_still_streams_and_honours_skip_clarify(app):
+    from fastapi.testclient import TestClient
+
+    client = TestClient(app)
+    clarify = client.post("/chat", json={"message": AMBIGUOUS, "chat": "b"})
+    assert clarify.text.startswith("I want to make sure I understand correctly.")
+    answer = client.post("/chat", json={"message": AMBIGUOUS, "chat": "b", "skip_clarify": True})
+    assert answer.text == f"echo: {AMBIGUOUS}"
+
+
+class TestChatSession:
+    def test_appended_applies_own_writes_and_drops_stale_copies(self):
+        session = ChatSession("alice", max_chats=2)
+        session.put("a", (1, 10), {"messages": []})
+        session.appended("a", {"role": "user", "content": "hi"}, (1, 10), (2, 20))
+        assert session.get("a", (2, 20)).data["messages"] == [{"role": "user", "content": "hi"}]
+
+        session.appended("a", {"role": "assistant", "content": "yo"}, (3, 30), (4, 40))
+        assert session.get("a", (4, 40)) is None
+
+    def test_least_recently_used_chat_is_evicted(self):
+        session = ChatSession("alice", max_chats=2)
+        for chat in ("a", "b", "c"):
+            session.put(chat, None, {"messages": []})
+        assert list(session.chats) == ["b", "c"]
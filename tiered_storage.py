@@ -0,0 +1,321 @@
+import asyncio
+import gzip
+import logging
+import os
+import shutil
+import struct
+import time
+from pathlib import Path
+from typing import IO, Any, Callable, Dict, List, Optional, Tuple
+
+from io_executor import path_lock, run_io
+from metrics import LatencyRecorder
+from serialization import loads
+
+try:
+    import zstandard as _zstd
+except ImportError:  # optional codec
+    _zstd = None
+
+logger = logging.getLogger(__name__)
+
+# Codec name -> (file suffix, opener); gzip is always available
+CODECS: Dict[str, Tuple[str, Callable[[Path, str], IO[bytes]]]] = {
+    "gzip": (".gz", lambda path, mode: gzip.open(path, mode, compresslevel=6)),
+}
+if _zstd is not None:
+    CODECS["zstd"] = (".zst", lambda path, mode: _zstd.open(path, mode))
+_SUFFIXES = {suffix: name for name, (suffix, _) in CODECS.items()}
+
+
+class TierMetrics:
+    """Read latency per tier and tier moves, for judging the cold-read penalty."""
+
+    def __init__(self):
+        self.hot_read_ms = LatencyRecorder()
+        self.cold_read_ms = LatencyRecorder()
+        self.promotions = 0
+        self.demotions = 0
+
+    def summary(self) -> Dict[str, Any]:
+        hot, cold = self.hot_read_ms.percentile(50), self.cold_read_ms.percentile(50)
+        return {
+            "hot_read_ms": self.hot_read_ms.summary(),
+            "cold_read_ms": self.cold_read_ms.summary(),
+            "cold_read_penalty_ms_p50": round(cold - hot, 3) if hot is not None and cold is not None else None,
+            "promotions": self.promotions,
+            "demotions": self.demotions,
+        }
+
+
+tier_metrics = TierMetrics()
+
+
+def archive_path(chats_dir: Path, chat: str) -> Path:
+    return chats_dir / "archive" / f"{chat}.jsonl"
+
+
+def _cold(path: Path) -> Optional[Path]:
+    """The compressed copy of path, if there is one."""
+    for suffix in _SUFFIXES:
+        candidate = path.with_name(path.name + suffix)
+        if candidate.exists():
+            return candidate
+    return None
+
+
+def _open_cold(path: Path) -> IO[bytes]:
+    name = _SUFFIXES[path.suffix]
+    return CODECS[name][1](path, "rb")
+
+
+def _open_either(path: Path) -> Optional[Tuple[IO[bytes], bool]]:
+    """Open path in whichever tier it is in, as (file, is_cold); None if it is in neither.
+
+    Readers take no lock, so a promotion can replace the cold copy with the
+    hot file between the two lookups; the hot path is then tried once more.
+    """
+    for _ in range(2):
+        try:
+            return open(path, "rb"), False
+        except FileNotFoundError:
+            pass
+        cold = _cold(path)
+        if cold is not None:
+            try:
+                return _open_cold(cold), True
+            except FileNotFoundError:
+                pass
+    return None
+
+
+def open_archive(chats_dir: Path, chat: str) -> Optional[IO[bytes]]:
+    """Open a chat's archive of compacted messages for reading, whichever tier it is in."""
+    opened = _open_either(archive_path(chats_dir, chat))
+    return opened[0] if opened is not None else None
+
+
+def chat_file(chats_dir: Path, chat: str) -> Optional[Path]:
+    """The hot or cold file holding a chat, or None."""
+    path = chats_dir / f"{chat}.json"
+    return path if path.exists() else _cold(path)
+
+
+def chat_signature(chats_dir: Path, chat: str) -> Optional[Tuple[int, int]]:
+    """(mtime_ns, size) of the file holding a chat; changes whenever the chat is rewritten."""
+    path = chat_file(chats_dir, chat)
+    try:
+        stat = path.stat() if path is not None else None
+    except FileNotFoundError:  # moved between tiers meanwhile
+        return None
+    return (stat.st_mtime_ns, stat.st_size) if stat is not None else None
+
+
+def read_chat_bytes(chats_dir: Path, chat: str) -> Optional[bytes]:
+    """Raw JSON of a chat, decompressing it if it has gone cold."""
+    started = time.perf_counter()
+    opened = _open_either(chats_dir / f"{chat}.json")
+    if opened is None:
+        return None
+    f, is_cold = opened
+    with f:
+        raw = f.read()
+    recorder = tier_metrics.cold_read_ms if is_cold else tier_metrics.hot_read_ms
+    recorder.record((time.perf_counter() - started) * 1000)
+    return raw
+
+
+def read_chat(chats_dir: Path, chat: str) -> Optional[Dict[str, Any]]:
+    raw = read_chat_bytes(chats_dir, chat)
+    return None if raw is None else loads(raw)
+
+
+def chat_names(chats_dir: Path) -> List[str]:
+    """Names of all stored chats, hot and cold (not states or profiles)."""
+    if not chats_dir.exists():
+        return []
+    names = set()
+    for path in chats_dir.iterdir():
+        name = path.name
+        for suffix in _SUFFIXES:
+            if name.endswith(".json" + suffix):
+                name = name[:-len(suffix)]
+        if name.endswith(".json") and path.is_file():
+            stem = name[:-len(".json")]
+            if not stem.endswith("_state") and not stem.startswith("profile_"):
+                names.add(stem)
+    return sorted(names)
+
+
+def _decompress_to(cold: Path, path: Path):
+    tmp = path.with_name(path.name + ".promoting")
+    with _open_cold(cold) as src, open(tmp, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    shutil.copystat(cold, tmp)
+    os.replace(tmp, path)
+    cold.unlink()
+
+
+def _compress_to(path: Path, codec: str) -> Path:
+    suffix, opener = CODECS[codec]
+    cold = path.with_name(path.name + suffix)
+    tmp = path.with_name(path.name + suffix + ".demoting")
+    with open(path, "rb") as src, opener(tmp, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    # Keep the modification time, which is what idleness is judged by
+    shutil.copystat(path, tmp)
+    os.replace(tmp, cold)
+    path.unlink()
+    return cold
+
+
+def promote(chats_dir: Path, chat: str) -> bool:
+    """Make a cold chat (and its archive) hot again before it is written; True if anything was cold."""
+    promoted = False
+    for path in (chats_dir / f"{chat}.json", archive_path(chats_dir, chat)):
+        cold = None if path.exists() else _cold(path)
+        if cold is not None:
+            _decompress_to(cold, path)
+            promoted = True
+    if promoted:
+        tier_metrics.promotions += 1
+    return promoted
+
+
+def demote(chats_dir: Path, chat: str, codec: str = "gzip") -> int:
+    """Compress a hot chat (and its archive) into the cold tier; returns bytes saved."""
+    path = chats_dir / f"{chat}.json"
+    if not path.exists():
+        return 0
+    saved = 0
+    for hot in (path, archive_path(chats_dir, chat)):
+        if hot.exists():
+            size = hot.stat().st_size
+            saved += size - _compress_to(hot, codec).stat().st_size
+    tier_metrics.demotions += 1
+    return saved
+
+
+def discard_cold(chats_dir: Path, chat: str):
+    """Remove cold copies of a chat that has just been rewritten in the hot tier."""
+    for path in (chats_dir / f"{chat}.json", archive_path(chats_dir, chat)):
+        cold = _cold(path)
+        if cold is not None:
+            cold.unlink()
+
+
+def _original_size(cold: Path) -> Optional[int]:
+    """Uncompressed size from the file itself, without decompressing it."""
+    if cold.suffix == ".gz":
+        with open(cold, "rb") as f:
+            f.seek(-4, os.SEEK_END)
+            return struct.unpack("<I", f.read(4))[0]  # ISIZE, exact below 4 GiB
+    if cold.suffix == ".zst" and _zstd is not None:
+        with open(cold, "rb") as f:
+            size = _zstd.get_frame_parameters(f.read(18)).content_size
+        return size if size > 0 else None
+    return None
+
+
+def tier_stats(chats_dir: Path) -> Dict[str, Any]:
+    """Chat counts and bytes per tier, with the space the cold tier saves."""
+    stats = {"hot_chats": 0, "hot_bytes": 0, "cold_chats": 0, "cold_bytes": 0, "cold_original_bytes": 0}
+    for chat in chat_names(chats_dir):
+        for path in (chats_dir / f"{chat}.json", archive_path(chats_dir, chat)):
+            is_chat = path.suffix == ".json"
+            if path.exists():
+                stats["hot_chats"] += is_chat
+                stats["hot_bytes"] += path.stat().st_size
+                continue
+            cold = _cold(path)
+            if cold is not None:
+                stats["cold_chats"] += is_chat
+                stats["cold_bytes"] += cold.stat().st_size
+                stats["cold_original_bytes"] += _original_size(cold) or cold.stat().st_size
+    stats["saved_bytes"] = stats["cold_original_bytes"] - stats["cold_bytes"]
+    return stats
+
+
+class TieringJob:
+    """Periodically move chats that have not been written for idle_days to the cold tier."""
+
+    def __init__(self, chats_dir: Path, idle_days: float = 30, codec: str = "gzip", interval: float = 3600):
+        if codec not in CODECS:
+            logger.warning("Cold-storage codec %r is not available, using gzip", codec)
+            codec = "gzip"
+        self.chats_dir = chats_dir
+        self.idle_days = idle_days
+        self.codec = codec
+        self.interval = interval
+        self.runs = 0
+        self.saved_bytes = 0
+        self._task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_env(cls, chats_dir: Path) -> "TieringJob":
+        return cls(
+            chats_dir,
+            idle_days=float(os.environ.get("CHAT_COLD_AFTER_DAYS", "30")),
+            codec=os.environ.get("CHAT_COLD_CODEC", "gzip"),
+            interval=float(os.environ.get("CHAT_TIERING_INTERVAL", "3600")),
+        )
+
+    def idle_chats(self, now: Optional[float] = None) -> List[str]:
+        cutoff = (now or time.time()) - self.idle_days * 86400
+        return [
+            chat for chat in chat_names(self.chats_dir)
+            if (self.chats_dir / f"{chat}.json").exists() and (self.chats_dir / f"{chat}.json").stat().st_mtime < cutoff
+        ]
+
+    async def run_once(self, now: Optional[float] = None) -> Dict[str, int]:
+        demoted = saved = 0
+        for chat in await run_io(self.idle_chats, now):
+            # Same lock as appends, so a chat is never compressed mid-write
+            async with path_lock(self.chats_dir / f"{chat}.json"):
+                saved += await run_io(demote, self.chats_dir, chat, self.codec)
+            demoted += 1
+        self.runs += 1
+        self.saved_bytes += saved
+        return {"demoted": demoted, "saved_bytes": saved}
+
+    def start(self):
+        if self.interval > 0 and (self._task is None or self._task.done()):
+            self._task = asyncio.get_running_loop().create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self):
+        while True:
+            try:
+                result = await self.run_once()
+                if result["demoted"]:
+                    logger.info("Moved %d idle chats to cold storage, saving %d bytes", result["demoted"], result["saved_bytes"])
+            except Exception:
+                logger.exception("Tiering run failed")
+            await asyncio.sleep(self.interval)
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Move idle chats to compressed cold storage")
+    parser.add_argument("--chats", default="chats", help="Chat storage directory")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("run", help="Compress chats idle for longer than --days")
+    run.add_argument("--days", type=float, default=30)
+    run.add_argument("--codec", choices=sorted(CODECS), default="gzip")
+    sub.add_parser("stats", help="Show space used per tier")
+    args = parser.parse_args()
+
+    chats_dir = Path(args.chats)
+    if args.command == "run":
+        print(json.dumps(asyncio.run(TieringJob(chats_dir, args.days, args.codec).run_once())))
+    print(json.dumps(tier_stats(chats_dir), indent=2))
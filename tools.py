@@ -1,7 +1,8 @@
-from ddgs import DDGS
 from typing import List
 
 def ddgs_search(query: str, max_results: int = 5) -> List[str]:
+    # Imported on first search so startup does not pay for the search client
+    from ddgs import DDGS
     ddgs = DDGS()
     results = ddgs.text(query, max_results=max_results)
-    return [r['body'] for r in results if 'body' in r]
+    return [r['body'] for r in results if 'body' in r]
\ No newline at end of file
@@ -1,22 +1,42 @@
+import logging
 import os
-import json
+from functools import lru_cache
 from pathlib import Path
-from openai import OpenAI
+from typing import Optional
 from tools import ddgs_search
+from llm_client import FailoverClient
+from io_executor import replace_bytes
+from serialization import dumps, loads
+from bm25_index import IndexStore
+from tiered_storage import promote
 
-CHATS_DIR = Path("chats")
-CHATS_DIR.mkdir(exist_ok=True)
+logger = logging.getLogger(__name__)
+
+CHATS_DIR = Path(os.environ.get("CHATS_DIR", "chats"))
+
+# Per-user BM25 index over every stored message, for recall across chats
+memory_index = IndexStore.from_env(CHATS_DIR)
 
 # Use OpenAI client with custom base URL for Llama API or default to OpenAI
 LLAMA_API_KEY = os.environ.get('LLAMA_API_KEY') or os.environ.get('OPENAI_API_KEY')
 LLAMA_BASE_URL = os.environ.get('LLAMA_BASE_URL', 'https://api.openai.com/v1')
+# Comma-separated list of equivalent endpoints to fail over between
+LLAMA_BASE_URLS = [u.strip() for u in os.environ.get('LLAMA_BASE_URLS', LLAMA_BASE_URL).split(',') if u.strip()]
+
 
-if not LLAMA_API_KEY:
-    print("Warning: No API key found. Please set LLAMA_API_KEY or OPENAI_API_KEY environment variable")
-    # Create a mock client for development
-    client = None
-else:
-    client = OpenAI(api_key=LLAMA_API_KEY, base_url=LLAMA_BASE_URL)
+@lru_cache(maxsize=None)
+def get_client() -> Optional[FailoverClient]:
+    """Build the upstream client on first use; None in development mode without a key."""
+    if not LLAMA_API_KEY:
+        print("Warning: No API key found. Please set LLAMA_API_KEY or OPENAI_API_KEY environment variable")
+        return None
+    return FailoverClient.from_urls(
+        LLAMA_BASE_URLS,
+        LLAMA_API_KEY,
+        max_retries=int(os.environ.get('LLM_MAX_RETRIES', '2')),
+        hedge=os.environ.get('LLM_HEDGE', '0') == '1',
+        hedge_percentile=float(os.environ.get('LLM_HEDGE_PERCENTILE', '95')),
+    )
 
 # Exception classes for compatibility
 class APIConnectionError(Exception):
@@ -43,9 +63,18 @@ def run_tool(tool: str, tool_input: str) -> str:
     return "[Unknown tool]"
 
 
-def save_chat_message(chat: str, message: dict) -> None:
+def save_chat_message(chat: str, message: dict, user: Optional[str] = None) -> None:
     chat_path = CHATS_DIR / f"{chat}.json"
+    # Writing to a chat brings it back from cold storage
+    promote(CHATS_DIR, chat)
     if chat_path.exists():
-        data = json.loads(chat_path.read_text(encoding="utf-8"))
+        data = loads(chat_path.read_bytes())
         data["messages"].append(message)
-        chat_path.write_text(json.dumps(data), encoding="utf-8")
+        replace_bytes(chat_path, dumps(data))
+        if user:
+            # Compacted chats keep only their recent messages, so index by absolute position.
+            # The message is already stored; a broken index must not fail the turn
+            try:
+                memory_index.add(user, chat, data.get("offset", 0) + len(data["messages"]) - 1, message.get("content"))
+            except Exception:
+                logger.exception("Could not index message of chat %s for %s", chat, user)